@@ -0,0 +1,71 @@
+"""
+Cache de respostas em memória.
+
+Todos os separadores do browser pedem `/api/dados` a cada 2 s e recebem a mesma
+resposta. A classe `ResponseCache` guarda os dados, o corpo JSON já serializado
+e o respetivo ETag durante `ttl_seconds`; quando expira, só o primeiro pedido
+volta a consultar o MongoDB (single-flight) e os pedidos concorrentes esperam
+pelo mesmo resultado, pelo que N clientes produzem uma única consulta por
+refrescamento.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from metrics import CACHE_HITS, CACHE_MISSES, CACHE_COALESCED
+
+logger = logging.getLogger(__name__)
+
+
+def serialize(data: Any) -> bytes:
+    """Serializa uma resposta JSON de forma compacta."""
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+class CachedResponse:
+    """Resultado de um refrescamento: dados, corpo serializado e ETag."""
+    __slots__ = ("data", "body", "etag")
+
+    def __init__(self, data: Any):
+        self.data = data
+        # Serializa uma vez por refrescamento; os hits devolvem os mesmos bytes
+        self.body = serialize(data)
+        self.etag = f'W/"{hashlib.blake2b(self.body, digest_size=8).hexdigest()}"'
+
+
+class ResponseCache:
+    """Cache de uma única resposta JSON com TTL e refrescamento single-flight."""
+
+    def __init__(self, name: str, ttl_seconds: float, loader: Callable[[], Awaitable[Any]]):
+        self._name = name
+        self._ttl_seconds = ttl_seconds
+        self._loader = loader
+        self._entry: Optional[CachedResponse] = None
+        self._expires_at = 0.0
+        self._refresh: Optional[asyncio.Task] = None
+
+    async def get(self) -> CachedResponse:
+        """Devolve a resposta em cache, refrescando-a se tiver expirado."""
+        if self._entry is not None and time.monotonic() < self._expires_at:
+            CACHE_HITS.labels(cache=self._name).inc()
+            return self._entry
+
+        if self._refresh is None:
+            CACHE_MISSES.labels(cache=self._name).inc()
+            self._refresh = asyncio.create_task(self._load())
+        else:
+            CACHE_COALESCED.labels(cache=self._name).inc()
+
+        # shield: se um cliente desistir, o refrescamento continua para os outros
+        return await asyncio.shield(self._refresh)
+
+    async def _load(self) -> CachedResponse:
+        try:
+            self._entry = CachedResponse(await self._loader())
+            self._expires_at = time.monotonic() + self._ttl_seconds
+            return self._entry
+        finally:
+            self._refresh = None
@@ -0,0 +1,47 @@
+"""
+Redução de trajetórias (downsampling) no servidor.
+
+Implementa o Largest-Triangle-Three-Buckets (LTTB) sobre as posições (x, y) de
+uma trajetória ordenada no tempo: os pontos são divididos em `max_points - 2`
+baldes consecutivos e de cada balde fica o ponto que forma o maior triângulo
+com o ponto escolhido no balde anterior e a média do balde seguinte. As curvas
+e mudanças de direção são preservadas, e os troços retos ficam com poucos
+pontos. O primeiro e o último ponto são sempre mantidos.
+
+O ciclo é feito por balde (no máximo `max_points` iterações); dentro de cada
+balde o cálculo das áreas é vetorizado com NumPy.
+"""
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Índices dos pontos a manter (ordenados), no máximo `max_points`."""
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    # Limites dos baldes interiores (o primeiro e o último ponto ficam de fora)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    # Média de cada balde, usada como terceiro vértice do triângulo do balde anterior
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 1 < max_points - 2:
+            next_x, next_y = mean_x[bucket + 1], mean_y[bucket + 1]
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+
+        # Área (x2) do triângulo (anterior, candidato, média do balde seguinte)
+        ax, ay = x[previous], y[previous]
+        areas = np.abs((ax - next_x) * (y[start:end] - ay) - (ax - x[start:end]) * (next_y - ay))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
@@ -0,0 +1,59 @@
+"""
+Módulo de Gestão de Índices.
+
+Declara os índices de que a API e o consumidor dependem e cria-os no arranque
+de forma idempotente. Os índices declarados que não existem são reportados
+na métrica `api_mongo_indexes_missing`.
+
+A coleção de telemetria é criada pelo consumidor (time-series, se
+`TIMESERIES_ENABLED`): `create_indexes` criaria implicitamente uma coleção
+normal, por isso a API só cria os índices das coleções que já existem e deixa
+os da telemetria ao consumidor quando arranca primeiro.
+
+A declaração tem de ser igual à de `Apps/Consumer/src/core/indexes.py`.
+"""
+import logging
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from metrics import INDEX_MISSING
+
+logger = logging.getLogger("API.Indexes")
+
+
+def declared_indexes(collection_name, latest_collection_name):
+    """Índices declarados por coleção."""
+    return {
+        collection_name: [
+            IndexModel([("timestampMs", ASCENDING)], name="timestampMs_1"),
+            # /corredor/{runner_id}: filtra por corredor e ordena por tempo
+            IndexModel([("runner_id", ASCENDING), ("timestampMs", DESCENDING)], name="runner_id_1_timestampMs_-1"),
+            # Consultas por rota num intervalo de tempo
+            IndexModel([("route_id", ASCENDING), ("timestampMs", DESCENDING)], name="route_id_1_timestampMs_-1"),
+        ],
+        latest_collection_name: [
+            IndexModel([("timestampMs", ASCENDING)], name="timestampMs_1"),
+        ],
+    }
+
+
+async def ensure_indexes(db, collection_name, latest_collection_name):
+    """Cria os índices declarados que ainda não existem e reporta os que faltam."""
+    existing_collections = set(await db.list_collection_names())
+    for name, models in declared_indexes(collection_name, latest_collection_name).items():
+        if name == collection_name and name not in existing_collections:
+            logger.info(f"Coleção {name} ainda não existe; os índices são criados pelo consumidor.")
+            continue
+        collection = db[name]
+        try:
+            await collection.create_indexes(models)
+        except Exception as e:
+            logger.error(f"Não foi possível criar os índices de {name}: {e}")
+
+        existing = await collection.index_information()
+        missing = [model.document["name"] for model in models if model.document["name"] not in existing]
+        INDEX_MISSING.labels(collection=name).set(len(missing))
+        if missing:
+            logger.error(f"Índices em falta em {name}: {missing}")
+        else:
+            logger.info(f"Índices de {name} verificados.")
@@ -2,15 +2,91 @@ import os
 import random
 import logging
 import time
-from fastapi import FastAPI, Request
+import json
+import zlib
+from array import array
+from typing import Optional
+from contextlib import asynccontextmanager
+import numpy as np
+from fastapi import FastAPI, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pymongo import MongoClient
-from metrics import start_metrics_server, REQUESTS_TOTAL, REQUEST_LATENCY, DB_CONNECTION_STATUS
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorClient
+from metrics import start_metrics_server, REQUESTS_TOTAL, REQUEST_LATENCY, DB_CONNECTION_STATUS, DATA_AGE
+from indexes import ensure_indexes
+from cache import ResponseCache, serialize
+from downsample import lttb_indices
+from routes import RUTAS, RUTAS_BODY, RUTAS_ETAG
 
-app = FastAPI()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("API")
 
+MONGO_HOST = os.getenv("MONGO_HOST", "mongo-service")
+MONGO_PORT = os.getenv("MONGO_PORT", "27017")
+MONGO_USER = os.getenv("MONGO_USER")
+MONGO_PASS = os.getenv("MONGO_PASS")
+DB_NAME = os.getenv("DB_NAME", "projeto_sd")
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "dados_corrida")
+# Última posição de cada corredor (_id = runner_id), mantida pelo consumidor
+LATEST_COLLECTION_NAME = os.getenv("LATEST_COLLECTION_NAME", "runner_latest")
+MONGO_AUTH_SOURCE = os.getenv("MONGO_AUTH_SOURCE", "admin")  # importante para usuario root
+# Pool de ligações partilhado por todos os pedidos concorrentes
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+# Tempo (s) durante o qual a resposta de /dados é servida da cache
+DADOS_CACHE_TTL_S = float(os.getenv("DADOS_CACHE_TTL_S", "1.0"))
+# Tempo (s) durante o qual clientes e proxies podem reutilizar /rutas sem revalidar
+ROUTES_CACHE_MAX_AGE_S = int(os.getenv("ROUTES_CACHE_MAX_AGE_S", "86400"))
+# Classificação por rota: tempo em cache e janela (s) para um corredor contar como ativo
+LEADERBOARD_CACHE_TTL_S = float(os.getenv("LEADERBOARD_CACHE_TTL_S", "2.0"))
+LEADERBOARD_ACTIVE_WINDOW_S = int(os.getenv("LEADERBOARD_ACTIVE_WINDOW_S", "60"))
+# Leitura do histórico de um corredor: documentos por lote e máximo por pedido
+TRAJECTORY_BATCH_SIZE = int(os.getenv("TRAJECTORY_BATCH_SIZE", "5000"))
+TRAJECTORY_MAX_SAMPLES = int(os.getenv("TRAJECTORY_MAX_SAMPLES", "500000"))
+# Documentos por lote na exportação NDJSON (memória constante por pedido)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Cliente e coleções Motor, criados no arranque (lifespan)
+client = None
+collection = None
+latest_collection = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranque: métricas, ligação ao MongoDB e índices. Encerramento: fecha o cliente."""
+    global client, collection, latest_collection
+
+    # Inicia o servidor de métricas na porta 8001
+    start_metrics_server(8001)
+
+    try:
+        uri = f"mongodb://{MONGO_USER}:{MONGO_PASS}@{MONGO_HOST}:{MONGO_PORT}/{DB_NAME}?authSource={MONGO_AUTH_SOURCE}"
+        client = AsyncIOMotorClient(
+            uri,
+            serverSelectionTimeoutMS=5000,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE
+        )
+        # Verifica conectividade
+        await client.admin.command("ping")
+        db = client[DB_NAME]
+        collection = db[COLLECTION_NAME]
+        latest_collection = db[LATEST_COLLECTION_NAME]
+        await ensure_indexes(db, COLLECTION_NAME, LATEST_COLLECTION_NAME)
+        DB_CONNECTION_STATUS.set(1)
+        logger.info(f"Ligado ao MongoDB (BD: {DB_NAME}, Coleção: {COLLECTION_NAME})!")
+    except Exception as e:
+        DB_CONNECTION_STATUS.set(0)
+        logger.error(f"Erro ao ligar ao MongoDB: {e}")
+        raise
+
+    yield
+
+    client.close()
+    DB_CONNECTION_STATUS.set(0)
+
+app = FastAPI(lifespan=lifespan)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -19,11 +95,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event("startup")
-def startup_event():
-    # Inicia o servidor de métricas na porta 8001
-    start_metrics_server(8001)
-
 @app.middleware("http")
 async def metrics_middleware(request: Request, call_next):
     start_time = time.time()
@@ -39,28 +110,6 @@ async def metrics_middleware(request: Request, call_next):
     
     return response
 
-MONGO_HOST = os.getenv("MONGO_HOST", "mongo-service")
-MONGO_PORT = os.getenv("MONGO_PORT", "27017")
-MONGO_USER = os.getenv("MONGO_USER")
-MONGO_PASS = os.getenv("MONGO_PASS")
-DB_NAME = os.getenv("DB_NAME", "projeto_sd")
-COLLECTION_NAME = os.getenv("COLLECTION_NAME", "dados_corrida")
-MONGO_AUTH_SOURCE = os.getenv("MONGO_AUTH_SOURCE", "admin")  # importante para usuario root
-
-try:
-    uri = f"mongodb://{MONGO_USER}:{MONGO_PASS}@{MONGO_HOST}:{MONGO_PORT}/{DB_NAME}?authSource={MONGO_AUTH_SOURCE}"
-    client = MongoClient(uri, serverSelectionTimeoutMS=5000)
-    # Verifica conectividade
-    client.admin.command("ping")
-    db = client[DB_NAME]
-    collection = db[COLLECTION_NAME]
-    DB_CONNECTION_STATUS.set(1)
-    logger.info(f"Ligado ao MongoDB (BD: {DB_NAME}, Coleção: {COLLECTION_NAME})!")
-except Exception as e:
-    DB_CONNECTION_STATUS.set(0)
-    logger.error(f"Erro ao ligar ao MongoDB: {e}")
-    raise
-
 def gerar_dados_random(num_participantes=5):
     """
     Gera dados aleatórios de corredores para testes.
@@ -77,60 +126,214 @@ def gerar_dados_random(num_participantes=5):
         })
     return participantes
 
-@app.get("/dados")
-def get_dados():
+# Campos devolvidos por /dados
+DADOS_PROJECTION = {
+    "runner_id": 1,
+    "route_id": 1,
+    "current_segment": 1,
+    "positionX": 1,
+    "positionY": 1,
+    "speedX": 1,
+    "speedY": 1,
+    "timestampMs": 1,
+    "_id": 0
+}
+DADOS_LIMIT = 100
+
+def dados_response(participantes, since=None):
+    """
+    Corpo de /dados. `cursor` é o maior timestampMs devolvido (ou o `since`
+    recebido) e deve ser enviado como `since` no pedido seguinte.
+    """
+    timestamps = [p["timestampMs"] for p in participantes if "timestampMs" in p]
+    cursor = max(timestamps, default=since)
+    return {"participantes": participantes, "cursor": cursor}
+
+async def load_dados():
     """
-    Devolve dados de corredores.
+    Lê a última posição conhecida de cada corredor (até 100, mais recentes
+    primeiro) da coleção de últimas posições mantida pelo consumidor.
     Se a DB estiver vazia, gera dados aleatórios.
     """
     try:
         # Tenta obter dados reais da BD ordenados por timestamp (mais recentes primeiro)
-        participantes = list(collection.find({}, {
-            "runner_id": 1,
-            "route_id": 1,
-            "current_segment": 1,
-            "positionX": 1,
-            "positionY": 1,
-            "speedX": 1,
-            "speedY": 1,
-            "timestampMs": 1,
-            "_id": 0
-        }).sort("timestampMs", -1).limit(100))
+        participantes = await latest_collection.find({}, DADOS_PROJECTION) \
+            .sort("timestampMs", -1).limit(DADOS_LIMIT).to_list(length=DADOS_LIMIT)
         
         # Se não houver dados, gera aleatórios
         if not participantes:
             participantes = gerar_dados_random(5)
             logger.info("Nenhum dado na BD. A gerar dados aleatórios...")
         
-        return {"participantes": participantes}
+        return dados_response(participantes)
     except Exception as e:
         # Em caso de erro de conexão com DB, retorna dados aleatórios
         logger.error(f"Erro ao aceder à BD: {e}. A usar dados aleatórios.")
-        return {"participantes": gerar_dados_random(5)}
+        return dados_response(gerar_dados_random(5))
+
+dados_cache = ResponseCache("dados", DADOS_CACHE_TTL_S, load_dados)
+
+def observe_data_age(participantes):
+    """Regista, por rota, a idade da posição mais recente servida (fim da cadeia produtor -> API)."""
+    newest = {}
+    for p in participantes:
+        if "timestampMs" in p:
+            route = p.get("route_id")
+            if p["timestampMs"] > newest.get(route, -1):
+                newest[route] = p["timestampMs"]
+    now_ms = time.time() * 1000
+    for route, timestamp_ms in newest.items():
+        DATA_AGE.labels(route=str(route)).observe(max(0.0, (now_ms - timestamp_ms) / 1000))
+
+async def load_dados_since(cached, since: int):
+    """
+    Corredores com timestampMs > `since`. A cache tem os 100 mais recentes, pelo
+    que contém todos os posteriores a `since` se `since` não for anterior ao mais
+    antigo da cache (ou se a coleção tiver menos de 100); caso contrário a
+    consulta vai ao MongoDB pelo índice de timestampMs.
+    """
+    participantes = cached["participantes"]
+    oldest = participantes[-1].get("timestampMs", since) if participantes else since
+    if len(participantes) < DADOS_LIMIT or since >= oldest:
+        # Ordenados do mais recente para o mais antigo: para no primeiro já visto
+        newer = []
+        for p in participantes:
+            if p.get("timestampMs", since) <= since:
+                break
+            newer.append(p)
+        return newer
+
+    return await latest_collection.find({"timestampMs": {"$gt": since}}, DADOS_PROJECTION) \
+        .sort("timestampMs", -1).limit(DADOS_LIMIT).to_list(length=DADOS_LIMIT)
+
+@app.get("/dados")
+async def get_dados(request: Request, since: Optional[int] = None):
+    """
+    Devolve a última posição conhecida de cada corredor. A resposta é servida
+    da cache durante DADOS_CACHE_TTL_S segundos (ver cache.py).
+
+    - `since`: devolve só os corredores com timestampMs posterior (o `cursor`
+      da resposta anterior).
+    - `If-None-Match`: se os dados não mudaram desde o ETag indicado, responde
+      304 sem corpo.
+    """
+    cached = await dados_cache.get()
+    observe_data_age(cached.data["participantes"])
+    headers = {"ETag": cached.etag}
+    if request.headers.get("if-none-match") == cached.etag:
+        return Response(status_code=304, headers=headers)
+
+    if since is None:
+        return Response(content=cached.body, media_type="application/json", headers=headers)
+
+    try:
+        participantes = await load_dados_since(cached.data, since)
+    except Exception as e:
+        logger.error(f"Erro ao aceder à BD: {e}. A devolver a resposta completa.")
+        return Response(content=cached.body, media_type="application/json", headers=headers)
+    return Response(content=serialize(dados_response(participantes, since)), media_type="application/json", headers=headers)
 
 @app.get("/rutas")
-def get_rutas():
+async def get_rutas(request: Request):
     """
     Devolve todas as rotas predefinidas.
-    Estas são as mesmas rotas que os corredores usam.
+    Estas são as mesmas rotas que os corredores usam (ver routes.py); o corpo
+    é pré-serializado e pode ficar em cache no cliente (ETag + Cache-Control).
+    """
+    headers = {"ETag": RUTAS_ETAG, "Cache-Control": f"public, max-age={ROUTES_CACHE_MAX_AGE_S}"}
+    if request.headers.get("if-none-match") == RUTAS_ETAG:
+        return Response(status_code=304, headers=headers)
+    return Response(content=RUTAS_BODY, media_type="application/json", headers=headers)
+
+def segment_fraction(points, segment, x, y):
+    """Fração (0-1) do segmento já percorrida, pela projeção da posição no segmento."""
+    if segment >= len(points) - 1:
+        return 0.0
+    (x1, y1), (x2, y2) = points[segment], points[segment + 1]
+    dx, dy = x2 - x1, y2 - y1
+    length2 = dx * dx + dy * dy
+    if length2 == 0:
+        return 0.0
+    return min(max(((x - x1) * dx + (y - y1) * dy) / length2, 0.0), 1.0)
+
+async def load_leaderboard():
+    """
+    Classificação por rota dos corredores ativos (atualizados nos últimos
+    LEADERBOARD_ACTIVE_WINDOW_S segundos), ordenados pelo progresso na rota
+    (segmento + fração do segmento). A velocidade média e as voltas são
+    mantidas incrementalmente pelo consumidor na coleção de últimas posições.
     """
-    rutas = [
-        {"id": 1, "points": [[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]], "name": "Rota Quadrada"},
-        {"id": 2, "points": [[0, 0], [15, 10], [16, -17], [-20, -15]], "name": "Rota Irregular"},
-        {"id": 3, "points": [[-5, -5], [10, 3], [15, 12], [22, 13]], "name": "Rota Ascendente"}
-    ]
+    cutoff = int(time.time() * 1000) - LEADERBOARD_ACTIVE_WINDOW_S * 1000
+    try:
+        runners = await latest_collection.find(
+            {"timestampMs": {"$gte": cutoff}},
+            {"runner_id": 1, "route_id": 1, "current_segment": 1, "positionX": 1, "positionY": 1,
+             "avg_speed": 1, "laps": 1, "timestampMs": 1, "_id": 0}
+        ).to_list(length=None)
+    except Exception as e:
+        logger.error(f"Erro ao aceder à BD: {e}. Classificação vazia.")
+        runners = []
+
+    by_route = {ruta["id"]: [] for ruta in RUTAS}
+    points_by_route = {ruta["id"]: ruta["points"] for ruta in RUTAS}
+    for runner in runners:
+        route_id = runner.get("route_id")
+        if route_id not in by_route:
+            continue
+        segment = runner.get("current_segment", 0)
+        fraction = segment_fraction(
+            points_by_route[route_id], segment, runner.get("positionX", 0), runner.get("positionY", 0)
+        )
+        by_route[route_id].append({
+            "runner_id": runner.get("runner_id"),
+            "progress": segment + fraction,
+            "current_segment": segment,
+            "fraction": fraction,
+            "avg_speed": runner.get("avg_speed", 0.0),
+            "laps": runner.get("laps", 0),
+            "positionX": runner.get("positionX"),
+            "positionY": runner.get("positionY"),
+            "timestampMs": runner.get("timestampMs")
+        })
+
+    rutas = []
+    for ruta in RUTAS:
+        corredores = sorted(by_route[ruta["id"]], key=lambda c: c["progress"], reverse=True)
+        for rank, corredor in enumerate(corredores, start=1):
+            corredor["rank"] = rank
+        rutas.append({
+            "route_id": ruta["id"],
+            "name": ruta["name"],
+            "segments": len(ruta["points"]) - 1,
+            "corredores": corredores
+        })
     return {"rutas": rutas}
 
+leaderboard_cache = ResponseCache("leaderboard", LEADERBOARD_CACHE_TTL_S, load_leaderboard)
+
+@app.get("/leaderboard")
+async def get_leaderboard(request: Request):
+    """
+    Devolve a classificação por rota (ver load_leaderboard). A resposta é
+    servida da cache durante LEADERBOARD_CACHE_TTL_S segundos e suporta
+    If-None-Match.
+    """
+    cached = await leaderboard_cache.get()
+    headers = {"ETag": cached.etag}
+    if request.headers.get("if-none-match") == cached.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
 @app.get("/corredor/{runner_id}")
-def get_corredor(runner_id: int):
+async def get_corredor(runner_id: int):
     """
     Devolve a última posição de um corredor específico.
     """
     try:
-        corredor = collection.find_one(
-            {"runner_id": runner_id},
-            {"runner_id": 1, "route_id": 1, "current_segment": 1, "positionX": 1, "positionY": 1, "speedX": 1, "speedY": 1, "timestampMs": 1, "_id": 0},
-            sort=[("timestampMs", -1)]  # Ordena por timestamp descendente
+        # Procura direta pela chave (_id = runner_id) na coleção de últimas posições
+        corredor = await latest_collection.find_one(
+            {"_id": runner_id},
+            {"runner_id": 1, "route_id": 1, "current_segment": 1, "positionX": 1, "positionY": 1, "speedX": 1, "speedY": 1, "timestampMs": 1, "_id": 0}
         )
         
         # Se não encontrar na DB, gera dados aleatórios para esse corredor
@@ -146,4 +349,135 @@ def get_corredor(runner_id: int):
         
         return corredor
     except Exception as e:
-        return {"erro": str(e)}
\ No newline at end of file
+        return {"erro": str(e)}
+
+def timestamp_filter(from_ms: Optional[int], to_ms: Optional[int]):
+    """Filtro MongoDB para um intervalo (inclusivo) de timestampMs."""
+    bounds = {}
+    if from_ms is not None:
+        bounds["$gte"] = from_ms
+    if to_ms is not None:
+        bounds["$lte"] = to_ms
+    return {"timestampMs": bounds} if bounds else {}
+
+# Campos lidos do histórico para cada ponto da trajetória
+TRAJECTORY_FIELDS = ("timestampMs", "route_id", "current_segment", "positionX", "positionY")
+
+@app.get("/corredor/{runner_id}/trajectory")
+async def get_trajectory(
+    runner_id: int,
+    from_ms: Optional[int] = Query(None, alias="from"),
+    to_ms: Optional[int] = Query(None, alias="to"),
+    max_points: int = Query(1000, ge=3, le=10000)
+):
+    """
+    Devolve a trajetória de um corredor entre `from` e `to` (timestampMs),
+    reduzida no servidor a no máximo `max_points` pontos com LTTB
+    (ver downsample.py). O histórico é lido em lotes pelo índice
+    (runner_id, timestampMs) e só os pontos escolhidos são devolvidos.
+
+    São lidas no máximo TRAJECTORY_MAX_SAMPLES amostras, a partir de `from`:
+    se o intervalo tiver mais, a resposta traz `truncated` = true e
+    `last_timestamp` com o timestampMs da última amostra lida (o fim real da
+    trajetória devolvida); o resto pede-se com `from` = last_timestamp + 1.
+    """
+    query = {"runner_id": runner_id, **timestamp_filter(from_ms, to_ms)}
+
+    try:
+        projection = {field: 1 for field in TRAJECTORY_FIELDS}
+        projection["_id"] = 0
+        cursor = collection.find(query, projection).sort("timestampMs", 1) \
+            .limit(TRAJECTORY_MAX_SAMPLES + 1).batch_size(TRAJECTORY_BATCH_SIZE)
+
+        # Colunas compactas (8 bytes por valor) em vez de manter os documentos
+        columns = {field: array("d") for field in TRAJECTORY_FIELDS}
+        while True:
+            batch = await cursor.to_list(length=TRAJECTORY_BATCH_SIZE)
+            if not batch:
+                break
+            for field, column in columns.items():
+                column.extend(doc.get(field, 0) for doc in batch)
+    except Exception as e:
+        return {"erro": str(e)}
+
+    # A amostra a mais só serve para saber se o intervalo foi cortado
+    truncated = len(columns["timestampMs"]) > TRAJECTORY_MAX_SAMPLES
+    if truncated:
+        for column in columns.values():
+            column.pop()
+        logger.warning(
+            f"Trajetória do corredor {runner_id} cortada em {TRAJECTORY_MAX_SAMPLES} amostras "
+            f"(até {int(columns['timestampMs'][-1])})"
+        )
+
+    total = len(columns["timestampMs"])
+    points = []
+    if total:
+        x = np.frombuffer(columns["positionX"], dtype=np.float64)
+        y = np.frombuffer(columns["positionY"], dtype=np.float64)
+        for i in lttb_indices(x, y, max_points).tolist():
+            points.append({
+                "timestampMs": int(columns["timestampMs"][i]),
+                "route_id": int(columns["route_id"][i]),
+                "current_segment": int(columns["current_segment"][i]),
+                "positionX": columns["positionX"][i],
+                "positionY": columns["positionY"][i]
+            })
+
+    return {
+        "runner_id": runner_id,
+        "from": from_ms,
+        "to": to_ms,
+        "last_timestamp": int(columns["timestampMs"][-1]) if total else None,
+        "truncated": truncated,
+        "total_points": total,
+        "points": points
+    }
+
+async def export_lines(query, compress: bool):
+    """
+    Gera a exportação em pedaços: um lote do cursor de cada vez, serializado
+    como NDJSON (uma linha JSON por documento) e, opcionalmente, comprimido
+    com gzip em streaming.
+    """
+    # Campos internos do armazenamento (ObjectId e campos time-series) não são exportados
+    cursor = collection.find(query, {"_id": 0, "ts": 0, "meta": 0}) \
+        .sort("timestampMs", 1).batch_size(EXPORT_BATCH_SIZE)
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 -> formato gzip
+    try:
+        while True:
+            batch = await cursor.to_list(length=EXPORT_BATCH_SIZE)
+            if not batch:
+                break
+            chunk = "".join(json.dumps(doc, separators=(",", ":")) + "\n" for doc in batch).encode()
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+        if compressor:
+            yield compressor.flush()
+    finally:
+        await cursor.close()
+
+@app.get("/export")
+async def export_telemetria(
+    from_ms: Optional[int] = Query(None, alias="from"),
+    to_ms: Optional[int] = Query(None, alias="to"),
+    route_id: Optional[int] = None,
+    gzip: bool = False
+):
+    """
+    Exporta a telemetria de `dados_corrida` entre `from` e `to` (timestampMs)
+    e/ou de uma rota como NDJSON, em streaming. Com `gzip=true` o ficheiro é
+    enviado comprimido (.ndjson.gz).
+    """
+    query = timestamp_filter(from_ms, to_ms)
+    if route_id is not None:
+        query["route_id"] = route_id
+
+    filename = "telemetria.ndjson.gz" if gzip else "telemetria.ndjson"
+    return StreamingResponse(
+        export_lines(query, gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
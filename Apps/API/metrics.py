@@ -25,6 +25,40 @@ DB_CONNECTION_STATUS = Gauge(
     'Estado da conexão ao MongoDB (1 = conectado, 0 = desconectado)'
 )
 
+# Gauge para os índices declarados que não existem na BD
+INDEX_MISSING = Gauge(
+    'api_mongo_indexes_missing',
+    'Número de índices declarados que não existem na coleção',
+    ['collection']
+)
+
+# Contadores da cache de respostas (ver cache.py)
+CACHE_HITS = Counter(
+    'api_cache_hits_total',
+    'Pedidos servidos a partir da cache sem consultar a BD',
+    ['cache']
+)
+
+CACHE_MISSES = Counter(
+    'api_cache_misses_total',
+    'Pedidos que encontraram a cache expirada e a refrescaram a partir da BD',
+    ['cache']
+)
+
+CACHE_COALESCED = Counter(
+    'api_cache_coalesced_total',
+    'Pedidos que esperaram por um refrescamento já em curso (single-flight)',
+    ['cache']
+)
+
+# Histograma para a idade dos dados servidos por /dados, por rota
+DATA_AGE = Histogram(
+    'api_data_age_seconds',
+    'Idade da posição mais recente de cada rota no momento em que /dados é servido',
+    ['route'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+
 def start_metrics_server(port: int):
     """Inicia um servidor HTTP para expor as métricas do Prometheus."""
     try:
@@ -0,0 +1,40 @@
+"""
+Definições das rotas.
+
+As rotas são lidas uma única vez no arranque do ficheiro JSON partilhado com o
+produtor (`K8s-Config/Apps/routes.json`, montado através de uma ConfigMap e
+indicado em `ROUTES_FILE`), para que API e produtor usem sempre a mesma
+geometria. A resposta de `/rutas` é serializada aqui uma só vez, com um ETag
+forte calculado a partir do conteúdo.
+
+O formato do ficheiro tem de ser igual ao lido por `Apps/Producer/geometry.py`.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+def default_routes_file():
+    """
+    Ficheiro de rotas no repositório (`K8s-Config/Apps/routes.json`), usado
+    quando ROUTES_FILE não está definido. Calculado só quando é preciso: nas
+    imagens o código está em /app, sem a pasta K8s-Config.
+    """
+    return Path(__file__).resolve().parent.parent.parent / "K8s-Config" / "Apps" / "routes.json"
+
+
+def load_route_definitions(path=None):
+    """Lê as definições das rotas ({"rutas": [{"id", "name", "points"}, ...]}), ordenadas por id."""
+    path = Path(path or os.getenv("ROUTES_FILE") or default_routes_file())
+    with open(path, encoding="utf-8") as f:
+        rutas = json.load(f)["rutas"]
+    rutas.sort(key=lambda ruta: ruta["id"])
+    return rutas
+
+
+RUTAS = load_route_definitions()
+
+# Corpo de /rutas serializado no arranque e o respetivo ETag (forte: depende só do conteúdo)
+RUTAS_BODY = json.dumps({"rutas": RUTAS}, separators=(",", ":")).encode()
+RUTAS_ETAG = f'"{hashlib.sha256(RUTAS_BODY).hexdigest()[:32]}"'
@@ -0,0 +1,72 @@
+"""
+Testes do LTTB vetorizado (`downsample.lttb_indices`) contra a implementação
+de referência, ponto a ponto (Steinarsson, 2013).
+
+Executar na pasta Apps/API:
+    python -m pytest tests
+"""
+import math
+
+import numpy as np
+import pytest
+
+from downsample import lttb_indices
+
+
+def reference_lttb(x, y, threshold):
+    """LTTB original, em Python puro: índices dos pontos escolhidos."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Média do balde seguinte (o último ponto, no último balde)
+        avg_start = int(math.floor((i + 1) * every)) + 1
+        avg_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        avg_x = sum(x[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(y[avg_start:avg_end]) / (avg_end - avg_start)
+
+        range_start = int(math.floor(i * every)) + 1
+        range_end = int(math.floor((i + 1) * every)) + 1
+        max_area, chosen = -1.0, range_start
+        for j in range(range_start, range_end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a])) * 0.5
+            if area > max_area:
+                max_area, chosen = area, j
+        selected.append(chosen)
+        a = chosen
+    selected.append(n - 1)
+    return selected
+
+
+@pytest.mark.parametrize("n, max_points", [(10, 3), (100, 10), (1000, 37), (1001, 1000), (5000, 500)])
+def test_igual_a_referencia(n, max_points):
+    rng = np.random.default_rng(n)
+    # Passeio aleatório: curvas e troços retos, como uma trajetória
+    x = np.cumsum(rng.normal(size=n))
+    y = np.cumsum(rng.normal(size=n))
+
+    indices = lttb_indices(x, y, max_points)
+
+    assert indices.tolist() == reference_lttb(x.tolist(), y.tolist(), max_points)
+
+
+def test_mantem_extremos_e_ordem():
+    x = np.linspace(0.0, 1.0, 200)
+    y = np.sin(x * 20)
+
+    indices = lttb_indices(x, y, 20)
+
+    assert len(indices) == 20
+    assert indices[0] == 0 and indices[-1] == 199
+    assert np.all(np.diff(indices) > 0)
+
+
+@pytest.mark.parametrize("max_points", [2, 50, 100])
+def test_sem_reducao(max_points):
+    x = np.arange(50, dtype=np.float64)
+
+    assert lttb_indices(x, x, max_points).tolist() == list(range(50))
@@ -0,0 +1,63 @@
+"""
+Micro-benchmark dos codecs de mensagens.
+
+Mede, por mensagem, o custo de codificar (lado do produtor) e descodificar
+(lado do consumidor) cada codec disponível, e o tamanho do payload.
+
+Uso (na pasta Apps/Consumer):
+    python -m benchmarks.bench_codecs [--messages 100000]
+"""
+import argparse
+import random
+import time
+
+from src.core.codec import CODECS_BY_NAME, orjson
+
+
+def sample_messages(count: int):
+    """Gera mensagens com a mesma forma das de `Producer.get_data()`."""
+    now_ms = int(time.time() * 1000)
+    return [
+        {
+            "runner_id": random.randint(1, 2_147_483_647),
+            "route_id": random.randint(1, 3),
+            "current_segment": random.randint(0, 3),
+            "positionX": random.uniform(-20, 22),
+            "positionY": random.uniform(-17, 13),
+            "speedX": random.uniform(-1, 1),
+            "speedY": random.uniform(-1, 1),
+            "timestampMs": now_ms + i * 100,
+        }
+        for i in range(count)
+    ]
+
+
+def bench(codec, messages):
+    """Devolve (ns por encode, ns por decode, bytes médios por mensagem)."""
+    start = time.perf_counter_ns()
+    bodies = [codec.encode(message) for message in messages]
+    encode_ns = (time.perf_counter_ns() - start) / len(messages)
+
+    start = time.perf_counter_ns()
+    for body in bodies:
+        codec.decode(body)
+    decode_ns = (time.perf_counter_ns() - start) / len(messages)
+
+    return encode_ns, decode_ns, sum(len(body) for body in bodies) / len(bodies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000, help="mensagens por codec")
+    args = parser.parse_args()
+
+    messages = sample_messages(args.messages)
+    print(f"{args.messages} mensagens por codec (JSON com {'orjson' if orjson else 'json da stdlib'})")
+    print(f"{'codec':<10}{'encode ns/msg':>16}{'decode ns/msg':>16}{'bytes/msg':>12}")
+    for name, codec in CODECS_BY_NAME.items():
+        encode_ns, decode_ns, size = bench(codec, messages)
+        print(f"{name:<10}{encode_ns:>16.0f}{decode_ns:>16.0f}{size:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Benchmark do pipeline do consumidor, sem cluster.
+
+Passa mensagens sintéticas (com a forma de `Producer.get_data()`) pelo caminho
+real do motor 'thread': `RabbitMQConsumer._process_message` -> event loop da BD
+-> `WriteBehindBuffer` -> MongoDB. O canal e a ligação AMQP são substituídos por
+objetos em memória que registam os acks; o MongoDB é o mongomock-motor (por
+omissão) ou um mongod local indicado com `--mongo-uri`.
+
+Reporta o débito (mensagens/s até tudo estar persistido), a latência p50/p99 de
+`_process_message` por mensagem e o RSS máximo do processo.
+
+O mongomock-motor não suporta os upserts da coleção de últimas posições
+(`UpdateOne` com `sort`): nesse modo `save_latest_positions` é substituído por
+uma função que só conta os upserts, e o relatório indica que foram ignorados.
+Os números de referência obtêm-se com `--mongo-uri`, que mede o pipeline
+completo contra um mongod real.
+
+Uso (na pasta Apps/Consumer):
+    python -m benchmarks.bench_pipeline [--messages 50000] [--codec json]
+        [--ack-after-persist] [--mongo-uri mongodb://localhost:27017]
+"""
+import os
+
+# A configuração é lida do ambiente quando o consumidor é importado
+for _name in ("RABBITMQ_USER", "RABBITMQ_PASS", "MONGO_HOST", "MONGO_USER", "MONGO_PASS"):
+    os.environ.setdefault(_name, "bench")
+
+import argparse
+import asyncio
+import resource
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+import pika
+
+from benchmarks.bench_codecs import sample_messages
+from src.config import settings
+from src.core import write_buffer
+from src.core.codec import CODECS_BY_NAME
+from src.core.consumer import RabbitMQConsumer
+from src.core.indexes import ensure_indexes
+from src.core.write_buffer import WriteBehindBuffer
+
+
+class FakeChannel:
+    """Canal AMQP em memória: só regista acks e nacks."""
+    is_open = True
+
+    def __init__(self):
+        self.acked_single = 0
+        self.acked_through = 0  # maior delivery_tag confirmado com multiple=True
+        self.nacked = 0
+
+    @property
+    def acked(self):
+        return self.acked_single + self.acked_through
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        if multiple:
+            self.acked_through = max(self.acked_through, delivery_tag)
+        else:
+            self.acked_single += 1
+
+    def basic_nack(self, delivery_tag, multiple=False, requeue=True):
+        self.nacked += 1
+
+
+class FakeConnection:
+    """Ligação em memória: os callbacks thread-safe correm quando o fio de consumo os processa."""
+
+    def __init__(self):
+        self._callbacks = deque()
+
+    def add_callback_threadsafe(self, callback):
+        self._callbacks.append(callback)
+
+    def process_callbacks(self):
+        while self._callbacks:
+            self._callbacks.popleft()()
+
+
+def skip_latest_positions():
+    """
+    Substitui a escrita das últimas posições por um contador (mongomock-motor).
+    Devolve a lista com o número de upserts ignorados em cada lote.
+    """
+    skipped = []
+
+    async def save_latest_positions(db, updates):
+        skipped.append(len(updates))
+
+    write_buffer.save_latest_positions = save_latest_positions
+    return skipped
+
+
+def start_db_loop(consumer, mongo_uri, db_name):
+    """Prepara o event loop da BD do consumidor num fio dedicado, com o MongoDB escolhido."""
+    ready = threading.Event()
+    state = {}
+
+    def runner():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        async def init():
+            if mongo_uri:
+                from motor.motor_asyncio import AsyncIOMotorClient
+                client = AsyncIOMotorClient(mongo_uri)
+                await client.drop_database(db_name)
+            else:
+                from mongomock_motor import AsyncMongoMockClient
+                client = AsyncMongoMockClient()
+            db = client[db_name]
+            if mongo_uri:
+                await ensure_indexes(db)
+            state.update(client=client, db=db)
+            consumer._buffer = WriteBehindBuffer(
+                db,
+                max_batch_size=settings.BATCH_MAX_SIZE,
+                max_delay_ms=settings.BATCH_MAX_DELAY_MS,
+                on_flush=consumer._on_batch_flushed if consumer._ack_after_persist else None
+            )
+
+        loop.run_until_complete(init())
+        consumer._loop = loop
+        ready.set()
+        loop.run_forever()
+        loop.close()
+
+    thread = threading.Thread(target=runner, name="bench-db-loop", daemon=True)
+    thread.start()
+    ready.wait()
+    return thread, state
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=50_000, help="número de mensagens")
+    parser.add_argument("--codec", choices=sorted(CODECS_BY_NAME), default="json", help="codec das mensagens")
+    parser.add_argument("--ack-after-persist", action="store_true",
+                        help="confirma só depois da escrita (janela MAX_IN_FLIGHT)")
+    parser.add_argument("--mongo-uri", default=None,
+                        help="mongod local em vez do mongomock-motor (necessário para números de referência)")
+    parser.add_argument("--db-name", default="bench_consumer", help="base de dados usada (é apagada no início)")
+    args = parser.parse_args()
+
+    codec = CODECS_BY_NAME[args.codec]
+    bodies = [codec.encode(message) for message in sample_messages(args.messages)]
+    properties = pika.BasicProperties(content_type=codec.content_type, timestamp=int(time.time() * 1000))
+
+    consumer = RabbitMQConsumer(stop_event=threading.Event(), db=None)
+    consumer._ack_after_persist = args.ack_after_persist
+    consumer.channel, consumer.connection = FakeChannel(), FakeConnection()
+    skipped_latest = None if args.mongo_uri else skip_latest_positions()
+    loop_thread, state = start_db_loop(consumer, args.mongo_uri, args.db_name)
+
+    latencies = []
+    start = time.perf_counter()
+    for tag, body in enumerate(bodies, start=1):
+        if args.ack_after_persist:
+            # Emula o prefetch: o broker não entrega mais do que MAX_IN_FLIGHT por confirmar
+            while tag - consumer.channel.acked - consumer.channel.nacked > settings.MAX_IN_FLIGHT:
+                consumer.connection.process_callbacks()
+                time.sleep(0.0005)
+        elif tag % 100 == 0:
+            consumer.connection.process_callbacks()
+
+        method = SimpleNamespace(delivery_tag=tag)
+        t0 = time.perf_counter()
+        consumer._process_message(consumer.channel, method, properties, body)
+        latencies.append(time.perf_counter() - t0)
+
+    # Esperar que todos os documentos estejam escritos (e os acks processados)
+    asyncio.run_coroutine_threadsafe(consumer._buffer.close(), consumer._loop).result()
+    consumer.connection.process_callbacks()
+    elapsed = time.perf_counter() - start
+
+    stored = asyncio.run_coroutine_threadsafe(
+        state["db"][settings.COLLECTION_NAME].count_documents({}), consumer._loop
+    ).result()
+    consumer._loop.call_soon_threadsafe(consumer._loop.stop)
+    loop_thread.join(timeout=5)
+
+    latencies.sort()
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # ru_maxrss em KiB (Linux)
+    print(f"{args.messages} mensagens ({args.codec}, "
+          f"{'ack-after-persist' if args.ack_after_persist else 'ack imediato'}, "
+          f"{'mongod ' + args.mongo_uri if args.mongo_uri else 'mongomock-motor'})")
+    print(f"débito:           {args.messages / elapsed:,.0f} msgs/s ({elapsed:.2f}s até tudo persistido)")
+    print(f"_process_message: p50 {percentile(latencies, 0.50) * 1e6:.1f} µs, "
+          f"p99 {percentile(latencies, 0.99) * 1e6:.1f} µs")
+    print(f"RSS máximo:       {max_rss_mb:.1f} MiB")
+    print(f"acks: {consumer.channel.acked}, nacks: {consumer.channel.nacked}, documentos na BD: {stored}")
+    if skipped_latest is not None:
+        print(f"AVISO: {sum(skipped_latest)} upserts de {settings.LATEST_COLLECTION_NAME} não escritos "
+              f"({len(skipped_latest)} lotes): o mongomock-motor não os suporta. "
+              f"Usar --mongo-uri para medir o pipeline completo.")
+
+
+if __name__ == "__main__":
+    main()
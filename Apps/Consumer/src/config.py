@@ -13,6 +13,19 @@ class Settings(BaseSettings):
     RABBITMQ_HOST: str = 'localhost'  # Padrão para desenvolvimento local
     QUEUE_NAME: str = 'real_time_data'
 
+    # Filas particionadas por runner_id (ver core/partitions.py); 1 = uma única fila.
+    # Tem de ser igual ao PARTITIONS do produtor
+    PARTITIONS: int = 1
+    PARTITION_IDS: str = ''         # partições reclamadas, ex. "0,2"; vazio = todas
+    PARTITION_OWNERS: int = 0       # réplicas do StatefulSet que repartem as partições pelo ordinal; 0 = nenhuma
+    POD_NAME: str = ''              # nome do pod (downward API); vazio = hostname
+
+    # Motor de consumo: 'thread' (pika bloqueante + loop da BD num fio dedicado)
+    # ou 'asyncio' (aio-pika e Motor num único event loop)
+    CONSUMER_ENGINE: str = 'thread'
+    HANDLER_TASKS: int = 4          # tarefas concorrentes no motor 'asyncio'
+    CONSUMER_WORKERS: int = 1       # processos trabalhadores por pod (>1 ativa o supervisor)
+
     # MongoDB
     MONGO_HOST: str
     MONGO_PORT: str = '27017'
@@ -20,6 +33,33 @@ class Settings(BaseSettings):
     MONGO_PASS: str
     DB_NAME: str = 'projeto_sd'
     COLLECTION_NAME: str = 'dados_corrida'
+    LATEST_COLLECTION_NAME: str = 'runner_latest'  # última posição de cada corredor
+    INDEX_STATS_INTERVAL_S: int = 300  # intervalo entre verificações de índices não usados
+
+    # Armazenamento em coleção time-series (só se aplica ao criar a coleção;
+    # para converter dados existentes usar `python -m src.migrate_timeseries`)
+    TIMESERIES_ENABLED: bool = False
+    TIMESERIES_GRANULARITY: str = 'seconds'
+    TIMESERIES_EXPIRE_AFTER_S: int = 0  # retenção (TTL) em segundos; 0 = sem expiração
+
+    # Escrita em lote (write-behind)
+    BATCH_MAX_SIZE: int = 500       # número máximo de documentos por insert_many
+    BATCH_MAX_DELAY_MS: int = 200   # tempo máximo que um documento espera no buffer
+
+    # Confirmação das mensagens só depois de persistidas no MongoDB
+    ACK_AFTER_PERSIST: bool = False
+    MAX_IN_FLIGHT: int = 1000       # prefetch (basic_qos) = mensagens por confirmar
+
+    # Stream em direto (WebSocket) com as posições dos corredores
+    LIVE_STREAM_ENABLED: bool = True
+    LIVE_STREAM_PORT: int = 8765
+    LIVE_TICK_MS: int = 200         # intervalo entre frames (as atualizações são agrupadas)
+    LIVE_RUNNER_TTL_S: int = 60     # corredores sem mensagens há mais tempo saem do estado; 0 = nunca
+
+    # Monitorização da fila (queue_declare passivo) para o autoscaling
+    QUEUE_MONITOR_ENABLED: bool = True
+    QUEUE_MONITOR_INTERVAL_S: float = 5.0
+    QUEUE_DRAIN_TIME_MAX_S: float = 3600.0  # valor reportado com a fila parada
 
     # Prometheus
     METRICS_PORT: int = 8001
@@ -0,0 +1,47 @@
+"""
+Módulo de Gestão de Confirmações (acks).
+
+Este módulo define a classe `AckTracker`, que regista as entregas do RabbitMQ
+ainda por confirmar e calcula até que `delivery_tag` se pode enviar um único
+`basic_ack(multiple=True)` sem confirmar mensagens que ainda não foram
+persistidas no MongoDB.
+"""
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional
+
+
+class AckTracker:
+    """
+    Janela de entregas em curso, pela ordem em que chegaram.
+    Não é thread-safe: deve ser usada apenas no fio da ligação ao RabbitMQ.
+    """
+
+    def __init__(self):
+        self._outstanding: Deque[int] = deque()
+        self._completed: Dict[int, bool] = {}
+
+    def __len__(self) -> int:
+        return len(self._outstanding)
+
+    def track(self, delivery_tag: int):
+        """Regista uma entrega cujo resultado ainda não é conhecido."""
+        self._outstanding.append(delivery_tag)
+
+    def complete(self, delivery_tags: Iterable[int], acked: bool = True) -> Optional[int]:
+        """
+        Marca entregas como concluídas (confirmadas ou rejeitadas à parte).
+
+        Returns:
+            O maior `delivery_tag` confirmado do prefixo contínuo de entregas
+            concluídas, para usar com `basic_ack(multiple=True)`, ou None se não
+            houver nada novo a confirmar.
+        """
+        for tag in delivery_tags:
+            self._completed[tag] = acked
+
+        ack_up_to = None
+        while self._outstanding and self._outstanding[0] in self._completed:
+            tag = self._outstanding.popleft()
+            if self._completed.pop(tag):
+                ack_up_to = tag
+        return ack_up_to
@@ -0,0 +1,275 @@
+"""
+Módulo do Consumidor RabbitMQ Assíncrono.
+
+Este módulo define a classe `AsyncRabbitMQConsumer`, um motor de consumo
+alternativo ao `RabbitMQConsumer` que corre inteiramente num único event loop
+de asyncio: a ligação ao RabbitMQ (aio-pika), as tarefas que processam as
+mensagens e o acesso ao MongoDB (Motor) partilham o mesmo loop, sem fios
+extra nem futuras entre fios.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import aio_pika
+from aio_pika.abc import AbstractChannel, AbstractConnection, AbstractIncomingMessage, AbstractQueue
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from ..config import settings
+from ..metrics import MESSAGES_PROCESSED, PROCESSING_TIME, LAST_MESSAGE_TIMESTAMP, IN_FLIGHT_MESSAGES
+from .acks import AckTracker
+from .indexes import ensure_indexes, monitor_index_usage
+from .repository import ensure_telemetry_collection
+from .codec import CodecError
+from .telemetry import decode_telemetry
+from .latency import observe_broker_lag
+from .write_buffer import WriteBehindBuffer
+from .state import manager
+from .partitions import consumed_queues, partition_exchange, partition_queue
+
+logger = logging.getLogger('ConsumerMicroservice')
+
+
+class AsyncRabbitMQConsumer:
+    """Encapsula o consumo de mensagens do RabbitMQ num único event loop."""
+
+    def __init__(self, handler_tasks: int = settings.HANDLER_TASKS, queues: Optional[List[str]] = None):
+        """Inicializa o consumidor; `queues` são as filas a consumir (por omissão, segundo `PARTITIONS`)."""
+        self._handler_tasks = max(1, handler_tasks)
+        self._queues = queues or consumed_queues()
+        self._stop_event = asyncio.Event()
+        self._connection: Optional[AbstractConnection] = None
+        self._connection_lost = False
+        self._db_client: Optional[AsyncIOMotorClient] = None
+        self._buffer: Optional[WriteBehindBuffer] = None
+        self._index_monitor: Optional[asyncio.Task] = None
+        # Modo ack-after-persist: só confirma mensagens depois de escritas no MongoDB
+        self._ack_after_persist = settings.ACK_AFTER_PERSIST
+        self._acks = AckTracker()
+        self._in_flight: Dict[int, AbstractIncomingMessage] = {}
+        self._settling: Set[asyncio.Task] = set()
+        self.consumed = 0  # mensagens consumidas (lido pelo monitor da fila)
+
+    def stop(self):
+        """Pede a paragem do consumidor (pode ser usado como signal handler)."""
+        self._stop_event.set()
+
+    async def _init_db(self):
+        """Cria o cliente Motor e o buffer de escrita no loop corrente."""
+        mongo_connection_string = f"mongodb://{settings.MONGO_USER}:{settings.MONGO_PASS}@{settings.MONGO_HOST}:{settings.MONGO_PORT}"
+        self._db_client = AsyncIOMotorClient(mongo_connection_string)
+        db = self._db_client.get_database(settings.DB_NAME)
+        await ensure_telemetry_collection(db)
+        await ensure_indexes(db)
+        self._index_monitor = asyncio.create_task(monitor_index_usage(db, settings.INDEX_STATS_INTERVAL_S))
+
+        self._buffer = WriteBehindBuffer(
+            db,
+            max_batch_size=settings.BATCH_MAX_SIZE,
+            max_delay_ms=settings.BATCH_MAX_DELAY_MS,
+            on_flush=self._on_batch_flushed if self._ack_after_persist else None
+        )
+
+    async def _connect(self) -> bool:
+        """
+        Tenta conectar-se ao RabbitMQ até conseguir ou até ser pedida a paragem.
+
+        A ligação não é 'robust': depois de uma reconexão os delivery_tags
+        recomeçam em 1 no novo canal e o `AckTracker` poderia confirmar entregas
+        novas com acks de lotes antigos. Tal como o motor 'thread', o consumidor
+        termina quando a ligação cai (ver `_on_connection_lost`) e é reiniciado.
+        """
+        while not self._stop_event.is_set():
+            try:
+                self._connection = await aio_pika.connect(
+                    host=settings.RABBITMQ_HOST,
+                    port=5672,
+                    login=settings.RABBITMQ_USER,
+                    password=settings.RABBITMQ_PASS
+                )
+                return True
+            except (aio_pika.exceptions.AMQPConnectionError, OSError) as e:
+                logger.error(f"Não foi possível conectar ao RabbitMQ: {e}. A tentar novamente em 5 segundos...")
+                try:
+                    await asyncio.wait_for(self._stop_event.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    pass
+        return False
+
+    async def _declare_queues(self, channel: AbstractChannel) -> Dict[str, AbstractQueue]:
+        """
+        Declara a fila ou, com `PARTITIONS` > 1, a exchange e as filas de todas as
+        partições (tal como o produtor). Devolve as filas a consumir, por nome.
+        """
+        if settings.PARTITIONS <= 1:
+            return {settings.QUEUE_NAME: await channel.declare_queue(settings.QUEUE_NAME, durable=True)}
+        exchange = await channel.declare_exchange(
+            partition_exchange(settings.QUEUE_NAME), aio_pika.ExchangeType.DIRECT, durable=True
+        )
+        queues = {}
+        for partition in range(settings.PARTITIONS):
+            queue = await channel.declare_queue(partition_queue(settings.QUEUE_NAME, partition), durable=True)
+            await queue.bind(exchange, routing_key=str(partition))
+            queues[queue.name] = queue
+        return {name: queues[name] for name in self._queues}
+
+    def _on_connection_lost(self, sender, exc: Optional[BaseException] = None):
+        """
+        Chamado quando a ligação ou o canal fecham. Fora de uma paragem pedida,
+        termina o consumidor: as mensagens por confirmar voltam à fila no broker
+        e as que já foram escritas são reconhecidas como repetidas pelo `_id`.
+        """
+        if self._stop_event.is_set():
+            return
+        logger.error(f"A ligação ao RabbitMQ foi perdida: {exc}. O consumidor asyncio vai terminar.")
+        self._connection_lost = True
+        self._stop_event.set()
+
+    def _on_batch_flushed(self, delivery_tags: List[int], success: bool):
+        """Chamado pelo buffer quando um lote termina de ser escrito."""
+        task = asyncio.get_running_loop().create_task(self._settle_deliveries(delivery_tags, success))
+        self._settling.add(task)
+        task.add_done_callback(self._settling.discard)
+
+    async def _settle_deliveries(self, delivery_tags: List[int], success: bool):
+        """
+        Confirma (ou devolve à fila) as entregas de um lote, usando um único
+        ack(multiple=True) por prefixo contínuo de entregas persistidas.
+        """
+        ack_up_to = None
+        if self._connection_lost:
+            # As entregas do canal perdido já voltaram à fila; os tags não podem ser confirmados
+            return
+        try:
+            if not success:
+                for tag in delivery_tags:
+                    message = self._in_flight.get(tag)
+                    if message:
+                        await message.nack(requeue=True)
+            ack_up_to = self._acks.complete(delivery_tags, acked=success)
+            if ack_up_to is not None:
+                await self._in_flight[ack_up_to].ack(multiple=True)
+        except Exception as e:
+            logger.error(f"Erro ao confirmar as mensagens do lote: {e}")
+        finally:
+            if not success:
+                for tag in delivery_tags:
+                    self._in_flight.pop(tag, None)
+            if ack_up_to is not None:
+                # Os delivery_tags são crescentes: tudo até ack_up_to está resolvido
+                for tag in [t for t in self._in_flight if t <= ack_up_to]:
+                    del self._in_flight[tag]
+            IN_FLIGHT_MESSAGES.set(len(self._acks))
+
+    async def _handle_message(self, message: AbstractIncomingMessage, received_at: float):
+        """
+        Processa uma única mensagem: descodifica-a (codec escolhido pelo
+        content_type), atualiza o estado global e entrega o documento ao
+        buffer de escrita em lote. `received_at` é o `time.perf_counter()` da
+        entrega da mensagem pelo aio-pika.
+        """
+        start_time = time.time()
+        ack_now = True
+
+        try:
+            with PROCESSING_TIME.time():
+                telemetry_doc = decode_telemetry(message.body, message.content_type)
+                observe_broker_lag(message.timestamp, telemetry_doc)
+
+                # Atualizar o estado global (para WebSockets/API)
+                manager.update(telemetry_doc)
+
+                if self._ack_after_persist:
+                    # O ack só é enviado quando o lote que contém a mensagem for escrito
+                    ack_now = False
+                    self._acks.track(message.delivery_tag)
+                    self._in_flight[message.delivery_tag] = message
+                    IN_FLIGHT_MESSAGES.set(len(self._acks))
+                    self._buffer.add(telemetry_doc, message.delivery_tag, received_at)
+                else:
+                    self._buffer.add(telemetry_doc, None, received_at)
+
+                MESSAGES_PROCESSED.inc()
+                self.consumed += 1
+                LAST_MESSAGE_TIMESTAMP.set(time.time())
+                logger.debug(f"Mensagem processada em {time.time() - start_time:.6f}s.")
+
+        except CodecError as e:
+            logger.error(f"Erro ao descodificar mensagem ({message.content_type}): {e}")
+        except Exception as e:
+            logger.error(f"Erro ao processar mensagem: {e}")
+        finally:
+            # Mensagens inválidas são sempre confirmadas (descartadas)
+            if ack_now and not self._connection_lost:
+                try:
+                    await message.ack()
+                except Exception as e:
+                    logger.error(f"Erro ao confirmar a mensagem: {e}")
+
+    async def _handler(self, work: "asyncio.Queue[Tuple[float, AbstractIncomingMessage]]"):
+        """Tarefa que processa mensagens da fila interna até ser cancelada."""
+        while True:
+            received_at, message = await work.get()
+            try:
+                await self._handle_message(message, received_at)
+            finally:
+                work.task_done()
+
+    async def run(self):
+        """
+        Ciclo de vida completo do consumidor: liga ao MongoDB e ao RabbitMQ,
+        consome mensagens com `HANDLER_TASKS` tarefas concorrentes e, quando é
+        pedida a paragem, escreve o buffer pendente e fecha as ligações.
+        """
+        await self._init_db()
+        logger.info("Ligação ao MongoDB configurada no event loop do consumidor.")
+
+        logger.info("Conectando ao RabbitMQ...")
+        if not await self._connect():
+            self._index_monitor.cancel()
+            self._db_client.close()
+            return
+
+        # Fila interna limitada: quando os handlers não acompanham, o callback do
+        # aio-pika espera e o prefetch impede o broker de enviar mais mensagens
+        work: "asyncio.Queue[Tuple[float, AbstractIncomingMessage]]" = asyncio.Queue(maxsize=self._handler_tasks * 2)
+        handlers = [asyncio.create_task(self._handler(work)) for _ in range(self._handler_tasks)]
+
+        async def enqueue(message: AbstractIncomingMessage):
+            # Instante da entrega, para medir a espera na fila interna
+            await work.put((time.perf_counter(), message))
+
+        try:
+            self._connection.close_callbacks.add(self._on_connection_lost)
+            channel = await self._connection.channel()
+            channel.close_callbacks.add(self._on_connection_lost)
+            await channel.set_qos(prefetch_count=settings.MAX_IN_FLIGHT)
+            queues = await self._declare_queues(channel)
+            consumer_tags = {name: await queue.consume(enqueue) for name, queue in queues.items()}
+            logger.info(
+                f"Consumidor RabbitMQ (asyncio) a consumir da(s) fila(s) {', '.join(queues)} "
+                f"com {self._handler_tasks} tarefas."
+            )
+
+            await self._stop_event.wait()
+
+            logger.info("A parar o consumidor asyncio...")
+            if not self._connection_lost:
+                for name, queue in queues.items():
+                    await queue.cancel(consumer_tags[name])
+                await work.join()
+        finally:
+            self._index_monitor.cancel()
+            for task in handlers:
+                task.cancel()
+            await asyncio.gather(*handlers, return_exceptions=True)
+
+            # Escrever o que resta no buffer; os acks dos lotes seguem antes de fechar
+            await self._buffer.close()
+            if self._settling:
+                await asyncio.gather(*self._settling, return_exceptions=True)
+            if not self._connection.is_closed:
+                await self._connection.close()
+            self._db_client.close()
+            logger.info("Consumidor RabbitMQ (asyncio) encerrado.")
@@ -6,26 +6,34 @@ ao RabbitMQ, consumir mensagens de uma fila específica, processá-las e
 transmiti-las para os clientes WebSocket conectados.
 """
 import asyncio
-import json
+import functools
 import logging
 import threading
 import pika
 from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorClient
 from pika.exceptions import AMQPConnectionError
 import time
+from typing import List, Optional
 
 from ..config import settings
-from ..metrics import MESSAGES_PROCESSED, PROCESSING_TIME, LAST_MESSAGE_TIMESTAMP
-from .repository import save_telemetry_data
+from ..metrics import MESSAGES_PROCESSED, PROCESSING_TIME, LAST_MESSAGE_TIMESTAMP, IN_FLIGHT_MESSAGES
+from .acks import AckTracker
+from .indexes import ensure_indexes, monitor_index_usage
+from .repository import ensure_telemetry_collection
+from .codec import CodecError
+from .telemetry import decode_telemetry
+from .latency import observe_broker_lag
+from .write_buffer import WriteBehindBuffer
 from .state import manager
+from .partitions import consumed_queues, partition_exchange, partition_queue
 
 logger = logging.getLogger('ConsumerMicroservice')
 
 class RabbitMQConsumer(threading.Thread):
     """Encapsula a lógica de consumo de mensagens do RabbitMQ."""
 
-    def __init__(self, stop_event: threading.Event, db: AsyncIOMotorDatabase):
-        """Inicializa o consumidor."""
+    def __init__(self, stop_event: threading.Event, db: AsyncIOMotorDatabase, queues: Optional[List[str]] = None):
+        """Inicializa o consumidor; `queues` são as filas a consumir (por omissão, segundo `PARTITIONS`)."""
         self.connection = None
         self.channel = None
         self._stop_event = stop_event
@@ -34,7 +42,14 @@ class RabbitMQConsumer(threading.Thread):
         self._loop_thread = None
         self._db_loop_ready = threading.Event()
         self._db = db
+        self._queues = queues or consumed_queues()
         self._db_client = None  # cliente Motor será criado no loop dedicado
+        self._buffer = None  # buffer de escrita em lote, criado no loop dedicado
+        self._index_monitor = None  # tarefa periódica de verificação de índices
+        # Modo ack-after-persist: só confirma mensagens depois de escritas no MongoDB
+        self._ack_after_persist = settings.ACK_AFTER_PERSIST
+        self._acks = AckTracker()
+        self.consumed = 0  # mensagens consumidas (lido pelo monitor da fila)
         super().__init__(target=self.run, daemon=True)
 
     def _start_db_loop(self):
@@ -51,17 +66,20 @@ class RabbitMQConsumer(threading.Thread):
                 self._db_client = AsyncIOMotorClient(mongo_connection_string)
                 self._db = self._db_client.get_database(settings.DB_NAME)
 
-                # Garantir coleção e índice
-                collections = await self._db.list_collection_names()
-                if settings.COLLECTION_NAME not in collections:
-                    await self._db.create_collection(settings.COLLECTION_NAME)
-                    try:
-                        await self._db[settings.COLLECTION_NAME].create_index('timestampMs')
-                    except Exception:
-                        pass
-                    logger.info(f"Coleção criada: {settings.DB_NAME}.{settings.COLLECTION_NAME}")
-                else:
-                    logger.info(f"Coleção existente: {settings.DB_NAME}.{settings.COLLECTION_NAME}")
+                # Garantir coleção e índices
+                await ensure_telemetry_collection(self._db)
+                await ensure_indexes(self._db)
+                self._index_monitor = loop.create_task(
+                    monitor_index_usage(self._db, settings.INDEX_STATS_INTERVAL_S)
+                )
+
+                # Buffer de escrita diferida que agrupa os documentos em insert_many
+                self._buffer = WriteBehindBuffer(
+                    self._db,
+                    max_batch_size=settings.BATCH_MAX_SIZE,
+                    max_delay_ms=settings.BATCH_MAX_DELAY_MS,
+                    on_flush=self._on_batch_flushed if self._ack_after_persist else None
+                )
 
             # Inicializar DB antes de começar o loop
             loop.run_until_complete(_init_db())
@@ -80,6 +98,14 @@ class RabbitMQConsumer(threading.Thread):
 
     def _stop_db_loop(self):
         """Pára o event loop dedicado e junta o fio."""
+        # Escrever os documentos que ainda estão no buffer antes de parar o loop
+        if self._buffer and self._loop and self._loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(self._buffer.close(), self._loop).result(timeout=5)
+            except Exception as e:
+                logger.error(f"Falha ao escrever o buffer pendente no MongoDB: {e}")
+        if self._index_monitor and self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._index_monitor.cancel)
         if self._loop and self._loop.is_running():
             self._loop.call_soon_threadsafe(self._loop.stop)
         if self._loop_thread and self._loop_thread.is_alive():
@@ -97,8 +123,12 @@ class RabbitMQConsumer(threading.Thread):
                 parameters = pika.ConnectionParameters(settings.RABBITMQ_HOST, 5672, '/', credentials)
                 self.connection = pika.BlockingConnection(parameters)
                 self.channel = self.connection.channel()
-                self.channel.queue_declare(queue=settings.QUEUE_NAME, durable=True)
-                logger.info(f"Consumidor RabbitMQ conectado e a consumir da fila: {settings.QUEUE_NAME}")
+                self._declare_queues()
+                if self._ack_after_persist:
+                    # O prefetch limita as mensagens por confirmar: quando o MongoDB
+                    # abranda, a contrapressão chega ao RabbitMQ e não à memória
+                    self.channel.basic_qos(prefetch_count=settings.MAX_IN_FLIGHT)
+                logger.info(f"Consumidor RabbitMQ conectado e a consumir da(s) fila(s): {', '.join(self._queues)}")
                 return True
             except AMQPConnectionError as e:
                 logger.error(f"Não foi possível conectar ao RabbitMQ: {e}. A tentar novamente em 5 segundos...")
@@ -108,68 +138,104 @@ class RabbitMQConsumer(threading.Thread):
         
         return False # Return False if stop_event was set
 
+    def _declare_queues(self):
+        """
+        Declara a fila ou, com `PARTITIONS` > 1, a exchange e as filas de todas as
+        partições (tal como o produtor), para que nenhuma mensagem fique sem fila.
+        """
+        if settings.PARTITIONS <= 1:
+            self.channel.queue_declare(queue=settings.QUEUE_NAME, durable=True)
+            return
+        exchange = partition_exchange(settings.QUEUE_NAME)
+        self.channel.exchange_declare(exchange=exchange, exchange_type='direct', durable=True)
+        for partition in range(settings.PARTITIONS):
+            queue = partition_queue(settings.QUEUE_NAME, partition)
+            self.channel.queue_declare(queue=queue, durable=True)
+            self.channel.queue_bind(queue=queue, exchange=exchange, routing_key=str(partition))
+
+    def _on_batch_flushed(self, delivery_tags, success):
+        """
+        Chamado no event loop da BD quando um lote termina de ser escrito.
+        Passa o resultado para o fio do RabbitMQ, o único que pode usar o canal.
+        """
+        try:
+            self.connection.add_callback_threadsafe(
+                functools.partial(self._settle_deliveries, delivery_tags, success)
+            )
+        except Exception as e:
+            # A ligação fechou: as mensagens por confirmar voltam à fila no broker
+            logger.error(f"Não foi possível agendar os acks do lote: {e}")
+
+    def _settle_deliveries(self, delivery_tags, success):
+        """
+        Confirma (ou devolve à fila) as entregas de um lote. Executado no fio do
+        RabbitMQ; usa um único basic_ack(multiple=True) por prefixo contínuo.
+        """
+        if not self.channel or not self.channel.is_open:
+            return
+        if not success:
+            for tag in delivery_tags:
+                self.channel.basic_nack(delivery_tag=tag, requeue=True)
+        ack_up_to = self._acks.complete(delivery_tags, acked=success)
+        if ack_up_to is not None:
+            self.channel.basic_ack(delivery_tag=ack_up_to, multiple=True)
+        IN_FLIGHT_MESSAGES.set(len(self._acks))
+
     def _process_message(self, ch, method, properties, body):
         """
         Processa uma única mensagem recebida do RabbitMQ.
-        Descodifica o JSON, atualiza o estado global e agenda a escrita no MongoDB
-        de forma thread-safe usando o event loop dedicado.
+        Descodifica a mensagem (codec escolhido pelo content_type), atualiza o estado global e entrega o documento ao
+        buffer de escrita em lote, de forma thread-safe, no event loop dedicado.
         """
-        start_time = time.time()
+        received_at = time.perf_counter()
+        ack_now = True
         
         try:
             with PROCESSING_TIME.time():
                 # Descodificar a mensagem
-                raw_data = json.loads(body.decode('utf-8'))
-
-                # Produtor envia objeto JSON (não array)
-                telemetry_doc = {
-                    "runner_id": raw_data["runner_id"],
-                    "route_id": raw_data.get("route_id"),
-                    "current_segment": raw_data.get("current_segment"),
-                    "positionX": raw_data["positionX"],
-                    "positionY": raw_data["positionY"],
-                    "speedX": raw_data["speedX"],
-                    "speedY": raw_data["speedY"],
-                    "timestampMs": raw_data["timestampMs"]
-                }
+                telemetry_doc = decode_telemetry(body, properties.content_type)
+                observe_broker_lag(properties.timestamp, telemetry_doc)
 
                 # Atualizar o estado global (para WebSockets/API)
-                manager.update_last_message(telemetry_doc)
+                manager.update(telemetry_doc)
 
                 if not self._loop or not self._loop.is_running():
                     logger.error("Event loop de DB não está a correr; não é possível guardar no MongoDB.")
+                    if self._ack_after_persist:
+                        # Devolver à fila em vez de perder a mensagem
+                        ack_now = False
+                        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
                 else:
-                    # Agendar escrita no loop assíncrono dedicado
-                    future = asyncio.run_coroutine_threadsafe(
-                        save_telemetry_data(self._db, telemetry_doc),
-                        self._loop
-                    )
-                    # Registar caso a futura falhe
-                    def _done(fut):
-                        try:
-                            fut.result()
-                        except Exception as ex:
-                            logger.error(f"Falha ao inserir no MongoDB: {ex}")
-                    future.add_done_callback(_done)
+                    if self._ack_after_persist:
+                        # O ack só é enviado quando o lote que contém a mensagem for escrito
+                        ack_now = False
+                        self._acks.track(method.delivery_tag)
+                        IN_FLIGHT_MESSAGES.set(len(self._acks))
+                        self._loop.call_soon_threadsafe(
+                            self._buffer.add, telemetry_doc, method.delivery_tag, received_at
+                        )
+                    else:
+                        # Entregar o documento ao buffer no loop assíncrono dedicado;
+                        # a escrita é feita em lote com insert_many
+                        self._loop.call_soon_threadsafe(self._buffer.add, telemetry_doc, None, received_at)
 
                     # Incrementa contador
                     MESSAGES_PROCESSED.inc()
+                    self.consumed += 1
                     
                     # Atualiza timestamp
                     LAST_MESSAGE_TIMESTAMP.set(time.time())
                     
-                    # Regista duração
-                    duration = time.time() - start_time
-                    PROCESSING_TIME.observe(duration)
-                    
-                    logger.info("Mensagem recebida e agendada para ser guardada no MongoDB.")
+                    logger.info("Mensagem recebida e entregue ao buffer de escrita do MongoDB.")
 
-        except json.JSONDecodeError:
-            logger.error(f"Erro ao descodificar JSON: {body.decode('utf-8')}")
+        except CodecError as e:
+            logger.error(f"Erro ao descodificar mensagem ({properties.content_type}): {e}")
         except Exception as e:
             logger.error(f"Erro ao processar mensagem: {e}")
         finally:
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            # Mensagens inválidas são sempre confirmadas (descartadas)
+            if ack_now:
+                ch.basic_ack(delivery_tag=method.delivery_tag)
 
     def run(self):
         """
@@ -187,13 +253,21 @@ class RabbitMQConsumer(threading.Thread):
             return
 
         try:
-            self.channel.basic_consume(queue=settings.QUEUE_NAME, on_message_callback=self._process_message)
+            # Os delivery_tags são do canal: o ack(multiple=True) abrange todas as filas
+            for queue in self._queues:
+                self.channel.basic_consume(queue=queue, on_message_callback=self._process_message)
             while not self._stop_event.is_set():
                 self.connection.process_data_events(time_limit=1)
         except (pika.exceptions.StreamLostError, pika.exceptions.AMQPConnectionError) as e:
             logger.error(f"A ligação ao RabbitMQ foi perdida: {e}. A thread do consumidor vai terminar.")
         finally:
+            # Escrever o buffer pendente antes de fechar a ligação, para que os
+            # acks desses lotes ainda possam ser enviados
+            self._stop_db_loop()
             if self.connection and self.connection.is_open:
+                try:
+                    self.connection.process_data_events(time_limit=0)
+                except Exception as e:
+                    logger.error(f"Erro ao enviar os acks pendentes: {e}")
                 self.connection.close()
-            self._stop_db_loop()
             logger.info("Thread do consumidor RabbitMQ encerrada.")
@@ -0,0 +1,79 @@
+"""
+Módulo de Gestão de Índices.
+
+Este módulo declara os índices de que o consumidor e a API dependem e cria-os
+no arranque de forma idempotente (`create_indexes` não faz nada se o índice já
+existir com a mesma definição). Também reporta como métricas os índices
+declarados que não existem e os índices existentes que nunca foram usados.
+
+A declaração tem de ser igual à de `Apps/API/indexes.py`.
+"""
+import asyncio
+import logging
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from ..config import settings
+from ..metrics import INDEX_MISSING, INDEX_UNUSED
+
+logger = logging.getLogger('ConsumerMicroservice.Indexes')
+
+
+def declared_indexes() -> Dict[str, List[IndexModel]]:
+    """Índices declarados por coleção."""
+    return {
+        settings.COLLECTION_NAME: [
+            IndexModel([("timestampMs", ASCENDING)], name="timestampMs_1"),
+            # /corredor/{runner_id}: filtra por corredor e ordena por tempo
+            IndexModel([("runner_id", ASCENDING), ("timestampMs", DESCENDING)], name="runner_id_1_timestampMs_-1"),
+            # Consultas por rota num intervalo de tempo
+            IndexModel([("route_id", ASCENDING), ("timestampMs", DESCENDING)], name="route_id_1_timestampMs_-1"),
+        ],
+        settings.LATEST_COLLECTION_NAME: [
+            IndexModel([("timestampMs", ASCENDING)], name="timestampMs_1"),
+        ],
+    }
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase):
+    """Cria os índices declarados que ainda não existem e reporta os que faltam."""
+    for collection_name, models in declared_indexes().items():
+        collection = db.get_collection(collection_name)
+        try:
+            await collection.create_indexes(models)
+        except Exception as e:
+            logger.error(f"Não foi possível criar os índices de {collection_name}: {e}")
+
+        existing = await collection.index_information()
+        missing = [model.document["name"] for model in models if model.document["name"] not in existing]
+        INDEX_MISSING.labels(collection=collection_name).set(len(missing))
+        if missing:
+            logger.error(f"Índices em falta em {collection_name}: {missing}")
+        else:
+            logger.info(f"Índices de {collection_name} verificados.")
+
+
+async def report_index_usage(db: AsyncIOMotorDatabase):
+    """
+    Atualiza a métrica de índices não usados a partir de `$indexStats`
+    (contadores desde o último arranque do servidor MongoDB).
+    """
+    for collection_name in declared_indexes():
+        collection = db.get_collection(collection_name)
+        try:
+            async for stats in collection.aggregate([{"$indexStats": {}}]):
+                if stats["name"] == "_id_":
+                    continue
+                unused = 1 if stats["accesses"]["ops"] == 0 else 0
+                INDEX_UNUSED.labels(collection=collection_name, index=stats["name"]).set(unused)
+        except Exception as e:
+            logger.error(f"Não foi possível obter as estatísticas de índices de {collection_name}: {e}")
+
+
+async def monitor_index_usage(db: AsyncIOMotorDatabase, interval_seconds: int):
+    """Reporta periodicamente a utilização dos índices até ser cancelada."""
+    while True:
+        await report_index_usage(db)
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,50 @@
+"""
+Módulo de Latência do Pipeline.
+
+Mede, por rota, a latência de cada etapa entre o produtor e o MongoDB:
+
+- produce -> dequeue: desde a publicação (timestamp AMQP, ou `timestampMs` do
+  documento se faltar) até o consumidor receber a mensagem. Compara relógios de
+  máquinas diferentes, por isso inclui o desvio entre eles.
+- dequeue -> scheduled: desde a receção até o documento entrar no buffer de
+  escrita (fila interna, event loop da BD).
+- scheduled -> persisted: desde a entrada no buffer até o MongoDB confirmar o
+  `insert_many` do lote (observada em `WriteBehindBuffer`).
+
+As etapas dentro do processo usam `time.perf_counter()`.
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from ..metrics import BROKER_LAG
+
+# Valores acima disto (ano 2106 em segundos) são timestamps em milissegundos
+_MAX_TIMESTAMP_SECONDS = 0xFFFFFFFF
+
+
+def route_label(doc: Dict[str, Any]) -> str:
+    """Valor da label `route` de um documento de telemetria."""
+    return str(doc.get("route_id", "desconhecida"))
+
+
+def published_at(timestamp: Any, doc: Dict[str, Any]) -> Optional[float]:
+    """
+    Instante (segundos POSIX) em que a mensagem foi publicada. O produtor envia o
+    timestamp AMQP em milissegundos; o pika devolve-o tal como foi enviado e o
+    aio-pika já convertido em `datetime`.
+    """
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    if timestamp:
+        return timestamp / 1000.0 if timestamp > _MAX_TIMESTAMP_SECONDS else float(timestamp)
+    if "timestampMs" in doc:
+        return doc["timestampMs"] / 1000.0
+    return None
+
+
+def observe_broker_lag(timestamp: Any, doc: Dict[str, Any]):
+    """Regista a latência produce -> dequeue de uma mensagem acabada de receber."""
+    sent_at = published_at(timestamp, doc)
+    if sent_at is not None:
+        BROKER_LAG.labels(route=route_label(doc)).observe(max(0.0, time.time() - sent_at))
@@ -0,0 +1,148 @@
+"""
+Módulo do Stream em Direto.
+
+Expõe por WebSocket as posições dos corredores à medida que as mensagens chegam,
+sem leituras ao MongoDB. As atualizações são agrupadas por tick (`LIVE_TICK_MS`):
+em cada tick cada cliente recebe um frame `delta` com a última mensagem de cada
+corredor alterado desde a versão do `StateManager` que já tem. Os clientes na
+mesma versão partilham o mesmo frame, serializado uma só vez.
+
+Um cliente lento não atrasa os outros: se ainda não recebeu o frame anterior, o
+frame deste tick é descartado e, quando recuperar, recebe um único `delta` com
+tudo o que mudou entretanto. O primeiro frame de cada ligação é um `snapshot`
+com a última posição de todos os corredores (também enviado a um cliente tão
+atrasado que já não há registo das remoções que perdeu).
+
+Os corredores inativos há mais de `LIVE_RUNNER_TTL_S` saem do estado (ver
+`state.py`) e são enviados nos deltas em `removidos`, com o `timestampMs` da
+última mensagem para o cliente não retirar uma posição mais recente que tenha
+obtido por outra via.
+
+Formato dos frames (JSON):
+    {"type": "snapshot" | "delta", "participantes": [{...}, ...],
+     "removidos": [{"runner_id": ..., "timestampMs": ...}, ...]}
+"""
+import asyncio
+import json
+import logging
+from typing import Optional, Set
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+from .state import StateManager
+from ..metrics import LIVE_CLIENTS, LIVE_FRAMES_SENT, LIVE_FRAMES_DROPPED
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional; usa-se o json da biblioteca padrão
+    orjson = None
+
+logger = logging.getLogger('ConsumerMicroservice.Live')
+
+
+def encode_frame(frame_type: str, participantes, removidos=()) -> str:
+    """Serializa um frame do stream (texto, para ser lido com JSON.parse no browser)."""
+    frame = {"type": frame_type, "participantes": participantes, "removidos": list(removidos)}
+    if orjson is not None:
+        return orjson.dumps(frame).decode()
+    return json.dumps(frame, separators=(",", ":"))
+
+
+class _Client:
+    __slots__ = ("websocket", "sending", "version")
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.sending: Optional[asyncio.Task] = None
+        self.version = 0  # versão do StateManager já enviada ao cliente
+
+
+class LiveStreamServer:
+    """Servidor WebSocket que difunde as alterações do `StateManager`."""
+
+    def __init__(self, manager: StateManager, port: int, tick_ms: int, host: str = "0.0.0.0"):
+        self._manager = manager
+        self._host = host
+        self._port = port
+        self._tick_seconds = tick_ms / 1000.0
+        self._clients: Set[_Client] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+    async def serve(self):
+        """Aceita ligações e envia um frame por tick até `stop()` ser chamado."""
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+
+        # Sem compressão: o mesmo frame é enviado a todos os clientes
+        async with websockets.serve(self._handle, self._host, self._port, compression=None):
+            logger.info(f"Stream em direto disponível em ws://{self._host}:{self._port}")
+            while not self._stop_event.is_set():
+                try:
+                    await asyncio.wait_for(self._stop_event.wait(), timeout=self._tick_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                # Sem mensagens novas o consumidor não chama `update`: expira aqui
+                self._manager.expire()
+                self._broadcast()
+
+            for client in list(self._clients):
+                if client.sending is not None:
+                    client.sending.cancel()
+        logger.info("Stream em direto terminado.")
+
+    def stop(self):
+        """Pede o fim do servidor (pode ser chamado de qualquer fio)."""
+        if self._loop is not None and self._stop_event is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+
+    async def _handle(self, websocket, path=None):
+        """Regista o cliente até a ligação fechar; os frames são enviados por `_broadcast`."""
+        client = _Client(websocket)
+        self._clients.add(client)
+        LIVE_CLIENTS.inc()
+        try:
+            await websocket.wait_closed()
+        finally:
+            self._clients.discard(client)
+            LIVE_CLIENTS.dec()
+            if client.sending is not None:
+                client.sending.cancel()
+
+    def _broadcast(self):
+        """Envia a cada cliente o frame deste tick, descartando-o para clientes lentos."""
+        if not self._clients:
+            return
+
+        version = self._manager.version
+        # versão do cliente -> (nova versão, tipo, frame), partilhado entre clientes
+        frames = {}
+        for client in list(self._clients):
+            if client.version >= version:
+                continue
+            if client.sending is not None and not client.sending.done():
+                # O cliente recebe estas alterações no próximo delta que conseguir enviar
+                LIVE_FRAMES_DROPPED.inc()
+                continue
+
+            entry = frames.get(client.version)
+            if entry is None:
+                current, changed, removed = self._manager.changes_since(client.version)
+                frame_type = "snapshot" if removed is None else "delta"
+                entry = (current, frame_type, encode_frame(
+                    frame_type,
+                    [record.to_dict() for record in changed],
+                    [removal.to_dict() for removal in removed or ()]
+                ))
+                frames[client.version] = entry
+
+            client.version, frame_type, frame = entry
+            client.sending = asyncio.create_task(self._send(client, frame, frame_type))
+
+    async def _send(self, client: _Client, frame: str, frame_type: str):
+        try:
+            await client.websocket.send(frame)
+            LIVE_FRAMES_SENT.labels(type=frame_type).inc()
+        except ConnectionClosed:
+            pass
@@ -0,0 +1,103 @@
+"""
+Módulo de Partições.
+
+Com `PARTITIONS` > 1 as mensagens deixam de passar por uma única fila (cada fila
+do RabbitMQ é servida por um único core): o produtor publica na exchange direta
+`<QUEUE_NAME>.partitions` com a chave de encaminhamento `runner_id % PARTITIONS`,
+e cada partição tem a sua fila `<QUEUE_NAME>.<p>`. Todas as mensagens de um
+corredor vão para a mesma fila.
+
+Por omissão nenhuma partição é reclamada: cada réplica subscreve todas as
+partições e as réplicas competem pelas mensagens de cada fila (como na fila
+única). O débito escala com o número de filas e com as réplicas que o HPA
+acrescenta, mas mensagens do mesmo corredor podem ser processadas fora de ordem
+por réplicas diferentes; a escrita não depende da ordem (`_id` determinístico e
+última posição só substituída por uma mais recente, ver `repository.py`), só a
+contagem de voltas pode falhar uma transição.
+
+Para manter a ordem por corredor cada fila tem de ter um único consumidor, que
+a reclama de uma de duas formas:
+
+- `PARTITION_OWNERS` = N: o consumidor corre como StatefulSet com N réplicas e
+  a réplica de ordinal k (nome do pod `<nome>-<k>`, de `POD_NAME` ou do
+  hostname) reclama as partições p com p % N == k. Cada pod fica com partições
+  disjuntas sem configuração por pod, e um pod reiniciado volta a reclamar as
+  mesmas (as mensagens esperam na fila). O número de réplicas é fixo: o HPA
+  não pode ser usado neste modo.
+- `PARTITION_IDS`: lista explícita, para consumidores configurados à mão.
+
+Em ambos os casos as partições do pod são repartidas pelos processos
+trabalhadores, e cada processo tem de ficar com pelo menos uma.
+
+Com `PARTITIONS=1` mantém-se a topologia original (uma fila, exchange por omissão).
+Os nomes têm de ser iguais aos de `Apps/Producer/partitions.py`.
+"""
+import socket
+from typing import List, Optional
+
+from ..config import settings
+
+
+def partition_exchange(queue_name: str) -> str:
+    """Nome da exchange direta que distribui as mensagens pelas partições."""
+    return f"{queue_name}.partitions"
+
+
+def partition_queue(queue_name: str, partition: int) -> str:
+    """Nome da fila de uma partição."""
+    return f"{queue_name}.{partition}"
+
+
+def pod_ordinal(pod_name: str) -> int:
+    """Ordinal de um pod de StatefulSet, a partir do nome `<nome>-<ordinal>`."""
+    _, separator, ordinal = pod_name.rpartition("-")
+    if not separator or not ordinal.isdigit():
+        raise ValueError(f"'{pod_name}' não é o nome de um pod de StatefulSet (<nome>-<ordinal>)")
+    return int(ordinal)
+
+
+def claimed_partitions(partitions: int, partition_ids: str = "", worker_index: int = 0, workers: int = 1,
+                       owner: Optional[int] = None, owners: int = 0) -> List[int]:
+    """
+    Partições lidas por este processo: as indicadas em `partition_ids`
+    (separadas por vírgulas); com `owners` > 0, as do ordinal `owner`
+    (p % owners == owner); senão, todas. Com vários processos trabalhadores
+    cada um fica com uma parte (`worker_index::workers`).
+
+    Sem partições reclamadas os trabalhadores que sobram subscrevem todas; com
+    partições reclamadas cada fila só pode ter um consumidor, e um trabalhador
+    sem partições é um erro de configuração (ValueError).
+    """
+    if partition_ids.strip():
+        ids = sorted({int(p) for p in partition_ids.split(",") if p.strip()})
+        invalid = [p for p in ids if not 0 <= p < partitions]
+        if invalid:
+            raise ValueError(f"PARTITION_IDS fora do intervalo [0, {partitions}): {invalid}")
+    elif owners > 0:
+        if owner is None or not 0 <= owner < owners:
+            raise ValueError(f"Ordinal {owner} fora do intervalo [0, PARTITION_OWNERS={owners})")
+        ids = [p for p in range(partitions) if p % owners == owner]
+    else:
+        return list(range(partitions))[worker_index::workers] or list(range(partitions))
+
+    claimed = ids[worker_index::workers]
+    if not claimed:
+        raise ValueError(
+            f"Trabalhador {worker_index} sem partições: {len(ids)} partições reclamadas "
+            f"para {workers} trabalhadores"
+        )
+    return claimed
+
+
+def consumed_queues(worker_index: int = 0, workers: int = 1) -> List[str]:
+    """Filas que este processo consome, segundo `PARTITIONS`, `PARTITION_IDS` e `PARTITION_OWNERS`."""
+    if settings.PARTITIONS <= 1:
+        return [settings.QUEUE_NAME]
+    owner = None
+    if settings.PARTITION_OWNERS > 0 and not settings.PARTITION_IDS.strip():
+        owner = pod_ordinal(settings.POD_NAME or socket.gethostname())
+    claimed = claimed_partitions(
+        settings.PARTITIONS, settings.PARTITION_IDS, worker_index, workers,
+        owner=owner, owners=settings.PARTITION_OWNERS
+    )
+    return [partition_queue(settings.QUEUE_NAME, p) for p in claimed]
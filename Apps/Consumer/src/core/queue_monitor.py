@@ -0,0 +1,125 @@
+"""
+Módulo de Monitorização da Fila.
+
+Define a classe `QueueMonitor`, um fio que consulta periodicamente as filas
+consumidas por este processo (a fila única ou as partições reclamadas) com um
+`queue_declare` passivo (não cria nem altera a fila) e publica em gauges do
+Prometheus, por fila:
+
+- as mensagens prontas na fila (ainda não entregues a nenhum consumidor);
+- o número de consumidores ligados à fila;
+- o ritmo de consumo deste processo (mensagens/s, média móvel exponencial,
+  repartido igualmente pelas filas que consome);
+- o tempo estimado para esvaziar a fila ao ritmo atual de todos os consumidores.
+
+As mensagens entregues mas ainda não confirmadas já são exportadas por cada
+consumidor em `consumer_in_flight_messages`; a soma de todos os pods é o total
+de mensagens 'unacked' da fila. No overlay Local estas métricas alimentam o HPA do
+consumidor (métrica externa servida pelo prometheus-adapter), que escala pela
+fila em vez de pelo CPU.
+"""
+import logging
+import threading
+import time
+from typing import Callable, List, Optional
+
+import pika
+from pika.exceptions import AMQPError
+
+from ..config import settings
+from ..metrics import QUEUE_READY_MESSAGES, QUEUE_CONSUMERS, CONSUME_RATE, QUEUE_DRAIN_TIME
+
+logger = logging.getLogger('ConsumerMicroservice.QueueMonitor')
+
+# Peso da última amostra na média móvel do ritmo de consumo
+RATE_SMOOTHING = 0.3
+
+
+def estimate_drain_time(ready: int, rate: float, consumers: int, max_seconds: float) -> float:
+    """
+    Tempo (s) para esvaziar `ready` mensagens, assumindo que os `consumers`
+    consumidores da fila consomem ao mesmo ritmo `rate` que este processo.
+    Limitado a `max_seconds` (fila parada ou sem consumidores).
+    """
+    if ready <= 0:
+        return 0.0
+    total_rate = rate * max(consumers, 1)
+    if total_rate <= 0:
+        return max_seconds
+    return min(ready / total_rate, max_seconds)
+
+
+class QueueMonitor(threading.Thread):
+    """Consulta a profundidade da fila com `queue_declare(passive=True)` e atualiza as métricas."""
+
+    def __init__(self, stop_event: threading.Event, consumed_total: Callable[[], int],
+                 queue_names: Optional[List[str]] = None,
+                 interval_seconds: float = settings.QUEUE_MONITOR_INTERVAL_S):
+        """
+        `consumed_total` devolve o total de mensagens consumidas por este
+        processo desde o arranque; é usado para calcular o ritmo de consumo.
+        """
+        self._stop_event = stop_event
+        self._consumed_total = consumed_total
+        self._queue_names = queue_names or [settings.QUEUE_NAME]
+        self._interval_seconds = interval_seconds
+        self._connection: Optional[pika.BlockingConnection] = None
+        self._channel = None
+        self._rate = 0.0
+        super().__init__(name="queue-monitor", daemon=True)
+
+    def _ensure_channel(self):
+        """Abre (ou reabre) a ligação própria do monitor; o canal do consumidor não é partilhado entre fios."""
+        if self._channel is not None and self._channel.is_open:
+            return
+        if self._connection is None or not self._connection.is_open:
+            credentials = pika.PlainCredentials(settings.RABBITMQ_USER, settings.RABBITMQ_PASS)
+            parameters = pika.ConnectionParameters(settings.RABBITMQ_HOST, 5672, '/', credentials)
+            self._connection = pika.BlockingConnection(parameters)
+        self._channel = self._connection.channel()
+
+    def _poll(self, queue_name: str):
+        """Lê a fila (passivo: falha se não existir, em vez de a criar)."""
+        self._ensure_channel()
+        result = self._channel.queue_declare(queue=queue_name, passive=True)
+        return result.method.message_count, result.method.consumer_count
+
+    def run(self):
+        """Ciclo do monitor: uma consulta por intervalo até o evento de paragem ser acionado."""
+        last_total, last_time = self._consumed_total(), time.monotonic()
+
+        while not self._stop_event.wait(self._interval_seconds):
+            total, now = self._consumed_total(), time.monotonic()
+            elapsed = now - last_time
+            if elapsed > 0:
+                sample = (total - last_total) / elapsed
+                self._rate = RATE_SMOOTHING * sample + (1 - RATE_SMOOTHING) * self._rate
+            last_total, last_time = total, now
+            queue_rate = self._rate / len(self._queue_names)
+
+            for queue_name in self._queue_names:
+                CONSUME_RATE.labels(queue=queue_name).set(queue_rate)
+                try:
+                    ready, consumers = self._poll(queue_name)
+                except AMQPError as e:
+                    # Ligação perdida ou fila inexistente (o canal fecha); tenta de novo no próximo intervalo
+                    logger.warning(f"Não foi possível consultar a fila {queue_name}: {e}")
+                    self._channel = None
+                    continue
+                except Exception as e:
+                    logger.error(f"Erro ao consultar a fila {queue_name}: {e}")
+                    self._channel = None
+                    continue
+
+                QUEUE_READY_MESSAGES.labels(queue=queue_name).set(ready)
+                QUEUE_CONSUMERS.labels(queue=queue_name).set(consumers)
+                QUEUE_DRAIN_TIME.labels(queue=queue_name).set(
+                    estimate_drain_time(ready, queue_rate, consumers, settings.QUEUE_DRAIN_TIME_MAX_S)
+                )
+
+        if self._connection is not None and self._connection.is_open:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+        logger.info("Monitor da fila encerrado.")
@@ -5,27 +5,220 @@ Este módulo centraliza toda a lógica de interação com a base de dados MongoD
 seguindo as melhores práticas de separação de responsabilidades.
 """
 import logging
-from typing import Dict, Any
+import math
+from datetime import datetime, timezone
+from typing import Dict, Any, List
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from ..config import settings
+from ..metrics import DUPLICATE_DOCUMENTS
 
 logger = logging.getLogger('ConsumerMicroservice.Repository')
 
 
-async def save_telemetry_data(db: AsyncIOMotorDatabase, data: Dict[str, Any]):
+# Campos da coleção time-series: tempo como data e metadados por corredor/rota
+TIMESERIES_TIME_FIELD = 'ts'
+TIMESERIES_META_FIELD = 'meta'
+
+# Código de erro do MongoDB para chave duplicada
+DUPLICATE_KEY_ERROR = 11000
+
+
+async def ensure_telemetry_collection(db: AsyncIOMotorDatabase, name: str = None):
+    """
+    Garante que a coleção de telemetria existe; se não existir, cria-a
+    (como time-series se `TIMESERIES_ENABLED`). Numa coleção time-series
+    existente, aplica a retenção configurada.
+    Os índices são geridos em `indexes.ensure_indexes`.
+    """
+    name = name or settings.COLLECTION_NAME
+    cursor = await db.list_collections(filter={"name": name})
+    existing = await cursor.to_list(length=None)
+    if not existing:
+        if settings.TIMESERIES_ENABLED:
+            options = {
+                "timeseries": {
+                    "timeField": TIMESERIES_TIME_FIELD,
+                    "metaField": TIMESERIES_META_FIELD,
+                    "granularity": settings.TIMESERIES_GRANULARITY,
+                }
+            }
+            if settings.TIMESERIES_EXPIRE_AFTER_S > 0:
+                options["expireAfterSeconds"] = settings.TIMESERIES_EXPIRE_AFTER_S
+            await db.create_collection(name, **options)
+            logger.info(f"Coleção time-series criada: {settings.DB_NAME}.{name}")
+        else:
+            await db.create_collection(name)
+            logger.info(f"Coleção criada: {settings.DB_NAME}.{name}")
+        return
+
+    logger.info(f"Coleção existente: {settings.DB_NAME}.{name}")
+    is_timeseries = existing[0].get("type") == "timeseries"
+    if settings.TIMESERIES_ENABLED and not is_timeseries:
+        logger.warning(
+            f"TIMESERIES_ENABLED está ativo mas {name} é uma coleção normal; "
+            f"executar 'python -m src.migrate_timeseries' para a converter."
+        )
+    elif is_timeseries:
+        expire = settings.TIMESERIES_EXPIRE_AFTER_S if settings.TIMESERIES_EXPIRE_AFTER_S > 0 else "off"
+        try:
+            await db.command("collMod", name, expireAfterSeconds=expire)
+        except Exception as e:
+            logger.error(f"Não foi possível aplicar a retenção a {name}: {e}")
+
+
+def to_timeseries_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converte um documento de telemetria para a coleção time-series: acrescenta
+    o tempo como data (a partir de `timestampMs`) e os metadados do corredor.
+    Os restantes campos mantêm-se para que as consultas existentes continuem a funcionar:
+    `runner_id`, `route_id` e `timestampMs` ficam duplicados em `meta` e `ts`
+    (mais espaço por documento), porque a API e os índices declarados usam os
+    campos de topo.
     """
-    Guarda um documento de dados na coleção 'telemetry'.
-    Esta função não realiza validação; ela simplesmente insere o dicionário
-    de dados recebido.
+    stored = dict(doc)
+    stored[TIMESERIES_TIME_FIELD] = datetime.fromtimestamp(doc["timestampMs"] / 1000.0, tz=timezone.utc)
+    stored[TIMESERIES_META_FIELD] = {"runner_id": doc["runner_id"], "route_id": doc.get("route_id")}
+    return stored
+
+
+def telemetry_id(doc: Dict[str, Any]) -> str:
+    """`_id` determinístico de um documento de telemetria: igual em todas as reentregas da mensagem."""
+    return f"{doc['runner_id']}:{doc['timestampMs']}"
+
+
+async def save_telemetry_batch(db: AsyncIOMotorDatabase, docs: List[Dict[str, Any]]) -> int:
+    """
+    Guarda um lote de documentos com um único `insert_many` não ordenado.
+    Os erros são propagados para que quem chama (`WriteBehindBuffer`) saiba
+    se o lote foi persistido.
+
+    Cada documento recebe o `_id` de `telemetry_id`, pelo que uma mensagem
+    reentregue (entrega at-least-once, lote repetido após falha) colide com a
+    já guardada: os erros de chave duplicada contam como sucesso e a coleção
+    fica sem repetidos, sem leituras extra. Numa coleção time-series o `_id`
+    não é único e os repetidos não são detetados.
 
     Args:
         db: A instância da base de dados Motor.
-        data: O dicionário de dados a ser guardado.
+        docs: A lista de documentos a guardar.
+
+    Returns:
+        O número de documentos inseridos (sem contar os repetidos).
     """
     collection = db.get_collection(settings.COLLECTION_NAME)
+    for doc in docs:
+        doc["_id"] = telemetry_id(doc)
+    if settings.TIMESERIES_ENABLED:
+        docs = [to_timeseries_document(doc) for doc in docs]
     try:
-        await collection.insert_one(data)
-        logger.info(f"Dados de telemetria guardados no MongoDB: {data}")
-    except Exception as e:
-        logger.error(f"Erro ao guardar dados no MongoDB: {e}")
-        logger.debug(f"Dados que falharam ao guardar: {data}")
\ No newline at end of file
+        result = await collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Com ordered=False os restantes documentos são inseridos; só falha se houver outros erros
+        errors = e.details.get("writeErrors", [])
+        if not errors or any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        DUPLICATE_DOCUMENTS.inc(len(errors))
+        inserted = e.details.get("nInserted", len(docs) - len(errors))
+        logger.debug(f"Lote guardado no MongoDB: {inserted} documentos novos, {len(errors)} repetidos ignorados.")
+        return inserted
+    logger.debug(f"Lote de {len(result.inserted_ids)} documentos guardado no MongoDB.")
+    return len(result.inserted_ids)
+
+
+
+def is_new_lap(previous: Dict[str, Any], doc: Dict[str, Any]) -> bool:
+    """
+    Uma volta termina quando o corredor passa para a rota seguinte (ou, na
+    mesma rota, volta a um segmento anterior). Os codecs tratam `route_id` e
+    `current_segment` como opcionais: sem eles não se conta nenhuma volta.
+    """
+    route, previous_route = doc.get("route_id"), previous.get("route_id")
+    if route is None or previous_route is None:
+        return False
+    if route != previous_route:
+        return True
+    segment, previous_segment = doc.get("current_segment"), previous.get("current_segment")
+    return segment is not None and previous_segment is not None and segment < previous_segment
+
+
+def build_latest_updates(docs: List[Dict[str, Any]]) -> List[UpdateOne]:
+    """
+    Constrói os upserts da coleção de últimas posições (uma entrada por corredor,
+    com `_id` = runner_id) a partir de um lote de documentos de telemetria.
+
+    Além da última posição, cada entrada mantém estatísticas incrementais para
+    a classificação servida pela API: soma e número de velocidades (e a média
+    `avg_speed`) e o número de voltas completas (`laps`). As voltas dentro do
+    lote são contadas aqui; a transição entre a posição guardada e a primeira
+    do lote é avaliada no próprio MongoDB. Com vários consumidores, mensagens
+    de um corredor fora de ordem podem fazer a contagem de voltas falhar uma
+    transição, mas nunca contá-la duas vezes. Uma mensagem reentregue não
+    duplica a telemetria (ver `save_telemetry_batch`), mas volta a contar
+    nestas estatísticas.
+
+    Deve ser chamada antes de `save_telemetry_batch`, que acrescenta o `_id`
+    aos documentos do lote.
+    """
+    by_runner: Dict[Any, List[Dict[str, Any]]] = {}
+    for doc in docs:
+        by_runner.setdefault(doc["runner_id"], []).append(doc)
+
+    updates = []
+    for runner_id, runner_docs in by_runner.items():
+        runner_docs.sort(key=lambda d: d["timestampMs"])
+        first, newest = runner_docs[0], runner_docs[-1]
+        speed_sum = sum(math.hypot(d["speedX"], d["speedY"]) for d in runner_docs)
+        laps = sum(1 for previous, doc in zip(runner_docs, runner_docs[1:]) if is_new_lap(previous, doc))
+
+        new_state = {key: value for key, value in newest.items() if key != "_id"}
+        new_state["_id"] = runner_id
+        # Nova volta entre a posição guardada e a primeira do lote (só se esta for
+        # mais recente e tiver rota e segmento)
+        lap_from_stored = 0
+        if first.get("route_id") is not None and first.get("current_segment") is not None:
+            lap_from_stored = {"$cond": [
+                {"$and": [
+                    {"$gt": [first["timestampMs"], {"$ifNull": ["$timestampMs", first["timestampMs"]]}]},
+                    {"$or": [
+                        {"$ne": ["$route_id", first["route_id"]]},
+                        {"$lt": [first["current_segment"], "$current_segment"]}
+                    ]}
+                ]},
+                1, 0
+            ]}
+        updates.append(UpdateOne(
+            {"_id": runner_id},
+            [
+                {"$set": {
+                    "speed_sum": {"$add": [{"$ifNull": ["$speed_sum", 0]}, speed_sum]},
+                    "speed_count": {"$add": [{"$ifNull": ["$speed_count", 0]}, len(runner_docs)]},
+                    "laps": {"$add": [{"$ifNull": ["$laps", 0]}, laps, lap_from_stored]},
+                }},
+                {"$set": {"avg_speed": {"$divide": ["$speed_sum", "$speed_count"]}}},
+                # Só substitui a posição guardada se esta for mais recente
+                {"$replaceWith": {"$cond": [
+                    {"$gt": [newest["timestampMs"], {"$ifNull": ["$timestampMs", -1]}]},
+                    {"$mergeObjects": [
+                        {"$literal": new_state},
+                        {"speed_sum": "$speed_sum", "speed_count": "$speed_count",
+                         "avg_speed": "$avg_speed", "laps": "$laps"}
+                    ]},
+                    "$$ROOT"
+                ]}}
+            ],
+            upsert=True
+        ))
+    return updates
+
+
+async def save_latest_positions(db: AsyncIOMotorDatabase, updates: List[UpdateOne]):
+    """
+    Aplica os upserts de `build_latest_updates` com um único `bulk_write`
+    não ordenado na coleção de últimas posições.
+    """
+    if not updates:
+        return
+    collection = db.get_collection(settings.LATEST_COLLECTION_NAME)
+    await collection.bulk_write(updates, ordered=False)
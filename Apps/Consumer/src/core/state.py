@@ -1,28 +1,162 @@
+"""
+Módulo de Estado em Memória.
+
+Tabela runner_id -> última mensagem de cada corredor, partilhada entre o fio (ou
+tarefa) de consumo, que escreve, e o stream em direto, que lê.
+
+Cada atualização cria um novo registo `RunnerState` (com `__slots__`) que nunca
+é alterado depois de publicado, pelo que os leitores recebem referências aos
+próprios registos, sem cópias. Um contador de versão global numera as
+atualizações: `changes_since(versão)` devolve só os corredores alterados desde
+a versão que o leitor já tem.
+
+Os corredores sem mensagens há mais de `LIVE_RUNNER_TTL_S` segundos saem da
+tabela (como a janela `LEADERBOARD_ACTIVE_WINDOW_S` da API), para que corredores
+que já terminaram não fiquem para sempre nos snapshots. Cada remoção recebe uma
+versão, como as atualizações, e é devolvida por `changes_since` para os
+leitores a retirarem também; as remoções são esquecidas ao fim de outro
+`LIVE_RUNNER_TTL_S`, e um leitor mais atrasado do que isso recebe um snapshot.
+"""
 import time
 import threading
-import copy
-from typing import Any, Dict
+from operator import attrgetter
+from typing import Any, Dict, List, Optional, Tuple
+
+from .codec import FIELDS
+from ..config import settings
+
+
+class RunnerState:
+    """Última mensagem de um corredor. Imutável depois de entrar na tabela."""
+    __slots__ = FIELDS + ("version", "received")
+
+    _values = attrgetter(*FIELDS)
+
+    def __init__(self, doc: Dict[str, Any]):
+        for field in FIELDS:
+            setattr(self, field, doc.get(field))
+        self.version = 0
+        self.received = 0.0  # time.monotonic() da receção
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(zip(FIELDS, self._values(self)))
+
+
+class _Removal:
+    """Registo de um corredor retirado da tabela por inatividade."""
+    __slots__ = ("runner_id", "timestampMs", "version", "removed")
+
+    def __init__(self, record: RunnerState, version: int, removed: float):
+        self.runner_id = record.runner_id
+        self.timestampMs = record.timestampMs
+        self.version = version
+        self.removed = removed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"runner_id": self.runner_id, "timestampMs": self.timestampMs}
+
 
 class StateManager:
     """
-    Gestor de estado thread-safe para armazenar a última mensagem recebida.
+    Gestor de estado thread-safe com a última mensagem de cada corredor.
     """
-    def __init__(self):
+    def __init__(self, ttl_seconds: float = settings.LIVE_RUNNER_TTL_S):
         self._lock = threading.Lock()
-        self._last_message: Dict[str, Any] = {
-            "status": "Aguardando dados...",
-            "timestamp": int(time.time() * 1000)
-        }
+        self._ttl_seconds = ttl_seconds
+        # Ordem de inserção = ordem de atualização (o corredor é reinserido no fim)
+        self._runners: Dict[Any, RunnerState] = {}
+        # Remoções por ordem de versão; versões até `_forgotten` já não estão aqui
+        self._removals: Dict[Any, _Removal] = {}
+        self._forgotten = 0
+        self._version = 0
+        self._last: Optional[RunnerState] = None
+        self._started_ms = int(time.time() * 1000)
+
+    @property
+    def version(self) -> int:
+        """Número da última atualização (0 = sem dados)."""
+        return self._version
 
-    def update_last_message(self, new_state: Dict[str, Any]):
-        """Atualiza o estado da última mensagem de forma segura."""
+    def update(self, doc: Dict[str, Any]):
+        """Guarda a mensagem como o novo estado do seu corredor."""
+        record = RunnerState(doc)
+        record.received = time.monotonic()
         with self._lock:
-            self._last_message = new_state
+            self._expire(record.received)
+            self._version += 1
+            record.version = self._version
+            self._runners.pop(record.runner_id, None)
+            self._removals.pop(record.runner_id, None)
+            self._runners[record.runner_id] = record
+            self._last = record
 
-    def get_last_message(self) -> Dict[str, Any]:
-        """Obtém o estado da última mensagem de forma segura."""
+    def expire(self):
+        """Retira os corredores inativos (também feito em cada `update`)."""
         with self._lock:
-            return copy.deepcopy(self._last_message)
+            self._expire(time.monotonic())
+
+    def _expire(self, now: float):
+        """Com o lock: remove os corredores e as remoções mais antigos do que o TTL."""
+        if self._ttl_seconds <= 0:
+            return
+        cutoff = now - self._ttl_seconds
+        # Os registos mais antigos estão no início de cada dicionário
+        while self._removals:
+            removal = next(iter(self._removals.values()))
+            if removal.removed > cutoff:
+                break
+            del self._removals[removal.runner_id]
+            self._forgotten = removal.version
+        while self._runners:
+            record = next(iter(self._runners.values()))
+            if record.received > cutoff:
+                break
+            del self._runners[record.runner_id]
+            self._version += 1
+            self._removals[record.runner_id] = _Removal(record, self._version, now)
+
+    def changes_since(self, version: int) -> Tuple[int, List[RunnerState], Optional[List[_Removal]]]:
+        """
+        Devolve (versão atual, corredores alterados depois de `version`,
+        corredores removidos depois de `version`), pela ordem das versões.
+
+        Com `version` = 0, ou anterior às remoções já esquecidas, devolve todos
+        os corredores e `None` nas remoções: o leitor substitui o seu estado
+        em vez de lhe juntar as alterações.
+        """
+        changed = []
+        removed = []
+        with self._lock:
+            current = self._version
+            if version == 0 or version < self._forgotten:
+                version, removed = 0, None
+            if version < current:
+                # Os registos mais recentes estão no fim: para no primeiro já conhecido
+                for record in reversed(self._runners.values()):
+                    if record.version <= version:
+                        break
+                    changed.append(record)
+                if removed is not None:
+                    for removal in reversed(self._removals.values()):
+                        if removal.version <= version:
+                            break
+                        removed.append(removal)
+        changed.reverse()
+        if removed:
+            removed.reverse()
+        return current, changed, removed
+
+    def snapshot(self) -> Tuple[int, List[RunnerState]]:
+        """Devolve (versão atual, última mensagem de todos os corredores)."""
+        current, changed, _ = self.changes_since(0)
+        return current, changed
+
+    def get_last_message(self) -> Dict[str, Any]:
+        """Obtém a última mensagem recebida (de qualquer corredor)."""
+        last = self._last
+        if last is None:
+            return {"status": "Aguardando dados...", "timestamp": self._started_ms}
+        return last.to_dict()
 
 # Instância única do gestor de estado
 manager = StateManager()
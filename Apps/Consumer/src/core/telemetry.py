@@ -0,0 +1,21 @@
+"""
+Módulo de Descodificação de Telemetria.
+
+Este módulo converte o corpo de uma mensagem do RabbitMQ no documento de
+telemetria guardado no MongoDB. É partilhado pelos motores de consumo
+(fio bloqueante e asyncio) para que ambos produzam exatamente o mesmo documento.
+"""
+from typing import Any, Dict, Optional
+
+from .codec import get_codec
+
+
+def decode_telemetry(body: bytes, content_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Descodifica a mensagem com o codec indicado pelo `content_type` AMQP e
+    devolve o documento de telemetria.
+
+    Raises:
+        CodecError: Se o formato não for suportado ou a mensagem for inválida.
+    """
+    return get_codec(content_type).decode(body)
@@ -0,0 +1,126 @@
+"""
+Módulo do Buffer de Escrita Diferida.
+
+Este módulo define a classe `WriteBehindBuffer`, que acumula os documentos de
+telemetria no event loop dedicado à BD e os escreve no MongoDB em lotes
+(`insert_many`), quando o lote atinge o tamanho máximo ou quando o documento
+mais antigo já esperou o atraso máximo configurado. Em cada lote é também
+atualizada a coleção com a última posição de cada corredor.
+
+Cada documento pode vir acompanhado de um token (por exemplo o `delivery_tag`
+da mensagem) que é devolvido ao callback `on_flush` quando o lote que o contém
+é escrito com sucesso ou falha, e do instante em que a mensagem foi recebida,
+para as métricas de latência por etapa (ver `latency.py`).
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ..metrics import BATCH_SIZE, FLUSH_LATENCY, SCHEDULE_LATENCY, PERSIST_LATENCY
+from .latency import route_label
+from .repository import build_latest_updates, save_latest_positions, save_telemetry_batch
+
+logger = logging.getLogger('ConsumerMicroservice.WriteBuffer')
+
+
+class WriteBehindBuffer:
+    """
+    Agrupa documentos em lotes para reduzir as viagens ao MongoDB.
+    Todos os métodos devem ser chamados a partir do event loop da BD.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, max_batch_size: int, max_delay_ms: int,
+                 on_flush: Optional[Callable[[List[Any], bool], None]] = None):
+        self._db = db
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_delay = max(0, max_delay_ms) / 1000.0
+        self._on_flush = on_flush
+        self._docs: List[Dict[str, Any]] = []
+        self._tokens: List[Any] = []
+        self._scheduled_at: List[float] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    def add(self, doc: Dict[str, Any], token: Any = None, received_at: Optional[float] = None):
+        """
+        Adiciona um documento ao lote atual, escrevendo-o se estiver cheio.
+        `received_at` é o `time.perf_counter()` da receção da mensagem.
+        """
+        now = time.perf_counter()
+        if received_at is not None:
+            SCHEDULE_LATENCY.labels(route=route_label(doc)).observe(now - received_at)
+        self._docs.append(doc)
+        self._scheduled_at.append(now)
+        if token is not None:
+            self._tokens.append(token)
+        if len(self._docs) >= self._max_batch_size:
+            self.flush()
+        elif self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self._max_delay, self.flush)
+
+    def flush(self):
+        """Agenda a escrita do lote atual (se existir) numa tarefa separada."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._docs:
+            return
+
+        batch, self._docs = self._docs, []
+        tokens, self._tokens = self._tokens, []
+        scheduled_at, self._scheduled_at = self._scheduled_at, []
+        task = asyncio.get_running_loop().create_task(self._write(batch, tokens, scheduled_at))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _write(self, batch: List[Dict[str, Any]], tokens: List[Any], scheduled_at: List[float]):
+        """Escreve um lote no MongoDB, regista as métricas e notifica `on_flush`."""
+        start_time = time.perf_counter()
+        # Calculado antes de save_telemetry_batch, que acrescenta o _id aos documentos.
+        # Uma falha aqui só afeta as últimas posições: a telemetria é escrita e
+        # `on_flush` notificado na mesma, como quando o bulk_write das últimas posições falha
+        try:
+            latest_updates = build_latest_updates(batch)
+        except Exception as e:
+            logger.error(f"Não foi possível calcular as últimas posições do lote; atualização ignorada: {e}")
+            latest_updates = []
+        inserted, latest = await asyncio.gather(
+            save_telemetry_batch(self._db, batch),
+            save_latest_positions(self._db, latest_updates),
+            return_exceptions=True
+        )
+        persisted_at = time.perf_counter()
+        FLUSH_LATENCY.observe(persisted_at - start_time)
+        BATCH_SIZE.observe(len(batch))
+
+        # Só a escrita da telemetria decide o sucesso do lote; as últimas posições
+        # são derivadas e ficam corrigidas com a próxima mensagem de cada corredor
+        success = not isinstance(inserted, BaseException)
+        if not success:
+            logger.error(f"Falha ao inserir lote de {len(batch)} documentos no MongoDB: {inserted}")
+        else:
+            histograms = {}
+            for doc, added_at in zip(batch, scheduled_at):
+                route = route_label(doc)
+                histogram = histograms.get(route)
+                if histogram is None:
+                    histogram = histograms[route] = PERSIST_LATENCY.labels(route=route)
+                histogram.observe(persisted_at - added_at)
+        if isinstance(latest, BaseException):
+            logger.error(f"Falha ao atualizar as últimas posições dos corredores: {latest}")
+
+        if self._on_flush and tokens:
+            try:
+                self._on_flush(tokens, success)
+            except Exception as e:
+                logger.error(f"Erro no callback de fim de escrita do lote: {e}")
+
+    async def close(self):
+        """Escreve o que resta no buffer e espera pelas escritas em curso."""
+        self.flush()
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
@@ -1,12 +1,20 @@
+import os
 import signal
 import logging
+import tempfile
 import threading
 import asyncio
+import multiprocessing
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from .core.consumer import RabbitMQConsumer
+from .core.async_consumer import AsyncRabbitMQConsumer
+from .core.live import LiveStreamServer
+from .core.queue_monitor import QueueMonitor
+from .core.partitions import consumed_queues
+from .core.state import manager
 from .config import settings
-from .metrics import start_metrics_server
+from .metrics import start_metrics_server, mark_worker_dead
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('ConsumerMicroservice')
@@ -29,9 +37,63 @@ async def ensure_database_and_collection(db):
     else:
         logger.info(f"Coleção existente: {settings.DB_NAME}.{settings.COLLECTION_NAME}")
 
-def main():
+def create_live_server():
     """
-    Função principal que configura e inicia o microserviço consumidor.
+    Cria o servidor do stream em direto, se ativo. Só existe com um único
+    processo trabalhador: com o supervisor cada processo só vê parte das mensagens.
+    """
+    if not settings.LIVE_STREAM_ENABLED or settings.CONSUMER_WORKERS > 1:
+        return None
+    return LiveStreamServer(manager, settings.LIVE_STREAM_PORT, settings.LIVE_TICK_MS)
+
+async def serve_live_stream(live_server: LiveStreamServer):
+    """Corre o stream em direto; uma falha não interrompe o consumo."""
+    try:
+        await live_server.serve()
+    except Exception as e:
+        logger.error(f"Erro no stream em direto: {e}")
+
+def start_queue_monitor(stop_event: threading.Event, consumer, queues):
+    """Arranca o monitor das filas (profundidade, ritmo de consumo e tempo de esvaziamento), se ativo."""
+    if not settings.QUEUE_MONITOR_ENABLED:
+        return None
+    monitor = QueueMonitor(
+        stop_event,
+        consumed_total=lambda: consumer.consumed,
+        queue_names=queues
+    )
+    monitor.start()
+    return monitor
+
+async def run_async_consumer(queues):
+    """
+    Executa o motor de consumo 'asyncio' no event loop corrente, parando-o
+    de forma graciosa quando recebe SIGINT/SIGTERM.
+    """
+    consumer = AsyncRabbitMQConsumer(queues=queues)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, consumer.stop)
+
+    live_server = create_live_server()
+    live_task = loop.create_task(serve_live_stream(live_server)) if live_server else None
+    monitor_stop = threading.Event()
+    queue_monitor = start_queue_monitor(monitor_stop, consumer, queues)
+
+    logger.info("Consumidor asyncio em execução. Pressione Ctrl+C para parar.")
+    await consumer.run()
+    if live_task:
+        live_server.stop()
+        await live_task
+    if queue_monitor:
+        monitor_stop.set()
+        await asyncio.to_thread(queue_monitor.join, 5)
+    logger.info("Conexões fechadas. Adeus!")
+
+def run_thread_consumer(queues):
+    """
+    Executa o motor de consumo 'thread' (pika bloqueante + loop da BD dedicado)
+    até receber SIGINT/SIGTERM.
     """
     stop_event = threading.Event()
     
@@ -47,32 +109,133 @@ def main():
         logger.error(f"Não foi possível ligar ao MongoDB: {e}")
         return # Encerra se não conseguir ligar à base de dados
 
-    # --- Início do Servidor de Métricas Prometheus ---
-    logger.info(f"A iniciar o servidor de métricas na porta {settings.METRICS_PORT}...")
-    start_metrics_server(settings.METRICS_PORT)
-
     # --- Início do Consumidor RabbitMQ ---
     logger.info("Iniciando a thread do consumidor RabbitMQ...")
     rabbitmq_consumer = RabbitMQConsumer(
         stop_event=stop_event,
-        db=None  # será inicializado no loop dedicado
+        db=None,  # será inicializado no loop dedicado
+        queues=queues
     )
     rabbitmq_consumer.start()
+    queue_monitor = start_queue_monitor(stop_event, rabbitmq_consumer, queues)
+
+    # --- Stream em direto (event loop próprio num fio dedicado) ---
+    live_server = create_live_server()
+    live_thread = None
+    if live_server:
+        live_thread = threading.Thread(
+            target=asyncio.run, args=(serve_live_stream(live_server),), name="LiveStream", daemon=True
+        )
+        live_thread.start()
 
     # --- Lógica de Encerramento Gracioso ---
-    def shutdown_handler():
+    def shutdown_handler(signum, frame):
         logger.info("Sinal de encerramento recebido. A parar o consumidor...")
         stop_event.set()
-        if rabbitmq_consumer and rabbitmq_consumer.is_alive():
-            rabbitmq_consumer.join()
-        logger.info("Conexões fechadas. Adeus!")
 
     signal.signal(signal.SIGINT, shutdown_handler)
     signal.signal(signal.SIGTERM, shutdown_handler)
 
     logger.info("Consumidor em execução. Pressione Ctrl+C para parar.")
-    if rabbitmq_consumer and rabbitmq_consumer.is_alive():
-        rabbitmq_consumer.join()
+    # join com timeout para que o fio principal continue a receber sinais
+    while rabbitmq_consumer.is_alive():
+        rabbitmq_consumer.join(timeout=1)
+    if live_thread:
+        live_server.stop()
+        live_thread.join(timeout=5)
+    if queue_monitor:
+        stop_event.set()  # o consumidor também pode ter terminado por perda da ligação
+        queue_monitor.join(timeout=5)
+    logger.info("Conexões fechadas. Adeus!")
+
+def run_worker(worker_index: int = 0, workers: int = 1):
+    """
+    Executa o motor de consumo escolhido em `CONSUMER_ENGINE` neste processo.
+    Com filas particionadas, cada trabalhador consome a sua parte das partições.
+    """
+    queues = consumed_queues(worker_index, workers)
+    if settings.CONSUMER_ENGINE == 'asyncio':
+        asyncio.run(run_async_consumer(queues))
+    else:
+        run_thread_consumer(queues)
+
+def _worker_process_main(index: int):
+    """Ponto de entrada de cada processo trabalhador do supervisor."""
+    logger.info(f"Processo trabalhador {index} iniciado (PID {os.getpid()}).")
+    run_worker(index, settings.CONSUMER_WORKERS)
+
+def run_supervisor(workers: int):
+    """
+    Arranca `workers` processos trabalhadores, cada um com o seu próprio canal
+    AMQP e cliente MongoDB, e agrega as métricas de todos num único endpoint
+    (modo multiprocesso do prometheus_client).
+
+    Ao receber SIGINT/SIGTERM reencaminha SIGTERM a cada trabalhador e espera
+    que terminem; trabalhadores que morram inesperadamente são reiniciados.
+    """
+    # O diretório tem de existir antes de os trabalhadores importarem o prometheus_client
+    metrics_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR') or tempfile.mkdtemp(prefix='consumer-metrics-')
+    os.makedirs(metrics_dir, exist_ok=True)
+    for name in os.listdir(metrics_dir):
+        if name.endswith('.db'):
+            os.remove(os.path.join(metrics_dir, name))
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = metrics_dir
+
+    if settings.LIVE_STREAM_ENABLED:
+        logger.warning("O stream em direto só está disponível com CONSUMER_WORKERS=1; fica desativado.")
+
+    logger.info(f"A iniciar o servidor de métricas (multiprocesso) na porta {settings.METRICS_PORT}...")
+    start_metrics_server(settings.METRICS_PORT, multiprocess_mode=True)
+
+    # 'spawn' garante processos limpos (sem fios nem loops herdados do supervisor)
+    ctx = multiprocessing.get_context('spawn')
+    stopping = threading.Event()
+
+    def spawn(index: int):
+        process = ctx.Process(target=_worker_process_main, args=(index,), name=f"consumer-worker-{index}")
+        process.start()
+        return process
+
+    processes = {index: spawn(index) for index in range(workers)}
+    logger.info(f"Supervisor iniciado com {workers} processos trabalhadores.")
+
+    def shutdown_handler(signum, frame):
+        logger.info("Sinal de encerramento recebido. A parar os processos trabalhadores...")
+        stopping.set()
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()  # envia SIGTERM: cada trabalhador pára de forma graciosa
+
+    signal.signal(signal.SIGINT, shutdown_handler)
+    signal.signal(signal.SIGTERM, shutdown_handler)
+
+    while not stopping.is_set():
+        for index, process in list(processes.items()):
+            process.join(timeout=0.5)
+            if process.exitcode is not None and not stopping.is_set():
+                logger.error(f"Processo trabalhador {index} terminou (código {process.exitcode}). A reiniciar...")
+                mark_worker_dead(process.pid)
+                processes[index] = spawn(index)
+
+    for process in processes.values():
+        process.join()
+        mark_worker_dead(process.pid)
+    logger.info("Todos os processos trabalhadores terminaram. Adeus!")
+
+def main():
+    """
+    Função principal que configura e inicia o microserviço consumidor.
+    Com `CONSUMER_WORKERS` > 1 corre um supervisor com vários processos
+    trabalhadores; caso contrário consome neste mesmo processo.
+    """
+    if settings.CONSUMER_WORKERS > 1:
+        run_supervisor(settings.CONSUMER_WORKERS)
+        return
+
+    # --- Início do Servidor de Métricas Prometheus ---
+    logger.info(f"A iniciar o servidor de métricas na porta {settings.METRICS_PORT}...")
+    start_metrics_server(settings.METRICS_PORT)
+    run_worker()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
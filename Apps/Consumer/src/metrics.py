@@ -1,4 +1,4 @@
-from prometheus_client import start_http_server, Counter, Gauge, Histogram
+from prometheus_client import start_http_server, Counter, Gauge, Histogram, CollectorRegistry, multiprocess
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,13 +20,144 @@ PROCESSING_TIME = Histogram(
 # Gauge para a última vez que uma mensagem foi processada
 LAST_MESSAGE_TIMESTAMP = Gauge(
     'consumer_last_message_processed_timestamp_seconds',
-    'Timestamp da última mensagem processada'
+    'Timestamp da última mensagem processada',
+    multiprocess_mode='max'
 )
 
-def start_metrics_server(port: int):
-    """Inicia um servidor HTTP para expor as métricas do Prometheus."""
+# Histograma para o número de documentos escritos em cada lote
+BATCH_SIZE = Histogram(
+    'consumer_db_batch_size',
+    'Número de documentos por escrita em lote no MongoDB',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+)
+
+# Histograma para a duração de cada escrita em lote
+FLUSH_LATENCY = Histogram(
+    'consumer_db_flush_duration_seconds',
+    'Tempo gasto a escrever um lote no MongoDB'
+)
+
+# Contador para os documentos repetidos (reentregas) ignorados na escrita em lote
+DUPLICATE_DOCUMENTS = Counter(
+    'consumer_duplicate_documents_total',
+    'Documentos já existentes (mesmo runner_id e timestampMs) ignorados no insert_many'
+)
+
+# Gauge para as mensagens entregues mas ainda não confirmadas (ack)
+IN_FLIGHT_MESSAGES = Gauge(
+    'consumer_in_flight_messages',
+    'Mensagens recebidas que aguardam persistência antes do ack',
+    multiprocess_mode='livesum'
+)
+
+# Gauges para índices declarados em falta e índices existentes nunca usados
+INDEX_MISSING = Gauge(
+    'consumer_mongo_indexes_missing',
+    'Número de índices declarados que não existem na coleção',
+    ['collection'],
+    multiprocess_mode='max'
+)
+
+INDEX_UNUSED = Gauge(
+    'consumer_mongo_index_unused',
+    'Índice sem utilizações desde o arranque do MongoDB (1 = não usado)',
+    ['collection', 'index'],
+    multiprocess_mode='max'
+)
+
+# Latência por etapa do pipeline, por rota (ver core/latency.py)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+BROKER_LAG = Histogram(
+    'consumer_produce_to_dequeue_seconds',
+    'Tempo entre a publicação pelo produtor e a receção pelo consumidor (inclui o desvio entre relógios)',
+    ['route'],
+    buckets=LATENCY_BUCKETS
+)
+
+SCHEDULE_LATENCY = Histogram(
+    'consumer_dequeue_to_scheduled_seconds',
+    'Tempo entre a receção da mensagem e a entrada do documento no buffer de escrita',
+    ['route'],
+    buckets=LATENCY_BUCKETS
+)
+
+PERSIST_LATENCY = Histogram(
+    'consumer_scheduled_to_persisted_seconds',
+    'Tempo entre a entrada do documento no buffer de escrita e a confirmação do insert pelo MongoDB',
+    ['route'],
+    buckets=LATENCY_BUCKETS
+)
+
+# Estado da fila do RabbitMQ (ver core/queue_monitor.py), usado pelo HPA do consumidor.
+# Todos os processos veem a mesma fila: a profundidade e o tempo de esvaziamento usam o máximo,
+# o ritmo de consumo é a soma dos processos vivos
+QUEUE_READY_MESSAGES = Gauge(
+    'consumer_queue_ready_messages',
+    'Mensagens prontas na fila, ainda por entregar (queue_declare passivo)',
+    ['queue'],
+    multiprocess_mode='max'
+)
+
+QUEUE_CONSUMERS = Gauge(
+    'consumer_queue_consumers',
+    'Consumidores ligados à fila',
+    ['queue'],
+    multiprocess_mode='max'
+)
+
+CONSUME_RATE = Gauge(
+    'consumer_consume_rate_messages_per_second',
+    'Ritmo de consumo deste consumidor (média móvel exponencial)',
+    ['queue'],
+    multiprocess_mode='livesum'
+)
+
+QUEUE_DRAIN_TIME = Gauge(
+    'consumer_queue_drain_time_seconds',
+    'Tempo estimado para esvaziar a fila ao ritmo atual de todos os consumidores',
+    ['queue'],
+    multiprocess_mode='max'
+)
+
+# Métricas do stream em direto (WebSocket)
+LIVE_CLIENTS = Gauge(
+    'consumer_live_clients',
+    'Clientes ligados ao stream em direto',
+    multiprocess_mode='livesum'
+)
+
+LIVE_FRAMES_SENT = Counter(
+    'consumer_live_frames_sent_total',
+    'Frames enviados aos clientes do stream em direto',
+    ['type']
+)
+
+LIVE_FRAMES_DROPPED = Counter(
+    'consumer_live_frames_dropped_total',
+    'Frames descartados porque o cliente ainda não recebeu o anterior'
+)
+
+def start_metrics_server(port: int, multiprocess_mode: bool = False):
+    """
+    Inicia um servidor HTTP para expor as métricas do Prometheus.
+    Em modo multiprocesso agrega as métricas escritas por todos os processos
+    trabalhadores em PROMETHEUS_MULTIPROC_DIR.
+    """
     try:
-        start_http_server(port)
+        if multiprocess_mode:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            start_http_server(port, registry=registry)
+        else:
+            start_http_server(port)
         logger.info(f"Servidor de métricas Prometheus iniciado na porta {port}")
     except Exception as e:
         logger.error(f"Não foi possível iniciar o servidor de métricas: {e}")
+
+def mark_worker_dead(pid: int):
+    """Remove os gauges 'live*' de um processo trabalhador que terminou."""
+    try:
+        multiprocess.mark_process_dead(pid)
+    except Exception as e:
+        logger.error(f"Não foi possível limpar as métricas do processo {pid}: {e}")
@@ -0,0 +1,88 @@
+"""
+Migração da coleção de telemetria para uma coleção time-series.
+
+Comando único para converter os dados existentes quando se ativa
+`TIMESERIES_ENABLED`. O MongoDB não permite converter nem renomear coleções
+time-series, por isso a migração:
+
+1. renomeia a coleção atual para `<COLLECTION_NAME>_legacy`;
+2. cria a coleção time-series com o nome original (mesmas opções do consumidor);
+3. copia os documentos em lotes, convertendo-os com `to_timeseries_document`;
+4. opcionalmente apaga a coleção antiga (`--drop-legacy`).
+
+Os consumidores devem estar parados durante a migração.
+
+Uso (na pasta Apps/Consumer, com TIMESERIES_ENABLED=true):
+    python -m src.migrate_timeseries [--batch-size 5000] [--drop-legacy]
+"""
+import argparse
+import asyncio
+import logging
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from .config import settings
+from .core.indexes import ensure_indexes
+from .core.repository import ensure_telemetry_collection, to_timeseries_document
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('ConsumerMicroservice.Migration')
+
+
+async def migrate(batch_size: int, drop_legacy: bool):
+    """Executa a migração descrita no módulo."""
+    if not settings.TIMESERIES_ENABLED:
+        logger.error("TIMESERIES_ENABLED não está ativo; nada a fazer.")
+        return
+
+    mongo_connection_string = f"mongodb://{settings.MONGO_USER}:{settings.MONGO_PASS}@{settings.MONGO_HOST}:{settings.MONGO_PORT}"
+    client = AsyncIOMotorClient(mongo_connection_string)
+    db = client.get_database(settings.DB_NAME)
+    name = settings.COLLECTION_NAME
+    legacy_name = f"{name}_legacy"
+
+    try:
+        cursor = await db.list_collections(filter={"name": name})
+        existing = await cursor.to_list(length=None)
+        if existing and existing[0].get("type") == "timeseries":
+            logger.info(f"{name} já é uma coleção time-series; nada a fazer.")
+            return
+
+        if existing:
+            await db[name].rename(legacy_name)
+            logger.info(f"Coleção {name} renomeada para {legacy_name}.")
+
+        await ensure_telemetry_collection(db)
+        await ensure_indexes(db)
+
+        copied = 0
+        batch = []
+        async for doc in db[legacy_name].find({"timestampMs": {"$exists": True}}, batch_size=batch_size):
+            batch.append(to_timeseries_document(doc))
+            if len(batch) >= batch_size:
+                await db[name].insert_many(batch, ordered=False)
+                copied += len(batch)
+                batch = []
+                logger.info(f"{copied} documentos copiados...")
+        if batch:
+            await db[name].insert_many(batch, ordered=False)
+            copied += len(batch)
+        logger.info(f"Migração concluída: {copied} documentos copiados para {name}.")
+
+        if drop_legacy:
+            await db[legacy_name].drop()
+            logger.info(f"Coleção {legacy_name} apagada.")
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=5000, help="documentos por insert_many")
+    parser.add_argument("--drop-legacy", action="store_true", help="apaga a coleção antiga no fim")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size, args.drop_legacy))
+
+
+if __name__ == "__main__":
+    main()
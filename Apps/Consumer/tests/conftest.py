@@ -0,0 +1,10 @@
+"""
+Configuração comum dos testes do consumidor.
+
+A configuração (`src.config.settings`) é lida do ambiente quando o consumidor
+é importado: os campos obrigatórios recebem valores de teste.
+"""
+import os
+
+for _name in ("RABBITMQ_USER", "RABBITMQ_PASS", "MONGO_HOST", "MONGO_USER", "MONGO_PASS"):
+    os.environ.setdefault(_name, "test")
@@ -0,0 +1,71 @@
+"""
+Testes do `AckTracker` (ack-after-persist).
+
+Executar na pasta Apps/Consumer:
+    python -m pytest tests
+"""
+from src.core.acks import AckTracker
+
+
+def tracker_with(*delivery_tags):
+    tracker = AckTracker()
+    for tag in delivery_tags:
+        tracker.track(tag)
+    return tracker
+
+
+def test_ack_do_prefixo_continuo():
+    tracker = tracker_with(1, 2, 3)
+
+    assert tracker.complete([1, 2]) == 2
+    assert len(tracker) == 1
+    assert tracker.complete([3]) == 3
+    assert len(tracker) == 0
+
+
+def test_conclusao_fora_de_ordem_espera_pela_entrega_mais_antiga():
+    tracker = tracker_with(1, 2, 3, 4)
+
+    # Os lotes 3-4 e 2 persistem antes do 1: nada pode ser confirmado ainda
+    assert tracker.complete([3, 4]) is None
+    assert tracker.complete([2]) is None
+    assert len(tracker) == 4
+
+    # Quando o 1 conclui, um único ack(multiple=True) cobre toda a janela
+    assert tracker.complete([1]) == 4
+    assert len(tracker) == 0
+
+
+def test_lote_falhado_a_meio_da_janela():
+    tracker = tracker_with(1, 2, 3, 4, 5)
+
+    # O lote 2-3 falhou (nack à parte); o 4 ainda não persistiu
+    assert tracker.complete([2, 3], acked=False) is None
+    assert tracker.complete([5]) is None
+
+    # O prefixo avança pelas entregas rejeitadas, mas o ack só vai até ao 1
+    # enquanto o 4 não concluir
+    assert tracker.complete([1]) == 1
+    assert len(tracker) == 2
+
+    # O ack até ao 5 não inclui 2 e 3: já não estão por confirmar no broker
+    assert tracker.complete([4]) == 5
+    assert len(tracker) == 0
+
+
+def test_prefixo_so_com_rejeitadas_nao_confirma_nada():
+    tracker = tracker_with(1, 2, 3)
+
+    assert tracker.complete([1, 2], acked=False) is None
+    assert len(tracker) == 1
+    assert tracker.complete([3]) == 3
+
+
+def test_nada_novo_a_confirmar():
+    tracker = AckTracker()
+
+    assert tracker.complete([]) is None
+    tracker.track(7)
+    assert tracker.complete([]) is None
+    assert tracker.complete([7]) == 7
+    assert tracker.complete([]) is None
@@ -0,0 +1,94 @@
+"""
+Testes dos codecs de mensagens: ida e volta em cada codec e compatibilidade
+com os codecs do produtor (`Apps/Producer/codec.py`).
+"""
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+from src.core.codec import CODECS_BY_NAME, FIELDS, CodecError, DEFAULT_CODEC, get_codec, get_codec_by_name
+
+PRODUCER_CODEC = Path(__file__).resolve().parents[2] / "Producer" / "codec.py"
+
+MESSAGE = {
+    "runner_id": 2_147_483_000,
+    "route_id": 3,
+    "current_segment": 2,
+    "positionX": 41.15794,
+    "positionY": -8.62911,
+    "speedX": -0.75,
+    "speedY": 0.0123456789,
+    "timestampMs": 1_760_000_000_123,
+}
+
+
+@pytest.mark.parametrize("name", sorted(CODECS_BY_NAME))
+def test_ida_e_volta(name):
+    codec = CODECS_BY_NAME[name]
+
+    decoded = codec.decode(codec.encode(MESSAGE))
+
+    assert decoded == MESSAGE
+    assert tuple(decoded) == FIELDS
+    assert get_codec(codec.content_type) is codec
+
+
+def test_msgpack_ida_e_volta():
+    pytest.importorskip("msgpack")
+    codec = get_codec_by_name("msgpack")
+
+    assert codec.decode(codec.encode(MESSAGE)) == MESSAGE
+
+
+def test_json_campos_opcionais_e_extra():
+    codec = CODECS_BY_NAME["json"]
+    body = b'{"runner_id": 1, "positionX": 1.5, "positionY": 2.5, "speedX": 0, "speedY": 0, ' \
+           b'"timestampMs": 10, "extra": "ignorado"}'
+
+    decoded = codec.decode(body)
+
+    assert decoded["route_id"] is None and decoded["current_segment"] is None
+    assert "extra" not in decoded
+
+
+def test_struct_sem_rota_nem_segmento():
+    codec = CODECS_BY_NAME["struct"]
+    message = dict(MESSAGE, route_id=None, current_segment=None)
+
+    decoded = codec.decode(codec.encode(message))
+
+    assert decoded["route_id"] == 0 and decoded["current_segment"] == 0
+
+
+@pytest.mark.parametrize("name, body", [
+    ("json", b"{nao e json"),
+    ("json", b'{"runner_id": 1}'),
+    ("json", b"[1, 2, 3]"),
+    ("struct", b"\x00" * 10),
+])
+def test_mensagens_invalidas(name, body):
+    with pytest.raises(CodecError):
+        CODECS_BY_NAME[name].decode(body)
+
+
+def test_content_type():
+    assert get_codec(None) is DEFAULT_CODEC
+    assert get_codec("") is DEFAULT_CODEC
+    with pytest.raises(CodecError):
+        get_codec("text/plain")
+    with pytest.raises(CodecError):
+        get_codec_by_name("xml")
+
+
+@pytest.mark.skipif(not PRODUCER_CODEC.exists(), reason="codec do produtor não disponível")
+@pytest.mark.parametrize("name", sorted(CODECS_BY_NAME))
+def test_compativel_com_o_produtor(name):
+    spec = importlib.util.spec_from_file_location("producer_codec", PRODUCER_CODEC)
+    producer_codec = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(producer_codec)
+    encoder = producer_codec.get_codec_by_name(name)
+    decoder = CODECS_BY_NAME[name]
+
+    assert encoder.content_type == decoder.content_type
+    assert decoder.decode(encoder.encode(MESSAGE)) == MESSAGE
@@ -0,0 +1,57 @@
+"""
+Testes das últimas posições por corredor (`build_latest_updates`) e da sua
+independência da escrita da telemetria no `WriteBehindBuffer`.
+"""
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from src.config import settings
+from src.core.repository import build_latest_updates, is_new_lap
+from src.core.write_buffer import WriteBehindBuffer
+
+
+def message(runner_id=1, timestamp_ms=1000, route_id=1, current_segment=0):
+    return {
+        "runner_id": runner_id, "route_id": route_id, "current_segment": current_segment,
+        "positionX": 41.0, "positionY": -8.0, "speedX": 0.3, "speedY": 0.4, "timestampMs": timestamp_ms,
+    }
+
+
+def test_nova_volta():
+    assert is_new_lap(message(route_id=1, current_segment=3), message(route_id=2, current_segment=0))
+    assert is_new_lap(message(current_segment=3), message(current_segment=0))
+    assert not is_new_lap(message(current_segment=1), message(current_segment=2))
+
+
+def test_nova_volta_sem_rota_ou_segmento():
+    assert not is_new_lap(message(current_segment=None), message(current_segment=None))
+    assert not is_new_lap(message(current_segment=3), message(current_segment=None))
+    assert not is_new_lap(message(route_id=None), message(route_id=2))
+
+
+def test_build_latest_updates_sem_segmento():
+    docs = [message(timestamp_ms=1000, current_segment=None), message(timestamp_ms=2000, current_segment=None)]
+
+    updates = build_latest_updates(docs)
+
+    assert len(updates) == 1
+
+
+def test_lote_escrito_mesmo_que_as_ultimas_posicoes_falhem():
+    flushed = []
+
+    async def scenario():
+        db = AsyncMongoMockClient()["test"]
+        buffer = WriteBehindBuffer(db, max_batch_size=100, max_delay_ms=1000,
+                                   on_flush=lambda tokens, success: flushed.append((tokens, success)))
+        # Sem velocidade o cálculo das estatísticas do corredor falha
+        broken = message(runner_id=1, timestamp_ms=1000)
+        broken["speedX"] = None
+        buffer.add(broken, token=1)
+        buffer.add(message(runner_id=1, timestamp_ms=2000), token=2)
+        await buffer.close()
+        return await db[settings.COLLECTION_NAME].count_documents({})
+
+    assert asyncio.run(scenario()) == 2
+    assert flushed == [([1, 2], True)]
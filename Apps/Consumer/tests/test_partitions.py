@@ -0,0 +1,64 @@
+"""
+Testes da repartição das partições pelos consumidores (`claimed_partitions`).
+"""
+import pytest
+
+from src.config import settings
+from src.core.partitions import claimed_partitions, consumed_queues, pod_ordinal
+
+
+def test_sem_reclamacao_todas_as_particoes():
+    assert claimed_partitions(4) == [0, 1, 2, 3]
+    assert claimed_partitions(4, worker_index=1, workers=2) == [1, 3]
+    # Trabalhadores a mais competem por todas
+    assert claimed_partitions(2, worker_index=2, workers=3) == [0, 1]
+
+
+def test_particoes_explicitas():
+    assert claimed_partitions(8, "5, 1,3") == [1, 3, 5]
+    with pytest.raises(ValueError):
+        claimed_partitions(4, "4")
+
+
+@pytest.mark.parametrize("owners", [1, 2, 3, 8])
+def test_ordinais_reclamam_particoes_disjuntas(owners):
+    partitions = 8
+    claims = [claimed_partitions(partitions, owner=k, owners=owners) for k in range(owners)]
+
+    assert sorted(p for claim in claims for p in claim) == list(range(partitions))
+
+
+def test_particoes_do_pod_repartidas_pelos_trabalhadores():
+    assert claimed_partitions(8, owner=1, owners=2) == [1, 3, 5, 7]
+    assert claimed_partitions(8, owner=1, owners=2, worker_index=1, workers=2) == [3, 7]
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"owner": 2, "owners": 2},                             # ordinal fora do StatefulSet
+    {"owner": None, "owners": 2},                          # ordinal desconhecido
+    {"owner": 5, "owners": 6},                             # mais donos do que partições
+    {"owner": 0, "owners": 2, "worker_index": 2, "workers": 3},  # trabalhador sem partições
+])
+def test_configuracoes_que_quebram_a_ordem(kwargs):
+    with pytest.raises(ValueError):
+        claimed_partitions(4, **kwargs)
+
+
+def test_pod_ordinal():
+    assert pod_ordinal("consumidor-0") == 0
+    assert pod_ordinal("consumidor-ordenado-12") == 12
+    with pytest.raises(ValueError):
+        pod_ordinal("consumidor-deployment-5d8f7c9b4-x2x7k")
+
+
+def test_consumed_queues_pelo_nome_do_pod(monkeypatch):
+    monkeypatch.setattr(settings, "QUEUE_NAME", "q")
+    monkeypatch.setattr(settings, "PARTITIONS", 4)
+    monkeypatch.setattr(settings, "PARTITION_IDS", "")
+    monkeypatch.setattr(settings, "PARTITION_OWNERS", 2)
+    monkeypatch.setattr(settings, "POD_NAME", "consumidor-1")
+
+    assert consumed_queues() == ["q.1", "q.3"]
+
+    monkeypatch.setattr(settings, "PARTITION_OWNERS", 0)
+    assert consumed_queues() == ["q.0", "q.1", "q.2", "q.3"]
@@ -0,0 +1,78 @@
+"""
+Testes da escrita idempotente da telemetria (`save_telemetry_batch`): as
+mensagens reentregues colidem no `_id` determinístico e não são repetidas.
+"""
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from prometheus_client import REGISTRY
+from pymongo.errors import BulkWriteError
+
+from src.config import settings
+from src.core.repository import DUPLICATE_KEY_ERROR, save_telemetry_batch, telemetry_id
+
+
+def message(runner_id, timestamp_ms):
+    return {
+        "runner_id": runner_id, "route_id": 1, "current_segment": 0,
+        "positionX": 41.0, "positionY": -8.0, "speedX": 0.3, "speedY": 0.4, "timestampMs": timestamp_ms,
+    }
+
+
+def duplicates_total():
+    return REGISTRY.get_sample_value("consumer_duplicate_documents_total") or 0.0
+
+
+@pytest.fixture(autouse=True)
+def plain_collection(monkeypatch):
+    # O mongomock não tem coleções time-series; o _id só é único numa coleção normal
+    monkeypatch.setattr(settings, "TIMESERIES_ENABLED", False)
+
+
+def test_id_deterministico():
+    assert telemetry_id(message(7, 1000)) == "7:1000"
+
+
+def test_lote_reentregue_nao_repete_documentos():
+    async def scenario():
+        db = AsyncMongoMockClient()["test"]
+        collection = db[settings.COLLECTION_NAME]
+        duplicates_before = duplicates_total()
+
+        first = await save_telemetry_batch(db, [message(1, t) for t in (1, 2, 3)])
+        # Lote repetido depois de uma falha: 3 mensagens já guardadas e 2 novas
+        second = await save_telemetry_batch(db, [message(1, t) for t in (1, 2, 3, 4)] + [message(2, 1)])
+
+        assert (first, second) == (3, 2)
+        assert await collection.count_documents({}) == 5
+        assert sorted(await collection.distinct("_id")) == ["1:1", "1:2", "1:3", "1:4", "2:1"]
+        assert duplicates_total() - duplicates_before == 3
+
+    asyncio.run(scenario())
+
+
+class FailingCollection:
+    def __init__(self, error):
+        self._error = error
+
+    async def insert_many(self, docs, ordered):
+        raise self._error
+
+
+class FailingDb:
+    def __init__(self, error):
+        self._collection = FailingCollection(error)
+
+    def get_collection(self, name):
+        return self._collection
+
+
+def test_outros_erros_do_lote_sao_propagados():
+    error = BulkWriteError({
+        "nInserted": 1,
+        "writeErrors": [{"index": 0, "code": DUPLICATE_KEY_ERROR}, {"index": 1, "code": 121}],
+    })
+
+    with pytest.raises(BulkWriteError):
+        asyncio.run(save_telemetry_batch(FailingDb(error), [message(1, 1), message(1, 2), message(1, 3)]))
@@ -0,0 +1,113 @@
+"""
+Testes do `StateManager`: alterações por versão e expiração dos corredores
+inativos (com as remoções enviadas nos deltas).
+"""
+import pytest
+
+from src.core import state
+from src.core.state import StateManager
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(state.time, "monotonic", clock)
+    return clock
+
+
+def message(runner_id, timestamp_ms):
+    return {"runner_id": runner_id, "timestampMs": timestamp_ms, "positionX": 1.0, "positionY": 2.0}
+
+
+def ids(records):
+    return [record.runner_id for record in records]
+
+
+def test_changes_since(clock):
+    manager = StateManager(ttl_seconds=0)
+    assert manager.changes_since(0) == (0, [], None)
+
+    manager.update(message(1, 10))
+    manager.update(message(2, 10))
+    version = manager.version
+    manager.update(message(1, 20))
+    manager.update(message(3, 20))
+
+    current, changed, removed = manager.changes_since(version)
+    assert current == 4
+    assert ids(changed) == [1, 3]
+    assert changed[0].timestampMs == 20
+    assert removed == []
+
+    # Versão 0: snapshot com a última mensagem de todos os corredores
+    current, changed, removed = manager.changes_since(0)
+    assert ids(changed) == [2, 1, 3] and removed is None
+    assert manager.changes_since(current) == (current, [], [])
+    assert manager.get_last_message()["runner_id"] == 3
+
+
+def test_expira_corredores_inativos(clock):
+    manager = StateManager(ttl_seconds=60)
+    manager.update(message(1, 10))
+    clock.now += 30
+    manager.update(message(2, 10))
+    version = manager.version
+
+    clock.now += 31
+    manager.expire()
+
+    current, changed, removed = manager.changes_since(version)
+    assert changed == []
+    assert [removal.to_dict() for removal in removed] == [{"runner_id": 1, "timestampMs": 10}]
+    assert ids(manager.snapshot()[1]) == [2]
+
+    # Uma nova mensagem devolve o corredor à tabela e anula a remoção
+    manager.update(message(1, 20))
+    current, changed, removed = manager.changes_since(version)
+    assert ids(changed) == [1] and removed == []
+
+
+def test_expiracao_tambem_em_update(clock):
+    manager = StateManager(ttl_seconds=60)
+    manager.update(message(1, 10))
+    clock.now += 61
+    manager.update(message(2, 10))
+
+    assert ids(manager.snapshot()[1]) == [2]
+
+
+def test_leitor_atrasado_recebe_snapshot(clock):
+    manager = StateManager(ttl_seconds=60)
+    manager.update(message(1, 10))
+    manager.update(message(2, 10))
+    stale_version = manager.version
+
+    clock.now += 61
+    manager.update(message(3, 10))  # expira 1 e 2
+    fresh_version = manager.version
+    clock.now += 61
+    manager.expire()  # expira 3 e esquece as remoções de 1 e 2
+
+    current, changed, removed = manager.changes_since(stale_version)
+    assert changed == [] and removed is None
+
+    # Quem já viu as remoções esquecidas continua a receber deltas
+    current, changed, removed = manager.changes_since(fresh_version)
+    assert ids(removed) == [3]
+
+
+def test_sem_expiracao(clock):
+    manager = StateManager(ttl_seconds=0)
+    manager.update(message(1, 10))
+    clock.now += 10_000
+    manager.expire()
+
+    assert ids(manager.snapshot()[1]) == [1]
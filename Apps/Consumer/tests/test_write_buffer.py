@@ -0,0 +1,115 @@
+"""
+Testes do `WriteBehindBuffer`: escrita em lotes por tamanho e por atraso.
+"""
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from src.config import settings
+from src.core import write_buffer
+from src.core.write_buffer import WriteBehindBuffer
+
+
+def message(runner_id, timestamp_ms):
+    return {
+        "runner_id": runner_id, "route_id": 1, "current_segment": 0,
+        "positionX": 41.0, "positionY": -8.0, "speedX": 0.3, "speedY": 0.4, "timestampMs": timestamp_ms,
+    }
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Tamanhos dos lotes passados a `save_telemetry_batch` (que continua a escrever)."""
+    sizes = []
+    save_telemetry_batch = write_buffer.save_telemetry_batch
+
+    async def recording(db, docs):
+        sizes.append(len(docs))
+        return await save_telemetry_batch(db, docs)
+
+    monkeypatch.setattr(write_buffer, "save_telemetry_batch", recording)
+    return sizes
+
+
+def stored(db):
+    return db[settings.COLLECTION_NAME].count_documents({})
+
+
+def test_escreve_quando_o_lote_fica_cheio(batches):
+    async def scenario():
+        db = AsyncMongoMockClient()["test"]
+        buffer = WriteBehindBuffer(db, max_batch_size=3, max_delay_ms=60_000)
+        for timestamp_ms in range(7):
+            buffer.add(message(1, timestamp_ms))
+        # Dois lotes cheios agendados; o sétimo documento espera pelo atraso
+        await asyncio.sleep(0.01)
+        assert batches == [3, 3]
+        assert await stored(db) == 6
+
+        await buffer.close()
+        assert batches == [3, 3, 1]
+        assert await stored(db) == 7
+
+    asyncio.run(scenario())
+
+
+def test_escreve_depois_do_atraso_maximo(batches):
+    async def scenario():
+        db = AsyncMongoMockClient()["test"]
+        buffer = WriteBehindBuffer(db, max_batch_size=100, max_delay_ms=50)
+        buffer.add(message(1, 1))
+        buffer.add(message(2, 1))
+        await asyncio.sleep(0.01)
+        assert batches == []
+
+        await asyncio.sleep(0.1)
+        assert batches == [2]
+        assert await stored(db) == 2
+
+        # O temporizador recomeça com o próximo documento
+        buffer.add(message(1, 2))
+        await asyncio.sleep(0.1)
+        assert batches == [2, 1]
+        await buffer.close()
+        assert batches == [2, 1]
+
+    asyncio.run(scenario())
+
+
+def test_on_flush_recebe_os_tokens_de_cada_lote():
+    flushed = []
+
+    async def scenario():
+        db = AsyncMongoMockClient()["test"]
+        buffer = WriteBehindBuffer(db, max_batch_size=2, max_delay_ms=60_000,
+                                   on_flush=lambda tokens, success: flushed.append((tokens, success)))
+        buffer.add(message(1, 1), token=10)
+        buffer.add(message(1, 2), token=11)
+        buffer.add(message(1, 3))  # sem token (ack imediato): não aparece no callback
+        buffer.add(message(1, 4), token=13)
+        buffer.add(message(1, 5), token=14)
+        await buffer.close()
+
+    asyncio.run(scenario())
+    assert flushed == [([10, 11], True), ([13], True), ([14], True)]
+
+
+def test_on_flush_indica_lote_falhado(monkeypatch):
+    flushed = []
+
+    async def failing(db, docs):
+        raise RuntimeError("MongoDB indisponível")
+
+    monkeypatch.setattr(write_buffer, "save_telemetry_batch", failing)
+
+    async def scenario():
+        db = AsyncMongoMockClient()["test"]
+        buffer = WriteBehindBuffer(db, max_batch_size=2, max_delay_ms=60_000,
+                                   on_flush=lambda tokens, success: flushed.append((tokens, success)))
+        buffer.add(message(1, 1), token=1)
+        buffer.add(message(1, 2), token=2)
+        await buffer.close()
+
+    asyncio.run(scenario())
+    assert flushed == [([1, 2], False)]
@@ -21,3 +21,27 @@ LAST_MESSAGE_TIMESTAMP = Gauge(
     'Timestamp da ultima mensagem gerada'
 )
 
+# histograma para a latencia entre publicar e receber o confirm do broker
+CONFIRM_LATENCY = Histogram(
+    'producer_publish_confirm_duration_seconds',
+    'Tempo entre a publicacao e o confirm (ack/nack) do broker'
+)
+
+# contador de mensagens confirmadas pelo broker
+MESSAGES_CONFIRMED = Counter(
+    'producer_messages_confirmed_total',
+    'Total de mensagens confirmadas (ack) pelo broker'
+)
+
+# contador de mensagens rejeitadas pelo broker
+MESSAGES_NACKED = Counter(
+    'producer_messages_nacked_total',
+    'Total de mensagens rejeitadas (nack) pelo broker'
+)
+
+
+# contador de mensagens publicadas de novo (nack ou ligacao perdida antes do confirm)
+MESSAGES_REPUBLISHED = Counter(
+    'producer_messages_republished_total',
+    'Total de mensagens publicadas de novo por falta de confirm do broker'
+)
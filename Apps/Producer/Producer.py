@@ -1,11 +1,11 @@
 import os
-import math
+import asyncio
 import random
 import pika
-import json
 import time
 import logging
 import threading
+from collections import deque
 from prometheus_client import start_http_server
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -14,36 +14,24 @@ from Metrics import (
     CREATION_TIME,
     LAST_MESSAGE_TIMESTAMP
 )
+from codec import get_codec_by_name
+from publisher import ConfirmPublisher
+from partitions import PartitionRouter
+from fleet import RunnerFleet
+from geometry import compile_routes, load_route_definitions, segment_step_km
 
 # Parâmetros fixos para aumentar velocidade (ajuste aqui se precisar mais/menos)
 SLEEP_SECONDS = 0.1          # intervalo entre mensagens
 MAX_STEPS_PER_SEGMENT = 200  # menos passos por segmento para que a posição avance visivelmente
 
-# Rotas pre-definidas na Madeira (Latitude, Longitude)
-ROUTES = [
-    # Rota 1
-    [
-        (0 , 0),
-        (10, 0),
-        (10, 10),
-        (0 , 10),
-        (0 , 0)
-    ],
-    # Rota 2
-    [
-        (0, 0), 
-        (15, 10),
-        (16, -17),
-        (-20, -15)
-    ],
-    # Rota 3
-    [
-        (-5, -5),
-        (10, 3), 
-        (15, 12),
-        (22, 13)
-    ]
-]
+# Rotas pre-definidas (Latitude, Longitude), partilhadas com a API (ver geometry.py)
+ROUTES = [ruta["points"] for ruta in load_route_definitions()]
+
+# Geometria das rotas compilada uma única vez no arranque
+COMPILED_ROUTES = compile_routes(ROUTES)
+
+# Tolerância (km) para fixar a distância no fim do segmento e evitar erros de arredondamento
+SEGMENT_SNAP_KM = 1e-9
 
 class Producer:
     def __init__(self):
@@ -58,86 +46,43 @@ class Producer:
         self.runner_id = random.randint(1, 2_147_483_647)
         
         # Configuração da corrida
-        self.current_route = []
+        self.current_route = None  # CompiledRoute da corrida atual
         self.route_id = 0  # ID de la ruta (1, 2 o 3)
         self.current_segment = 0
-        self.steps_per_segment = 0
-        self.current_step = 0
+        self.distance_km = 0.0  # distância percorrida ao longo da rota
         self.target_speed_kmh = 0 # Velocidade alvo para esta corrida
         
         self.start_new_race()
 
     def start_new_race(self):
         # Rotar entre rotas: 1 -> 2 -> 3 -> 1
-        self.route_id = (self.route_id % len(ROUTES)) + 1
+        self.route_id = (self.route_id % len(COMPILED_ROUTES)) + 1
         route_index = self.route_id - 1
-        self.current_route = ROUTES[route_index]
+        self.current_route = COMPILED_ROUTES[route_index]
         self.current_segment = 0
-        self.current_step = 0
+        self.distance_km = 0.0
         
         # Velocidade aumentada (60-100 km/h) com variação por corredor
         base_speed = random.uniform(60, 100)
         self.target_speed_kmh = base_speed * self.speed_variation
-        
-        # Calcular passos necessários para o primeiro segmento com base na velocidade
-        self._calculate_segment_steps()
 
         # Posição inicial (X=Latitude, Y=Longitude) para compatibilidade com Leaflet
         # ROUTES é lista de (Lat, Long) -> p[0]=Lat, p[1]=Long
-        self.positionX = self.current_route[0][0]
-        self.positionY = self.current_route[0][1]
+        self.positionX, self.positionY = self.current_route.points[0]
         
         logging.info(f"Runner {self.runner_id} started. Target Speed: {self.target_speed_kmh:.2f} km/h")
 
-    def _calculate_segment_steps(self):
-        """Calcula quantos passos são necessários para percorrer o segmento atual à velocidade alvo."""
-        if self.current_segment >= len(self.current_route) - 1:
-            return
-
-        p1 = self.current_route[self.current_segment]
-        p2 = self.current_route[self.current_segment + 1]
-        
-        # Distância Euclidiana aproximada em graus
-        # 1 grau de latitude ~= 111 km
-        d_lat = p2[0] - p1[0]
-        d_lon = p2[1] - p1[1]
-        dist_deg = math.sqrt(d_lat**2 + d_lon**2)
-        dist_km = dist_deg * 111.0
-        
-        # Velocidade em km/s (km/h / 3600)
-        speed_kms = self.target_speed_kmh / 3600.0
-        
-        # Tempo necessário para percorrer o segmento (em segundos)
-        if speed_kms > 0:
-            duration_seconds = dist_km / speed_kms
-        else:
-            duration_seconds = 1
-            
-        # Número de passos = Duração / Tempo por passo (SLEEP_SECONDS)
-        # Garante pelo menos 1 passo para evitar divisão por zero
-        steps = max(1, int(duration_seconds / SLEEP_SECONDS))
-        self.steps_per_segment = min(steps, MAX_STEPS_PER_SEGMENT)
-
     def update_physics(self):
+        route = self.current_route
+
         # Verificar se a corrida acabou
-        if self.current_segment >= len(self.current_route) - 1:
+        if self.current_segment >= route.segments:
             self.start_new_race()
             return
 
-        # Pontos do segmento atual
-        p1 = self.current_route[self.current_segment]
-        p2 = self.current_route[self.current_segment + 1]
-
-        # Interpolação linear (limitada para evitar extrapolação quando chegamos ao fim)
-        t = min(1.0, self.current_step / float(self.steps_per_segment))
-        
-        # Calcular Lat/Lon atuais
-        lat = p1[0] + (p2[0] - p1[0]) * t
-        lon = p1[1] + (p2[1] - p1[1]) * t
-        
-        # Atribuição: X=Latitude, Y=Longitude (Para compatibilidade direta com Leaflet [Lat, Lon])
-        new_x = lat
-        new_y = lon
+        # Posição a partir da distância percorrida (X=Latitude, Y=Longitude,
+        # para compatibilidade direta com Leaflet [Lat, Lon])
+        new_x, new_y = route.position_at(self.distance_km, self.current_segment)
 
         # Atualizar velocidade (graus por tick) 
         # Multiplicado por 1.000 para ser legível na tabela da UI (ex: 0.75 em vez de 0.00075)
@@ -148,13 +93,18 @@ class Producer:
         self.positionX = new_x
         self.positionY = new_y
 
-        self.current_step += 1
-        
-        # Avançar segmento se necessário
-        if self.current_step >= self.steps_per_segment:
-            self.current_segment += 1
-            self.current_step = 0
-            self._calculate_segment_steps()
+        # Avançar ao longo da rota ao ritmo do segmento atual, fixando a
+        # distância no fim do segmento quando o alcança
+        segment = self.current_segment
+        step_km = segment_step_km(
+            route.lengths_km[segment], self.target_speed_kmh, SLEEP_SECONDS, MAX_STEPS_PER_SEGMENT
+        )
+        next_distance = self.distance_km + step_km
+        segment_end = route.cumulative_km[segment + 1]
+        if next_distance >= segment_end - SEGMENT_SNAP_KM:
+            next_distance = segment_end
+        self.distance_km = next_distance
+        self.current_segment = route.locate(next_distance)
 
     def get_data(self):
         self.update_physics()
@@ -169,71 +119,80 @@ class Producer:
             "timestampMs": int(time.time() * 1000)
         }
         return data
-    
-    def connect_rabbitmq(self):
-        """Establishes a connection to RabbitMQ with retry logic."""
-        user = os.getenv("RABBITMQ_USER", "guest")
-        password = os.getenv("RABBITMQ_PASS", "guest")
-        host = os.getenv("RABBITMQ_HOST", "localhost")
-        
-        while True:
-            try:
-                logging.info(f"Connecting to RabbitMQ at {host}...")
-                credentials = pika.PlainCredentials(user, password)
-                parameters = pika.ConnectionParameters(host, 5672, '/', credentials)
-                connection = pika.BlockingConnection(parameters)
-                logging.info("Successfully connected to RabbitMQ.")
-                return connection
-            except pika.exceptions.AMQPConnectionError as e:
-                logging.error(f"Failed to connect to RabbitMQ: {e}. Retrying in 5 seconds...")
-                time.sleep(5)
 
+    def next_messages(self):
+        """Mensagens a publicar neste tick (uma só, para um corredor)."""
+        return [self.get_data()]
 
-if __name__ == "__main__":
-    # ADICIONA ISTO: Inicia o servidor de métricas na porta 8001
-    def start_metrics():
-        start_http_server(8001)
-        logging.info("Servidor de métricas Prometheus iniciado na porta 8001")
-    
-    # Inicia o servidor numa thread separada
-    metrics_thread = threading.Thread(target=start_metrics, daemon=True)
-    metrics_thread.start()
-    
-    producer = Producer()
-    initial_delay = random.uniform(0.0, 2.5)
-    logging.info(f"Atraso inicial de {initial_delay:.2f}s para desincronizar emissões")
-    time.sleep(initial_delay)
+
+def rabbitmq_parameters():
+    """Builds the RabbitMQ connection parameters from the environment."""
+    user = os.getenv("RABBITMQ_USER", "guest")
+    password = os.getenv("RABBITMQ_PASS", "guest")
+    host = os.getenv("RABBITMQ_HOST", "localhost")
+    credentials = pika.PlainCredentials(user, password)
+    return pika.ConnectionParameters(host, 5672, '/', credentials)
+
+
+def connect_rabbitmq():
+    """Establishes a connection to RabbitMQ with retry logic."""
+    parameters = rabbitmq_parameters()
+
+    while True:
+        try:
+            logging.info(f"Connecting to RabbitMQ at {parameters.host}...")
+            connection = pika.BlockingConnection(parameters)
+            logging.info("Successfully connected to RabbitMQ.")
+            return connection
+        except pika.exceptions.AMQPConnectionError as e:
+            logging.error(f"Failed to connect to RabbitMQ: {e}. Retrying in 5 seconds...")
+            time.sleep(5)
+
+
+def log_sent(messages):
+    """Regista as mensagens enviadas num tick (resumo quando são muitas)."""
+    if len(messages) == 1:
+        logging.info(f"Sent message: {messages[0]}")
+    else:
+        logging.info(f"Sent {len(messages)} messages.")
+
+
+def run_basic(producer, codec, router):
+    """
+    Publica as mensagens de cada tick com basic_publish síncrono (sem confirms).
+    `producer` pode ser um `Producer` ou uma `RunnerFleet`: todas as mensagens
+    do tick são publicadas de seguida, encaminhadas por `router`.
+    """
     connection = None
     channel = None
-    queue_name = os.getenv("QUEUE_NAME", "queue")
+    # As propriedades são criadas uma vez; só o timestamp muda por mensagem
+    properties = pika.BasicProperties(
+        content_type=codec.content_type,
+        delivery_mode=2, # make message persistent
+    )
     
     while True:
         try:
             if not connection or connection.is_closed:
-                connection = producer.connect_rabbitmq()
+                connection = connect_rabbitmq()
                 channel = connection.channel()
-                channel.queue_declare(queue=queue_name, durable=True)
+                router.declare(channel)
 
             with CREATION_TIME.time():
-                message_data = producer.get_data()
-                message_body = json.dumps(message_data)
-            
-                properties = pika.BasicProperties(
-                    content_type='application/json',
-                    delivery_mode=2, # make message persistent
-                    timestamp=int(time.time() * 1000)
-                )
-
-                channel.basic_publish(
-                    exchange='',
-                    routing_key=queue_name,
-                    body=message_body,
-                    properties=properties
-                )
-            MESSAGES_CREATED.inc()
+                messages = producer.next_messages()
+                properties.timestamp = int(time.time() * 1000)
+
+                for message_data in messages:
+                    channel.basic_publish(
+                        exchange=router.exchange,
+                        routing_key=router.routing_key(message_data["runner_id"]),
+                        body=codec.encode(message_data),
+                        properties=properties
+                    )
+            MESSAGES_CREATED.inc(len(messages))
             LAST_MESSAGE_TIMESTAMP.set(time.time())
             
-            logging.info(f"Sent message: {message_body}")
+            log_sent(messages)
 
         except pika.exceptions.AMQPConnectionError as e:
             logging.error(f"Connection lost: {e}. Reconnecting...")
@@ -250,3 +209,92 @@ if __name__ == "__main__":
             time.sleep(5)
             
         time.sleep(SLEEP_SECONDS * producer.tick_factor)
+
+
+async def run_with_confirms(producer, codec, router, window):
+    """
+    Publica com publisher confirms: as publicações não esperam pelo confirm,
+    e o broker confirma-as em grupo. Até `window` mensagens podem estar por
+    confirmar; a latência dos confirms e os nacks são exportados pelas métricas.
+
+    O `ConfirmPublisher` volta a publicar as mensagens rejeitadas ou perdidas
+    antes do confirm; as mensagens do tick que ele não chegou a aceitar (canal
+    fechado) ficam em `backlog` e são publicadas depois de voltar a ligar.
+    """
+    publisher = ConfirmPublisher(rabbitmq_parameters(), router, window=window)
+    # As propriedades são criadas uma vez; só o timestamp muda por mensagem
+    properties = pika.BasicProperties(
+        content_type=codec.content_type,
+        delivery_mode=2, # make message persistent
+    )
+    backlog = deque()
+
+    while True:
+        try:
+            if not publisher.is_open:
+                await publisher.connect()
+
+            with CREATION_TIME.time():
+                if not backlog:
+                    messages = producer.next_messages()
+                    properties.timestamp = int(time.time() * 1000)
+                    backlog.extend(messages)
+                    MESSAGES_CREATED.inc(len(messages))
+                    LAST_MESSAGE_TIMESTAMP.set(time.time())
+                while backlog:
+                    message_data = backlog[0]
+                    await publisher.publish(
+                        codec.encode(message_data), properties, router.routing_key(message_data["runner_id"])
+                    )
+                    backlog.popleft()
+
+            log_sent(messages)
+
+        except pika.exceptions.AMQPConnectionError as e:
+            logging.error(f"Connection lost: {e}. Reconnecting in 5 seconds...")
+            await publisher.close()
+            await asyncio.sleep(5)
+        except Exception as e:
+            logging.error(f"An unexpected error occurred: {e}")
+            await publisher.close()
+            await asyncio.sleep(5)
+
+        await asyncio.sleep(SLEEP_SECONDS * producer.tick_factor)
+
+
+if __name__ == "__main__":
+    # ADICIONA ISTO: Inicia o servidor de métricas na porta 8001
+    def start_metrics():
+        start_http_server(8001)
+        logging.info("Servidor de métricas Prometheus iniciado na porta 8001")
+    
+    # Inicia o servidor numa thread separada
+    metrics_thread = threading.Thread(target=start_metrics, daemon=True)
+    metrics_thread.start()
+    
+    # Número de corredores simulados por este processo
+    runners_per_process = int(os.getenv("RUNNERS_PER_PROCESS", "1"))
+    if runners_per_process > 1:
+        producer = RunnerFleet(runners_per_process, COMPILED_ROUTES, SLEEP_SECONDS, MAX_STEPS_PER_SEGMENT)
+    else:
+        producer = Producer()
+    initial_delay = random.uniform(0.0, 2.5)
+    logging.info(f"Atraso inicial de {initial_delay:.2f}s para desincronizar emissões")
+    time.sleep(initial_delay)
+    queue_name = os.getenv("QUEUE_NAME", "queue")
+    # Filas particionadas por runner_id (tem de ser igual ao PARTITIONS do consumidor); 1 = fila única
+    partitions = int(os.getenv("PARTITIONS", "1"))
+    router = PartitionRouter(queue_name, partitions)
+    if partitions > 1:
+        logging.info(f"A publicar em {partitions} partições (exchange '{router.exchange}')")
+    # Formato das mensagens: 'json' (por omissão), 'msgpack' ou 'struct'
+    codec = get_codec_by_name(os.getenv("MESSAGE_CODEC", "json"))
+    logging.info(f"A publicar mensagens com o codec '{codec.name}' ({codec.content_type})")
+
+    # Modo de publicação: 'basic' (por omissão) ou 'confirm' (publisher confirms)
+    publish_mode = os.getenv("PUBLISH_MODE", "basic")
+    if publish_mode == "confirm":
+        confirm_window = int(os.getenv("CONFIRM_WINDOW", "1000"))
+        asyncio.run(run_with_confirms(producer, codec, router, confirm_window))
+    else:
+        run_basic(producer, codec, router)
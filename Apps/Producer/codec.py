@@ -0,0 +1,145 @@
+"""
+Módulo de Codecs de Mensagens.
+
+Este módulo define os formatos em que o produtor serializa a telemetria e o
+consumidor a descodifica. O codec de cada mensagem é escolhido pelo
+`content_type` AMQP, por isso produtores e consumidores com codecs diferentes
+podem coexistir na mesma fila.
+
+O formato de cada codec tem de ser igual ao de `Apps/Consumer/src/core/codec.py`
+(cada serviço é construído num contexto Docker próprio).
+"""
+import json
+import struct
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional; usa-se o json da biblioteca padrão
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack é opcional; o codec só fica disponível se existir
+    msgpack = None
+
+# Ordem fixa dos campos nos formatos compactos (msgpack e struct)
+FIELDS = (
+    "runner_id",
+    "route_id",
+    "current_segment",
+    "positionX",
+    "positionY",
+    "speedX",
+    "speedY",
+    "timestampMs",
+)
+
+
+class CodecError(ValueError):
+    """Erro ao codificar ou descodificar uma mensagem de telemetria."""
+
+
+class JsonCodec:
+    """JSON (orjson quando instalado). Formato original, legível e autodescritivo."""
+    name = 'json'
+    content_type = 'application/json'
+
+    def encode(self, data: Dict[str, Any]) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(data)
+        return json.dumps(data).encode('utf-8')
+
+    def decode(self, body: bytes) -> Dict[str, Any]:
+        try:
+            raw_data = orjson.loads(body) if orjson is not None else json.loads(body)
+            # Produtor envia objeto JSON (não array); só os campos conhecidos são guardados
+            return {
+                "runner_id": raw_data["runner_id"],
+                "route_id": raw_data.get("route_id"),
+                "current_segment": raw_data.get("current_segment"),
+                "positionX": raw_data["positionX"],
+                "positionY": raw_data["positionY"],
+                "speedX": raw_data["speedX"],
+                "speedY": raw_data["speedY"],
+                "timestampMs": raw_data["timestampMs"]
+            }
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise CodecError(f"JSON de telemetria inválido: {e}") from e
+
+
+class MsgpackCodec:
+    """msgpack com os campos num array pela ordem de `FIELDS` (sem nomes)."""
+    name = 'msgpack'
+    content_type = 'application/msgpack'
+
+    def encode(self, data: Dict[str, Any]) -> bytes:
+        return msgpack.packb([data[field] for field in FIELDS])
+
+    def decode(self, body: bytes) -> Dict[str, Any]:
+        try:
+            values = msgpack.unpackb(body)
+        except Exception as e:
+            raise CodecError(f"msgpack de telemetria inválido: {e}") from e
+        if not isinstance(values, list) or len(values) != len(FIELDS):
+            raise CodecError("msgpack de telemetria com número de campos inválido")
+        return dict(zip(FIELDS, values))
+
+
+class StructCodec:
+    """
+    Registo binário de tamanho fixo (48 bytes, little-endian):
+    runner_id u32, route_id u16, current_segment u16, posição/velocidade
+    4 x float64 e timestampMs i64.
+    """
+    name = 'struct'
+    content_type = 'application/x-telemetry-struct'
+    _STRUCT = struct.Struct('<IHHddddq')
+
+    def encode(self, data: Dict[str, Any]) -> bytes:
+        try:
+            return self._STRUCT.pack(
+                data["runner_id"],
+                data["route_id"] or 0,
+                data["current_segment"] or 0,
+                data["positionX"],
+                data["positionY"],
+                data["speedX"],
+                data["speedY"],
+                data["timestampMs"]
+            )
+        except struct.error as e:
+            raise CodecError(f"Telemetria não cabe no formato binário: {e}") from e
+
+    def decode(self, body: bytes) -> Dict[str, Any]:
+        try:
+            return dict(zip(FIELDS, self._STRUCT.unpack(body)))
+        except struct.error as e:
+            raise CodecError(f"Registo binário de telemetria inválido: {e}") from e
+
+
+_AVAILABLE = [JsonCodec(), StructCodec()]
+if msgpack is not None:
+    _AVAILABLE.append(MsgpackCodec())
+
+CODECS_BY_CONTENT_TYPE = {codec.content_type: codec for codec in _AVAILABLE}
+CODECS_BY_NAME = {codec.name: codec for codec in _AVAILABLE}
+DEFAULT_CODEC = CODECS_BY_NAME['json']
+
+
+def get_codec(content_type: Optional[str]):
+    """Devolve o codec para um `content_type` AMQP (JSON se não for indicado)."""
+    if not content_type:
+        return DEFAULT_CODEC
+    try:
+        return CODECS_BY_CONTENT_TYPE[content_type]
+    except KeyError:
+        raise CodecError(f"content_type não suportado: {content_type}")
+
+
+def get_codec_by_name(name: str):
+    """Devolve o codec com o nome indicado ('json', 'msgpack' ou 'struct')."""
+    try:
+        return CODECS_BY_NAME[name]
+    except KeyError:
+        raise CodecError(f"Codec desconhecido ou não instalado: {name}")
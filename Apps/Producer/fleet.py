@@ -0,0 +1,151 @@
+"""
+Frota de corredores simulados num único processo.
+
+A classe `RunnerFleet` reproduz a física de `Producer` (distância percorrida ao
+longo da rota, rotação de rotas 1 -> 2 -> 3 e número de passos por segmento em
+função da velocidade alvo), mas guarda o estado de todos os corredores em arrays
+NumPy e avança-os todos de uma vez em cada tick.
+
+As rotas compiladas (`geometry.CompiledRoute`) são achatadas em tabelas
+contíguas de segmentos; o segmento de cada corredor é encontrado com um único
+`np.searchsorted` sobre os inícios de segmento de todas as rotas, deslocados por
+rota para que não se sobreponham.
+"""
+import logging
+import time
+
+import numpy as np
+
+MAX_RUNNER_ID = 2_147_483_647
+
+# Tolerância (km) para fixar a distância no fim do segmento (igual a Producer)
+SEGMENT_SNAP_KM = 1e-9
+
+
+class RunnerFleet:
+    def __init__(self, size, routes, sleep_seconds, max_steps_per_segment, seed=None):
+        self.size = size
+        self.sleep_seconds = sleep_seconds
+        self.max_steps_per_segment = max_steps_per_segment
+        # A frota avança ao ritmo base; a variação por corredor vem da velocidade
+        self.tick_factor = 1.0
+        self._rng = np.random.default_rng(seed)
+
+        # Tabelas de segmentos de todas as rotas, concatenadas
+        self.route_segments = np.array([route.segments for route in routes], dtype=np.int64)
+        self.route_offset = np.concatenate([[0], np.cumsum(self.route_segments)[:-1]]).astype(np.int64)
+        self.route_total_km = np.array([route.total_km for route in routes], dtype=np.float64)
+        self.route_first_point = np.array([route.points[0] for route in routes], dtype=np.float64)
+        self.segment_start = np.array([p for route in routes for p in route.starts], dtype=np.float64)
+        self.segment_delta = np.array([d for route in routes for d in route.deltas], dtype=np.float64)
+        self.segment_length_km = np.array([l for route in routes for l in route.lengths_km], dtype=np.float64)
+        self.segment_begin_km = np.array([c for route in routes for c in route.cumulative_km[:-1]], dtype=np.float64)
+        self.segment_end_km = np.array([c for route in routes for c in route.cumulative_km[1:]], dtype=np.float64)
+        # Chaves de pesquisa: início de cada segmento + deslocamento da rota
+        self._route_shift = float(self.route_total_km.max()) + 1.0
+        route_of_segment = np.repeat(np.arange(len(routes)), self.route_segments)
+        self._search_keys = self.segment_begin_km + route_of_segment * self._route_shift
+
+        # IDs aleatórios e únicos, tal como em Producer
+        ids = np.unique(self._rng.integers(1, MAX_RUNNER_ID, size=size, endpoint=True))
+        while len(ids) < size:
+            extra = self._rng.integers(1, MAX_RUNNER_ID, size=size - len(ids), endpoint=True)
+            ids = np.unique(np.concatenate([ids, extra]))
+        self.runner_id = self._rng.permutation(ids)
+
+        self.speed_variation = self._rng.uniform(0.6, 1.4, size)
+        self.route_index = np.full(size, -1, dtype=np.int64)  # -1 -> primeira corrida é a rota 1
+        self.current_segment = np.zeros(size, dtype=np.int64)
+        self.distance_km = np.zeros(size, dtype=np.float64)
+        self.target_speed_kmh = np.zeros(size, dtype=np.float64)
+        self.position = np.zeros((size, 2), dtype=np.float64)
+        self.speed = np.zeros((size, 2), dtype=np.float64)
+
+        self._start_new_race(np.arange(size))
+        logging.info(f"Fleet of {size} runners started.")
+
+    def _start_new_race(self, idx):
+        """Inicia uma nova corrida para os corredores em `idx` (rota seguinte)."""
+        if len(idx) == 0:
+            return
+        # Rotar entre rotas: 1 -> 2 -> 3 -> 1
+        self.route_index[idx] = (self.route_index[idx] + 1) % len(self.route_segments)
+        self.current_segment[idx] = 0
+        self.distance_km[idx] = 0.0
+
+        # Velocidade aumentada (60-100 km/h) com variação por corredor
+        base_speed = self._rng.uniform(60, 100, len(idx))
+        self.target_speed_kmh[idx] = base_speed * self.speed_variation[idx]
+
+        self.position[idx] = self.route_first_point[self.route_index[idx]]
+
+    def _locate(self, routes, distance_km):
+        """Segmento (local à rota) que contém cada distância; `segments` no fim da rota."""
+        keys = distance_km + routes * self._route_shift
+        segment = np.searchsorted(self._search_keys, keys, side='right') - 1 - self.route_offset[routes]
+        return np.where(distance_km >= self.route_total_km[routes], self.route_segments[routes], segment)
+
+    def _segment_step_km(self, segments, target_speed_kmh):
+        """Distância avançada por tick em cada segmento (ver geometry.segment_step_km)."""
+        length_km = self.segment_length_km[segments]
+        speed_kms = target_speed_kmh / 3600.0
+        duration_seconds = np.divide(length_km, speed_kms, out=np.ones_like(length_km), where=speed_kms > 0)
+        steps = np.clip((duration_seconds / self.sleep_seconds).astype(np.int64), 1, self.max_steps_per_segment)
+        return length_km / steps
+
+    def update_physics(self):
+        """Avança todos os corredores um tick."""
+        finished = self.current_segment >= self.route_segments[self.route_index]
+        self._start_new_race(np.flatnonzero(finished))
+
+        moving = np.flatnonzero(~finished)
+        if len(moving) == 0:
+            return
+
+        routes = self.route_index[moving]
+        segments = self.route_offset[routes] + self.current_segment[moving]
+        distance_km = self.distance_km[moving]
+
+        # Posição a partir da distância percorrida ao longo do segmento
+        length_km = self.segment_length_km[segments]
+        fraction = np.divide(
+            distance_km - self.segment_begin_km[segments], length_km,
+            out=np.zeros_like(length_km), where=length_km > 0
+        )
+        new_position = self.segment_start[segments] + self.segment_delta[segments] * fraction[:, None]
+
+        # Velocidade em graus por tick, x1000 para ser legível na UI
+        self.speed[moving] = (new_position - self.position[moving]) * 1000
+        self.position[moving] = new_position
+
+        # Avançar ao ritmo do segmento atual, fixando a distância no fim do segmento
+        next_distance = distance_km + self._segment_step_km(segments, self.target_speed_kmh[moving])
+        segment_end = self.segment_end_km[segments]
+        next_distance = np.where(next_distance >= segment_end - SEGMENT_SNAP_KM, segment_end, next_distance)
+        self.distance_km[moving] = next_distance
+        self.current_segment[moving] = self._locate(routes, next_distance)
+
+    def next_messages(self):
+        """Avança a frota e devolve as mensagens de todos os corredores para este tick."""
+        self.update_physics()
+        timestamp_ms = int(time.time() * 1000)
+        route_ids = (self.route_index + 1).tolist()
+        return [
+            {
+                "runner_id": runner_id,
+                "route_id": route_id,
+                "current_segment": segment,
+                "positionX": x,
+                "positionY": y,
+                "speedX": speed_x,
+                "speedY": speed_y,
+                "timestampMs": timestamp_ms
+            }
+            for runner_id, route_id, segment, (x, y), (speed_x, speed_y) in zip(
+                self.runner_id.tolist(),
+                route_ids,
+                self.current_segment.tolist(),
+                self.position.tolist(),
+                self.speed.tolist()
+            )
+        ]
@@ -0,0 +1,102 @@
+"""
+Geometria das rotas pré-calculada no arranque.
+
+Cada rota é compilada uma única vez numa `CompiledRoute`, com o ponto inicial,
+o vetor (delta) e o comprimento em km de cada segmento, e as distâncias
+acumuladas desde o início da rota. A posição de um corredor é obtida a partir
+da distância percorrida ao longo da rota com uma pesquisa binária (bisect)
+sobre as distâncias acumuladas, pelo que o custo por tick não depende do número
+de pontos da rota.
+
+As rotas são lidas de um ficheiro JSON partilhado com a API
+(`K8s-Config/Apps/routes.json`, montado através de uma ConfigMap e indicado em
+`ROUTES_FILE`), para que produtor e API usem sempre a mesma geometria.
+"""
+import json
+import math
+import os
+from bisect import bisect_right
+from pathlib import Path
+
+# 1 grau de latitude ~= 111 km (distância Euclidiana aproximada em graus)
+KM_PER_DEGREE = 111.0
+
+
+def default_routes_file():
+    """
+    Ficheiro de rotas no repositório (`K8s-Config/Apps/routes.json`), usado
+    quando ROUTES_FILE não está definido. Calculado só quando é preciso: nas
+    imagens o código está em /app, sem a pasta K8s-Config.
+    """
+    return Path(__file__).resolve().parent.parent.parent / "K8s-Config" / "Apps" / "routes.json"
+
+
+def load_route_definitions(path=None):
+    """
+    Lê as definições das rotas ({"rutas": [{"id", "name", "points"}, ...]}),
+    ordenadas por id. O corredor percorre-as por esta ordem (route_id = id).
+    """
+    path = Path(path or os.getenv("ROUTES_FILE") or default_routes_file())
+    with open(path, encoding="utf-8") as f:
+        rutas = json.load(f)["rutas"]
+    rutas.sort(key=lambda ruta: ruta["id"])
+    if [ruta["id"] for ruta in rutas] != list(range(1, len(rutas) + 1)):
+        raise ValueError(f"As rotas em {path} têm de ter ids consecutivos a partir de 1")
+    return rutas
+
+
+class CompiledRoute:
+    __slots__ = ("points", "starts", "deltas", "lengths_km", "cumulative_km", "total_km", "segments")
+
+    def __init__(self, points):
+        self.points = [(float(x), float(y)) for x, y in points]
+        self.starts = self.points[:-1]
+        self.deltas = [(x2 - x1, y2 - y1) for (x1, y1), (x2, y2) in zip(self.points, self.points[1:])]
+        self.lengths_km = [math.hypot(dx, dy) * KM_PER_DEGREE for dx, dy in self.deltas]
+        self.segments = len(self.deltas)
+
+        # cumulative_km[i] = distância do início da rota ao início do segmento i
+        # (o último elemento é o comprimento total)
+        self.cumulative_km = [0.0]
+        for length_km in self.lengths_km:
+            self.cumulative_km.append(self.cumulative_km[-1] + length_km)
+        self.total_km = self.cumulative_km[-1]
+
+    def locate(self, distance_km):
+        """Índice do segmento que contém `distance_km` (`segments` no fim da rota)."""
+        if distance_km >= self.total_km:
+            return self.segments
+        return bisect_right(self.cumulative_km, distance_km) - 1
+
+    def position_at(self, distance_km, segment=None):
+        """Devolve (x, y) a `distance_km` do início da rota."""
+        if segment is None:
+            segment = self.locate(distance_km)
+        if segment >= self.segments:
+            return self.points[-1]
+
+        length_km = self.lengths_km[segment]
+        fraction = (distance_km - self.cumulative_km[segment]) / length_km if length_km > 0 else 0.0
+        x, y = self.starts[segment]
+        dx, dy = self.deltas[segment]
+        return x + dx * fraction, y + dy * fraction
+
+
+def compile_routes(routes):
+    """Compila todas as rotas (listas de pontos) em `CompiledRoute`."""
+    return [CompiledRoute(points) for points in routes]
+
+
+def segment_step_km(length_km, target_speed_kmh, sleep_seconds, max_steps_per_segment):
+    """
+    Distância (km) avançada por tick num segmento de `length_km`.
+
+    O segmento é percorrido no número de passos que demoraria à velocidade alvo,
+    com pelo menos 1 e no máximo `max_steps_per_segment` passos, para que a
+    posição avance visivelmente mesmo em segmentos muito longos.
+    """
+    # Velocidade em km/s (km/h / 3600)
+    speed_kms = target_speed_kmh / 3600.0
+    duration_seconds = length_km / speed_kms if speed_kms > 0 else 1
+    steps = min(max(1, int(duration_seconds / sleep_seconds)), max_steps_per_segment)
+    return length_km / steps
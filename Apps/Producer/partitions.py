@@ -0,0 +1,60 @@
+"""
+Encaminhamento das mensagens por partições.
+
+Com `PARTITIONS` > 1 as mensagens são publicadas na exchange direta
+`<QUEUE_NAME>.partitions` com a chave `runner_id % PARTITIONS`; cada partição
+tem a sua fila `<QUEUE_NAME>.<p>`. Todas as mensagens de um corredor vão para a
+mesma fila e o débito escala com o número de filas (cada fila do RabbitMQ é
+servida por um único core); a ordem por corredor depende de como os
+consumidores reclamam as partições (ver o consumidor). Com `PARTITIONS=1`
+publica-se na fila única, como antes.
+
+Os nomes têm de ser iguais aos de `Apps/Consumer/src/core/partitions.py`.
+"""
+
+
+def partition_exchange(queue_name):
+    """Nome da exchange direta que distribui as mensagens pelas partições."""
+    return f"{queue_name}.partitions"
+
+
+def partition_queue(queue_name, partition):
+    """Nome da fila de uma partição."""
+    return f"{queue_name}.{partition}"
+
+
+class PartitionRouter:
+    """Escolhe a exchange e a chave de encaminhamento de cada mensagem."""
+
+    def __init__(self, queue_name, partitions=1):
+        self.queue_name = queue_name
+        self.partitions = max(1, partitions)
+        self.exchange = partition_exchange(queue_name) if self.partitions > 1 else ''
+        # Chaves pré-calculadas: evita formatar uma string por mensagem
+        self._routing_keys = [str(p) for p in range(self.partitions)]
+
+    def routing_key(self, runner_id):
+        """Chave de encaminhamento das mensagens de `runner_id`."""
+        if self.partitions == 1:
+            return self.queue_name
+        return self._routing_keys[runner_id % self.partitions]
+
+    def declarations(self):
+        """
+        Passos para declarar a topologia (idempotentes), como pares
+        (método do canal, argumentos): a fila única ou a exchange e as filas
+        de todas as partições com as respetivas ligações.
+        """
+        if self.partitions == 1:
+            return [("queue_declare", {"queue": self.queue_name, "durable": True})]
+        steps = [("exchange_declare", {"exchange": self.exchange, "exchange_type": "direct", "durable": True})]
+        for partition, routing_key in enumerate(self._routing_keys):
+            queue = partition_queue(self.queue_name, partition)
+            steps.append(("queue_declare", {"queue": queue, "durable": True}))
+            steps.append(("queue_bind", {"queue": queue, "exchange": self.exchange, "routing_key": routing_key}))
+        return steps
+
+    def declare(self, channel):
+        """Declara a topologia num `BlockingChannel`."""
+        for method, kwargs in self.declarations():
+            getattr(channel, method)(**kwargs)
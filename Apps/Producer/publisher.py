@@ -0,0 +1,240 @@
+"""
+Publicador com publisher confirms.
+
+O `BlockingChannel` do pika espera pelo confirm de cada mensagem antes de
+devolver o controlo, o que limita cada produtor a uma mensagem por ida e volta
+ao broker. A classe `ConfirmPublisher` usa o `AsyncioConnection` do pika para
+publicar sem esperar: as mensagens ficam numa janela de até `window` publicações
+por confirmar, e o broker confirma-as em grupo (Basic.Ack com multiple=True).
+
+Cada publicação fica guardada (corpo, propriedades e chave de encaminhamento)
+até ser confirmada: uma mensagem rejeitada (nack) é publicada de novo de
+imediato, até `MAX_ATTEMPTS` vezes, e as que ficam por confirmar quando a
+ligação cai são publicadas de novo logo a seguir a `connect()`. O consumidor
+descarta os duplicados que daí resultem (`_id` determinístico).
+"""
+import asyncio
+import copy
+import functools
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+import pika
+from pika.adapters.asyncio_connection import AsyncioConnection
+from pika.exceptions import AMQPConnectionError
+
+from Metrics import CONFIRM_LATENCY, MESSAGES_CONFIRMED, MESSAGES_NACKED, MESSAGES_REPUBLISHED
+from partitions import PartitionRouter
+
+# Publicações de uma mensagem rejeitada (nack) antes de desistir dela
+MAX_ATTEMPTS = 5
+
+
+class _Publication:
+    """Mensagem publicada e ainda não confirmada."""
+    __slots__ = ("body", "properties", "routing_key", "timestamp", "sent_at", "attempts", "future")
+
+    def __init__(self, body: bytes, properties: pika.BasicProperties, routing_key: str, future: asyncio.Future):
+        self.body = body
+        # O chamador reutiliza o objeto das propriedades: só se guarda o timestamp,
+        # e a cópia é feita apenas se a mensagem tiver de ser publicada de novo
+        self.properties = properties
+        self.timestamp = properties.timestamp
+        self.routing_key = routing_key
+        self.sent_at = 0.0
+        self.attempts = 0
+        self.future = future
+
+    def retry_properties(self) -> pika.BasicProperties:
+        properties = copy.copy(self.properties)
+        properties.timestamp = self.timestamp
+        return properties
+
+
+class ConfirmPublisher:
+    """Publica numa fila durável (ou nas partições) com publisher confirms e janela limitada."""
+
+    def __init__(self, parameters: pika.ConnectionParameters, router: PartitionRouter, window: int = 1000):
+        self._parameters = parameters
+        self._router = router
+        self._window_size = max(1, window)
+        self._window: Optional[asyncio.Semaphore] = None
+        self._connection: Optional[AsyncioConnection] = None
+        self._channel = None
+        self._next_delivery_tag = 1
+        # delivery_tag -> publicação à espera do confirm (por ordem de envio)
+        self._pending: Dict[int, _Publication] = {}
+        # Publicações por confirmar quando o canal fechou: enviadas de novo em `connect()`
+        self._unsent: Deque[_Publication] = deque()
+        self._closed: Optional[asyncio.Future] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._channel is not None and self._channel.is_open
+
+    async def connect(self):
+        """Abre a ligação e o canal, declara a fila (ou as partições) e ativa os confirms."""
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        if self._window is None:
+            # Criada uma só vez: as vagas seguem as publicações entre ligações
+            self._window = asyncio.Semaphore(self._window_size)
+        self._closed = loop.create_future()
+        self._next_delivery_tag = 1
+
+        def fail(error):
+            if not ready.done():
+                ready.set_exception(AMQPConnectionError(error))
+
+        def on_connection_open(connection):
+            connection.channel(on_open_callback=on_channel_open)
+
+        def on_channel_open(channel):
+            self._channel = channel
+            channel.add_on_close_callback(lambda ch, reason: self._on_channel_closed(reason))
+            declare_next(iter(self._router.declarations()))
+
+        def declare_next(steps, frame=None):
+            # Declarações encadeadas: cada uma é feita quando a anterior é confirmada
+            step = next(steps, None)
+            if step is None:
+                self._channel.confirm_delivery(self._on_delivery_confirmation, callback=on_confirm_selected)
+                return
+            method, kwargs = step
+            getattr(self._channel, method)(callback=functools.partial(declare_next, steps), **kwargs)
+
+        def on_confirm_selected(frame):
+            if not ready.done():
+                ready.set_result(None)
+
+        def on_connection_closed(connection, reason):
+            self._channel = None
+            self._on_channel_closed(reason)
+            fail(reason)
+
+        logging.info(f"Connecting to RabbitMQ at {self._parameters.host} (publisher confirms)...")
+        self._connection = AsyncioConnection(
+            self._parameters,
+            on_open_callback=on_connection_open,
+            on_open_error_callback=lambda connection, error: fail(error),
+            on_close_callback=on_connection_closed,
+            custom_ioloop=loop
+        )
+        await ready
+        logging.info("Successfully connected to RabbitMQ with publisher confirms enabled.")
+
+        if self._unsent:
+            logging.warning(f"Republishing {len(self._unsent)} messages left unconfirmed by the previous connection.")
+        while self._unsent and self.is_open:
+            # Há sempre vaga: pendentes + por reenviar nunca excedem a janela
+            await self._window.acquire()
+            self._send(self._unsent.popleft(), republish=True)
+
+    def _on_delivery_confirmation(self, frame):
+        """Resolve as publicações confirmadas (ou rejeitadas) pelo broker."""
+        method = frame.method
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        now = time.perf_counter()
+
+        if method.multiple:
+            tags = []
+            for tag in self._pending:
+                if tag > method.delivery_tag:
+                    break
+                tags.append(tag)
+        else:
+            tags = [method.delivery_tag]
+
+        for tag in tags:
+            publication = self._pending.pop(tag, None)
+            if publication is None:
+                continue
+            CONFIRM_LATENCY.observe(now - publication.sent_at)
+            if acked:
+                MESSAGES_CONFIRMED.inc()
+                self._resolve(publication, True)
+                continue
+
+            MESSAGES_NACKED.inc()
+            if publication.attempts < MAX_ATTEMPTS and self.is_open:
+                # Mantém a vaga na janela e volta a publicar com um novo delivery_tag
+                logging.warning(f"Message {tag} was nacked by the broker; republishing.")
+                self._send(publication, republish=True)
+            else:
+                logging.error(f"Message {tag} was nacked {publication.attempts} times; giving up.")
+                self._resolve(publication, False)
+
+    def _on_channel_closed(self, reason):
+        """Guarda as publicações pendentes para serem enviadas de novo na próxima ligação."""
+        pending, self._pending = self._pending, {}
+        if pending:
+            logging.error(f"{len(pending)} messages left unconfirmed after channel close: {reason}")
+        for publication in pending.values():
+            self._unsent.append(publication)
+            # A vaga é libertada para não bloquear `publish()`; `connect()` volta a ocupá-la
+            self._window.release()
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(reason)
+
+    def _resolve(self, publication: _Publication, acked: bool):
+        if not publication.future.done():
+            publication.future.set_result(acked)
+        self._window.release()
+
+    def _send(self, publication: _Publication, republish: bool = False):
+        """Publica no canal aberto e regista a publicação com o próximo delivery_tag."""
+        # O pika serializa as propriedades durante basic_publish, por isso o
+        # mesmo objeto pode ser reutilizado (e alterado) na mensagem seguinte
+        properties = publication.retry_properties() if republish else publication.properties
+        self._channel.basic_publish(
+            exchange=self._router.exchange,
+            routing_key=publication.routing_key,
+            body=publication.body,
+            properties=properties
+        )
+        if republish:
+            MESSAGES_REPUBLISHED.inc()
+        publication.attempts += 1
+        publication.sent_at = time.perf_counter()
+        self._pending[self._next_delivery_tag] = publication
+        self._next_delivery_tag += 1
+
+    async def publish(self, body: bytes, properties: pika.BasicProperties, routing_key: str) -> asyncio.Future:
+        """
+        Publica uma mensagem sem esperar pelo confirm, com a chave de
+        encaminhamento dada pelo `PartitionRouter`. Só bloqueia quando a
+        janela de mensagens por confirmar está cheia.
+
+        Se o canal estiver fechado a mensagem não é aceite
+        (AMQPConnectionError) e o chamador deve publicá-la de novo depois de
+        `connect()`; uma mensagem aceite é publicada até ser confirmada.
+
+        Returns:
+            Uma futura resolvida com True (ack) quando o broker confirmar a
+            mensagem, ou com False se for rejeitada `MAX_ATTEMPTS` vezes.
+        """
+        await self._window.acquire()
+        if not self.is_open:
+            self._window.release()
+            raise AMQPConnectionError("Canal de publicação fechado")
+
+        publication = _Publication(body, properties, routing_key, asyncio.get_running_loop().create_future())
+        self._send(publication)
+        return publication.future
+
+    async def flush(self):
+        """Espera que as mensagens publicadas sejam confirmadas (ou que o canal feche)."""
+        if self._pending and self.is_open:
+            confirmed = asyncio.gather(*(publication.future for publication in self._pending.values()))
+            await asyncio.wait([confirmed, self._closed], return_when=asyncio.FIRST_COMPLETED)
+
+    async def close(self):
+        """
+        Espera pelos confirms pendentes e fecha a ligação. As mensagens ainda
+        por confirmar são publicadas de novo no próximo `connect()`.
+        """
+        await self.flush()
+        if self._connection and not self._connection.is_closed:
+            self._connection.close()
@@ -0,0 +1,123 @@
+"""
+Testes da `RunnerFleet` contra a física de um `Producer` por corredor.
+
+Executar na pasta Apps/Producer:
+    python -m pytest tests
+"""
+import pytest
+
+import Producer as producer_module
+from Producer import COMPILED_ROUTES, MAX_STEPS_PER_SEGMENT, SLEEP_SECONDS, Producer, run_basic
+from codec import get_codec_by_name
+from fleet import RunnerFleet
+from partitions import PartitionRouter
+
+# Ticks suficientes para cada corredor percorrer as três rotas
+TICKS = 3 * 4 * MAX_STEPS_PER_SEGMENT + 10
+
+
+def producer_like(fleet, i):
+    """`Producer` com o mesmo estado inicial do corredor `i` da frota."""
+    producer = Producer()
+    producer.runner_id = int(fleet.runner_id[i])
+    producer.speed_variation = float(fleet.speed_variation[i])
+    producer.target_speed_kmh = float(fleet.target_speed_kmh[i])
+    return producer
+
+
+@pytest.fixture
+def fleet():
+    return RunnerFleet(8, COMPILED_ROUTES, SLEEP_SECONDS, MAX_STEPS_PER_SEGMENT, seed=7)
+
+
+def test_estado_inicial(fleet):
+    messages = fleet.next_messages()
+
+    assert len(messages) == 8
+    assert len({m["runner_id"] for m in messages}) == 8
+    assert all(m["route_id"] == 1 for m in messages)
+    assert all(1 <= m["runner_id"] <= 2_147_483_647 for m in messages)
+
+
+def test_igual_ao_producer_por_corredor(fleet, monkeypatch):
+    producers = [producer_like(fleet, i) for i in range(fleet.size)]
+    routes_seen = [set() for _ in producers]
+
+    for _ in range(TICKS):
+        route_before = fleet.route_index.copy()
+        fleet.update_physics()
+        restarted = fleet.route_index != route_before
+
+        for i, producer in enumerate(producers):
+            if restarted[i]:
+                # A velocidade de cada corrida é sorteada: usa-se a que a frota sorteou
+                monkeypatch.setattr(
+                    producer_module.random, "uniform",
+                    lambda low, high, speed=fleet.target_speed_kmh[i] / fleet.speed_variation[i]: speed
+                )
+            producer.update_physics()
+            routes_seen[i].add(producer.route_id)
+            monkeypatch.undo()
+
+            assert producer.route_id == fleet.route_index[i] + 1
+            assert producer.current_segment == fleet.current_segment[i]
+            assert producer.distance_km == pytest.approx(fleet.distance_km[i], abs=1e-9)
+            assert producer.target_speed_kmh == pytest.approx(fleet.target_speed_kmh[i])
+            assert [producer.positionX, producer.positionY] == pytest.approx(fleet.position[i].tolist(), abs=1e-12)
+            assert [producer.speedX, producer.speedY] == pytest.approx(fleet.speed[i].tolist(), abs=1e-9)
+
+    # Cada corredor passou pelas três rotas (inclui as mudanças de corrida)
+    assert all(seen == {1, 2, 3} for seen in routes_seen)
+
+
+class FakeChannel:
+    """Canal AMQP em memória: regista as declarações e as publicações."""
+
+    def __init__(self):
+        self.declared = []
+        self.published = []
+
+    def queue_declare(self, queue, durable):
+        self.declared.append(queue)
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append((exchange, routing_key, body))
+
+
+class FakeConnection:
+    is_closed = False
+
+    def __init__(self):
+        self.channels = []
+
+    def channel(self):
+        self.channels.append(FakeChannel())
+        return self.channels[-1]
+
+
+class StopLoop(Exception):
+    pass
+
+
+def test_run_basic_publica_a_frota(fleet, monkeypatch):
+    connection = FakeConnection()
+    ticks = []
+
+    def sleep(seconds):
+        # Só a pausa entre ticks; a pausa depois de um erro também termina o ciclo
+        ticks.append(seconds)
+        if len(ticks) == 3 or seconds == 5:
+            raise StopLoop()
+
+    monkeypatch.setattr(producer_module, "connect_rabbitmq", lambda: connection)
+    monkeypatch.setattr(producer_module.time, "sleep", sleep)
+
+    with pytest.raises(StopLoop):
+        run_basic(fleet, get_codec_by_name("json"), PartitionRouter("queue"))
+
+    assert 5 not in ticks
+    assert len(connection.channels) == 1
+    channel = connection.channels[0]
+    assert channel.declared == ["queue"]
+    assert len(channel.published) == 3 * fleet.size
+    assert {routing_key for _, routing_key, _ in channel.published} == {"queue"}
@@ -18,6 +18,13 @@ const clearFilterBtn = document.getElementById('clear-filter-btn');
 
 // --- 4. Variáveis de Estado Global ---
 let allParticipants = [];
+// Segmentos totais por rota, atualizados com as rotas devolvidas por /rutas
+const routeSegments = {
+    1: 4,  // Rota Quadrada: 5 pontos = 4 segmentos
+    2: 3,  // Rota Irregular: 4 pontos = 3 segmentos
+    3: 3   // Rota Ascendente: 4 pontos = 3 segmentos
+};
+const participantsByRunner = new Map(); // runner_id -> última mensagem (polling e stream)
 let filterText = '';
 
 // --- 5. Event Listeners para o Filtro ---
@@ -41,11 +48,27 @@ filterInput.addEventListener('keypress', (e) => {
 });
 
 // --- 6. Função de Polling (Fetch) ---
+// Depois da primeira resposta só se pedem os corredores alterados desde o
+// último `cursor`; se nada mudou desde o último ETag a API responde 304.
+const MAX_PARTICIPANTS = 100;
+let dadosCursor = null;
+let dadosEtag = null;
+
 function fetchData() {
-    fetch(`${API_URL}/dados`)
-        .then(res => res.json())
+    const url = dadosCursor === null ? `${API_URL}/dados` : `${API_URL}/dados?since=${dadosCursor}`;
+    const headers = dadosEtag ? { 'If-None-Match': dadosEtag } : {};
+
+    fetch(url, { headers })
+        .then(res => {
+            if (res.status === 304) return null;
+            dadosEtag = res.headers.get('ETag');
+            return res.json();
+        })
         .then(data => {
-            allParticipants = data.participantes || [];
+            if (!data) return;
+            if (dadosCursor === null) participantsByRunner.clear();
+            mergeParticipants(data.participantes || []);
+            dadosCursor = data.cursor ?? null;
             renderUI();
         })
         .catch(error => {
@@ -53,6 +76,81 @@ function fetchData() {
         });
 }
 
+// Junta as alterações ao estado local, mantendo os corredores mais recentes.
+// Um corredor só é substituído por uma mensagem mais recente (polling e stream
+// podem entregar a mesma posição, ou uma mais antiga, por ordens diferentes).
+function mergeParticipants(participantes) {
+    participantes.forEach((p, idx) => {
+        const key = p.runner_id ?? `sem-id-${idx}`;
+        const current = participantsByRunner.get(key);
+        if (!current || (p.timestampMs ?? -1) >= (current.timestampMs ?? -1)) {
+            participantsByRunner.set(key, p);
+        }
+    });
+    let values = Array.from(participantsByRunner.values());
+    if (values.length > MAX_PARTICIPANTS) {
+        values.sort((a, b) => (b.timestampMs ?? -1) - (a.timestampMs ?? -1));
+        values = values.slice(0, MAX_PARTICIPANTS);
+        participantsByRunner.clear();
+        values.forEach((p, idx) => participantsByRunner.set(p.runner_id ?? `sem-id-${idx}`, p));
+    }
+    allParticipants = values;
+}
+
+// Retira os corredores que o consumidor expirou por inatividade, exceto se
+// entretanto chegou (pelo polling) uma posição mais recente do que a removida.
+function removeParticipants(removidos) {
+    if (removidos.length === 0) return;
+    removidos.forEach(r => {
+        const current = participantsByRunner.get(r.runner_id);
+        if (current && (current.timestampMs ?? -1) <= (r.timestampMs ?? -1)) {
+            participantsByRunner.delete(r.runner_id);
+        }
+    });
+    allParticipants = Array.from(participantsByRunner.values());
+}
+
+// --- 6.0. Stream em direto (WebSocket) sobre o polling ---
+// O polling de /dados é a fonte de verdade e nunca pára: cada pod do consumidor
+// só vê os corredores que consumiu, por isso o stream (ligado a um único pod)
+// serve apenas para mostrar mais cedo as posições desses corredores.
+const POLL_INTERVAL_MS = 2000;
+const LIVE_RECONNECT_MS = 5000;
+let renderPending = false;
+
+function startPolling() {
+    fetchData();
+    setInterval(fetchData, POLL_INTERVAL_MS);
+}
+
+// Desenha no máximo uma vez por frame do browser, mesmo que cheguem vários deltas
+function scheduleRender() {
+    if (!renderPending) {
+        renderPending = true;
+        requestAnimationFrame(() => {
+            renderPending = false;
+            renderUI();
+        });
+    }
+}
+
+function connectLive() {
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const socket = new WebSocket(`${protocol}://${window.location.host}/live`);
+
+    socket.onmessage = (event) => {
+        // 'snapshot' e 'delta' só acrescentam: o snapshot de um pod não é o estado completo
+        const frame = JSON.parse(event.data);
+        mergeParticipants(frame.participantes || []);
+        removeParticipants(frame.removidos || []);
+        scheduleRender();
+    };
+
+    socket.onclose = () => {
+        setTimeout(connectLive, LIVE_RECONNECT_MS);
+    };
+}
+
 // --- 6.1. Función para cargar y dibujar rutas una sola vez al inicio ---
 function loadAndDrawRoutes() {
     fetch(`${API_URL}/rutas`)
@@ -60,8 +158,10 @@ function loadAndDrawRoutes() {
         .then(data => {
             const rutas = data.rutas || [];
             rutas.forEach(ruta => {
+                routeSegments[ruta.id] = ruta.points.length - 1;
                 drawRoute(ruta.id, ruta.points, ruta.name);
             });
+            renderUI();
         })
         .catch(error => {
             console.error('Erro ao carregar rotas:', error);
@@ -175,13 +275,6 @@ function updateMapMarkers(participantes) {
 
 // --- 9. Atualización de Tabelas de Ranking por Rota ---
 function updateRankingTables(participantes) {
-    // Definir segmentos totais por rota (baseado em ROUTES definidas na API)
-    const routeSegments = {
-        1: 4,  // Rota Quadrada: 5 pontos = 4 segmentos
-        2: 3,  // Rota Irregular: 4 pontos = 3 segmentos
-        3: 3   // Rota Ascendente: 4 pontos = 3 segmentos
-    };
-    
     // Agrupar participantes por rota
     const participantsByRoute = {
         1: [],
@@ -281,7 +374,7 @@ function fallbackCopyTextToClipboard(text) {
     document.body.removeChild(textArea);
 }
 
-// --- 11. Iniciar o Loop de Polling ---
+// --- 11. Iniciar o polling (fonte de verdade, sempre ativo) e o Stream em Direto ---
 loadAndDrawRoutes(); // Cargar y dibujar rutas una sola vez al inicio
-fetchData();
-setInterval(fetchData, 2000);
\ No newline at end of file
+startPolling();
+connectLive();
\ No newline at end of file
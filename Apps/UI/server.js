@@ -2,11 +2,16 @@
 
 const express = require('express');
 const path = require('path');
+const net = require('net');
 const app = express();
 const { register, HTTP_REQUESTS_TOTAL, HTTP_REQUEST_DURATION_SECONDS } = require('./metrics');
 
 const PORT = 3000; // A porta que o seu ui.yml e Dockerfile esperam
 
+// Stream em direto (WebSocket) servido pelo consumidor
+const LIVE_HOST = process.env.LIVE_STREAM_HOST || 'consumidor-service';
+const LIVE_PORT = parseInt(process.env.LIVE_STREAM_PORT || '8765', 10);
+
 // Serve ficheiros estáticos (como o seu index.html, css, js)
 app.use(express.static(path.join(__dirname, 'Public')));
 
@@ -37,14 +42,53 @@ app.use((req, res, next) => {
   next();
 });
 
+// Cabeçalhos da resposta da API que são reenviados ao browser
+const FORWARDED_HEADERS = ['etag', 'cache-control', 'content-type', 'content-disposition'];
+
+// Respostas com Cache-Control "public, max-age=N" (ex.: /rutas) ficam em memória
+// durante N segundos e são servidas sem voltar a chamar a API
+const PROXY_CACHE_MAX_ENTRIES = 100;
+const proxyCache = new Map(); // url -> { expiresAt, headers, body }
+
+function sharedMaxAge(cacheControl) {
+  if (!cacheControl || /no-store|no-cache|private/.test(cacheControl)) return 0;
+  const match = /(?:^|,)\s*max-age=(\d+)/.exec(cacheControl);
+  return match ? parseInt(match[1], 10) : 0;
+}
+
+function sendCached(req, res, entry) {
+  res.set(entry.headers);
+  if (entry.headers.etag && req.headers['if-none-match'] === entry.headers.etag) {
+    return res.status(304).end();
+  }
+  res.send(entry.body);
+}
+
 // Proxy para a API (resolve o problema de CORS e comunicação entre pods)
 app.get(/^\/api\/.*/, async (req, res) => {
+  const cached = proxyCache.get(req.originalUrl);
+  if (cached && cached.expiresAt > Date.now()) {
+    return sendCached(req, res, cached);
+  }
+
   // Constrói a URL real da API removendo o prefixo /api
   const apiUrl = `http://api-service:8000${req.originalUrl.replace(/^\/api/, '')}`;
 
   try {
     const fetch = (await import('node-fetch')).default;
-    const response = await fetch(apiUrl);
+    // Reencaminha o pedido condicional para a API poder responder 304
+    const headers = {};
+    if (req.headers['if-none-match']) headers['If-None-Match'] = req.headers['if-none-match'];
+    const response = await fetch(apiUrl, { headers });
+
+    const forwarded = {};
+    FORWARDED_HEADERS.forEach(name => {
+      const value = response.headers.get(name);
+      if (value) forwarded[name] = value;
+    });
+    if (response.status === 304) {
+      return res.set(forwarded).status(304).end();
+    }
 
     if (!response.ok) {
       const text = await response.text().catch(() => '');
@@ -54,8 +98,26 @@ app.get(/^\/api\/.*/, async (req, res) => {
       });
     }
 
-    const data = await response.json();
-    res.json(data);
+    const maxAge = sharedMaxAge(forwarded['cache-control']);
+    if (maxAge > 0) {
+      const entry = {
+        expiresAt: Date.now() + maxAge * 1000,
+        headers: forwarded,
+        body: Buffer.from(await response.arrayBuffer())
+      };
+      if (proxyCache.size >= PROXY_CACHE_MAX_ENTRIES) proxyCache.clear();
+      proxyCache.set(req.originalUrl, entry);
+      return sendCached(req, res, entry);
+    }
+
+    // O corpo é reenviado em streaming, sem o voltar a processar (inclui as
+    // exportações NDJSON, que podem ter milhões de linhas)
+    res.set(forwarded);
+    response.body.on('error', (error) => {
+      console.error('Erro ao receber a resposta da API:', error);
+      res.destroy(error);
+    });
+    response.body.pipe(res);
   } catch (error) {
     console.error('Erro ao chamar a API:', error);
     res.status(500).json({ erro: 'Erro ao comunicar com a API' });
@@ -83,6 +145,35 @@ metricsApp.listen(8001, () => {
   console.log('Servidor de métricas UI iniciado na porta 8001');
 });
 
-app.listen(PORT, () => {
+const server = app.listen(PORT, () => {
   console.log(`Servidor UI a correr em http://localhost:${PORT}`);
+});
+
+// Proxy do WebSocket /live para o consumidor: reenvia o pedido de upgrade e
+// liga os dois sockets diretamente (os frames passam sem serem processados)
+server.on('upgrade', (req, socket, head) => {
+  if (!req.url.startsWith('/live')) {
+    socket.destroy();
+    return;
+  }
+
+  const upstream = net.connect(LIVE_PORT, LIVE_HOST, () => {
+    let handshake = `${req.method} / HTTP/${req.httpVersion}\r\n`;
+    for (let i = 0; i < req.rawHeaders.length; i += 2) {
+      handshake += `${req.rawHeaders[i]}: ${req.rawHeaders[i + 1]}\r\n`;
+    }
+    upstream.write(handshake + '\r\n');
+    if (head && head.length) upstream.write(head);
+    socket.pipe(upstream).pipe(socket);
+  });
+
+  upstream.setNoDelay(true);
+  socket.setNoDelay(true);
+  upstream.on('error', (error) => {
+    console.error('Erro no stream em direto:', error.message);
+    socket.destroy();
+  });
+  socket.on('error', () => upstream.destroy());
+  socket.on('close', () => upstream.destroy());
+  upstream.on('close', () => socket.destroy());
 });
\ No newline at end of file